@@ -0,0 +1,199 @@
+"""
+Static analysis of the cost of a protocol, before running it: the gates of its circuit, its
+depth and rounds of communication, the preprocessing material it consumes, and the bytes each
+party receives in an evaluation.
+
+Messages are predicted from the execution plan, which knows every message of a run: the input
+shares the owners of secrets send, one opening per round of each layer holding the masked
+operands of its multiplications and the values its sub-protocols open in that round, the opening
+of the output, and the preprocessing material, from the trusted third party or generated by the
+parties. Their sizes are the ones of the pickled lists of field elements the parties exchange,
+and of the JSON the trusted third party answers with, for elements as large as the field, so
+predictions are slightly above the measurements, by a few percent at most. Transports add their
+overhead to every message (see TRANSPORTS).
+"""
+
+import json
+import pickle
+import sys
+from collections import Counter
+from typing import Dict, List, Optional
+
+from expression import Expression
+from plan import ExecutionPlan
+from preprocessing import PRODUCT_SHAPES, material_size
+from protocol import ProtocolSpec
+from secret_sharing import Share
+
+# The bytes each transport adds to a message a party receives:
+# - "payload": none, the messages alone;
+# - "server": what the /communication_cost route of the server counts, the size of the bytes
+#   objects of the messages (see communication_cost.json);
+# - "http": the headers of an HTTP/1.1 request and of its response, as sent by requests and
+#   Werkzeug.
+TRANSPORTS = {"payload": 0, "server": sys.getsizeof(b""), "http": 350}
+
+
+def opening_size(count: int) -> int:
+    """The size of a message of count field elements, pickled like the parties do."""
+    return len(pickle.dumps([Share.FIELD_Q - 1] * count))
+
+
+def inputs_size(count: int, nb_gates: int) -> int:
+    """The size of a message of the shares of count inputs, by gate."""
+    return len(pickle.dumps([(nb_gates, Share.FIELD_Q - 1)] * count))
+
+
+def sent_inputs(plan: ExecutionPlan, sender: str) -> int:
+    """
+    The number of inputs a party sends the shares of: the ones it owns, or if the owners are
+    unknown, its part of the inputs spread evenly over the parties.
+    """
+    if plan.inputs is not None:
+        return len(plan.inputs[sender])
+    return -(-len(plan.circuit.inputs) // len(plan.participant_ids))
+
+
+def material_response_size(sizes: List[int]) -> int:
+    """
+    The size of the JSON answer of the trusted third party, of material of the given sizes, as
+    Flask pretty-prints it in debug mode, the one server.run starts it in.
+    """
+    largest = Share.FIELD_Q - 1
+    shares = [[largest] * size for size in sizes]
+    return len(json.dumps(shares, indent=2, separators=(", ", ": "))) + 1
+
+
+class CostReport:
+    """
+    The predicted cost of an evaluation of a protocol.
+
+    Attributes:
+        gates (Dict[str, int]): the number of gates of each kind, by class name
+        multiplications (int): the number of gates evaluated in the layers, needing material
+        depth (int): the multiplicative depth, the number of layers of the circuit
+        rounds (int): the rounds of openings of a run, the output included
+        material (Dict[str, int]): the number of items of preprocessing material of each kind
+        triplets (int): the Beaver triplets of the multiplications, one per product whatever its
+            shape, and of the sub-protocols
+        field_elements (int): the number of field elements of a party's material
+        messages (Dict[str, int]): the number of messages each party receives
+        bytes_per_party (Dict[str, int]): the number of bytes each party receives
+        transport (str): the transport of the messages, a key of TRANSPORTS
+    """
+
+    def __init__(self, spec: ProtocolSpec, transport: str = "server"):
+        if transport not in TRANSPORTS:
+            raise ValueError(
+                f"Unknown transport {transport}, expected one of {list(TRANSPORTS)}"
+            )
+        plan = spec.compile()
+        circuit = plan.circuit
+        self.transport = transport
+        overhead = TRANSPORTS[transport]
+        ids = plan.participant_ids
+        num_parties = len(ids)
+
+        self.gates = dict(Counter(type(gate).__name__ for gate in circuit.gates))
+        self.multiplications = len(circuit.beaver_ops)
+        self.depth = len(circuit.layers)
+        self.rounds = plan.nb_rounds()
+        self.material = dict(Counter(kind for _, kind, _ in plan.preprocessing))
+        self.triplets = sum(
+            shape[1] if kind == "solved_bits" else 1
+            for _, kind, shape in plan.preprocessing
+            if kind != "truncation"
+        )
+        sizes = [material_size(kind, shape) for _, kind, shape in plan.preprocessing]
+        self.field_elements = sum(sizes)
+
+        # every opening, received from as many other parties as the scheme needs
+        senders = plan.scheme.needed_shares(num_parties) - 1
+        openings = []
+        for layer, keys in zip(circuit.layers, plan.rounds):
+            for round in range(len(keys)):
+                openings.append(
+                    sum(
+                        counts[round]
+                        for counts in map(circuit.openings, layer)
+                        if round < len(counts)
+                    )
+                )
+        openings.append(1)
+        shared_messages = senders * len(openings)
+        shared_bytes = senders * sum(map(opening_size, openings))
+
+        if sizes and plan.dealer_free:
+            # the random values, then the reshared products, dealt by every other party
+            randomness = 0
+            products = 0
+            for _, kind, shape in plan.preprocessing:
+                rows, inner, cols = PRODUCT_SHAPES[kind](*shape)
+                randomness += rows * inner + (0 if kind == "square" else inner * cols)
+                products += rows * cols
+            shared_messages += 2 * (num_parties - 1)
+            shared_bytes += (num_parties - 1) * (
+                opening_size(randomness) + opening_size(products)
+            )
+        elif sizes:
+            shared_messages += 1
+            shared_bytes += material_response_size(sizes)
+
+        self.messages = {}
+        self.bytes_per_party = {}
+        for id in ids:
+            messages = shared_messages
+            nb_bytes = shared_bytes
+            for sender in plan.senders(id):
+                messages += 1
+                nb_bytes += inputs_size(sent_inputs(plan, sender), len(circuit.gates))
+            self.messages[id] = messages
+            self.bytes_per_party[id] = nb_bytes + messages * overhead
+
+    def total_bytes(self) -> int:
+        """The bytes all the parties receive, what the server measures for a run."""
+        return sum(self.bytes_per_party.values())
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "gates": self.gates,
+            "multiplications": self.multiplications,
+            "depth": self.depth,
+            "rounds": self.rounds,
+            "material": self.material,
+            "triplets": self.triplets,
+            "field_elements": self.field_elements,
+            "messages": self.messages,
+            "bytes_per_party": self.bytes_per_party,
+            "transport": self.transport,
+        }
+
+
+def analyze(spec: ProtocolSpec, transport: str = "server") -> CostReport:
+    """The predicted cost of an evaluation of a protocol."""
+    return CostReport(spec, transport)
+
+
+def analyze_expression(
+    expr: Expression,
+    nb_parties: int,
+    threshold: Optional[int] = None,
+    transport: str = "server",
+) -> CostReport:
+    """The predicted cost of evaluating an expression among nb_parties, with the given sharing."""
+    participants = [f"Party_{index + 1}" for index in range(nb_parties)]
+    return CostReport(ProtocolSpec(participants, expr, threshold), transport)
+
+
+def prediction_errors(
+    predicted: Dict[str, int], measured: Dict[str, int]
+) -> Dict[str, float]:
+    """
+    The relative errors of predicted costs, by the keys of measurements such as the ones of
+    communication_cost.json, for the keys of both.
+    """
+    return {
+        key: (predicted[key] - measured[key]) / measured[key]
+        for key in measured
+        if key in predicted and measured[key]
+    }
@@ -0,0 +1,500 @@
+"""
+Compilation of expressions into circuits of numbered gates.
+
+Gates are numbered in a deterministic topological order of the expression, so every party
+compiling the same expression assigns the same number to the same gate, whatever the process.
+These numbers are the keys of the wires during evaluation and of the labels of messages.
+"""
+
+import hashlib
+import operator
+import sys
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from comparison import nb_bits, protocol_openings, protocol_triplets
+from expression import (
+    AddOp,
+    Bit,
+    BitDecompose,
+    Equals,
+    Expression,
+    InnerProduct,
+    LessThan,
+    MatMul,
+    MatrixEntry,
+    MultOp,
+    Scalar,
+    Secret,
+    SubOp,
+    Truncate,
+)
+from secret_sharing import Share
+
+# The gates evaluated by a comparison sub-protocol.
+COMPARISONS = (LessThan, Equals, BitDecompose)
+
+# The gates evaluated by an interactive sub-protocol.
+PROTOCOLS = COMPARISONS + (Truncate,)
+
+# The kinds of gates, numbered by their position in the structure of a circuit.
+KINDS = (
+    Scalar,
+    Secret,
+    AddOp,
+    SubOp,
+    MultOp,
+    LessThan,
+    Equals,
+    InnerProduct,
+    MatMul,
+    MatrixEntry,
+    BitDecompose,
+    Bit,
+    Truncate,
+)
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# Bumped whenever the structure or the compilation of circuits changes, as it is part of their
+# content hash.
+FORMAT_VERSION = 1
+WORD_BITS = 64
+WORD_MASK = (1 << WORD_BITS) - 1
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+def topological_order(expr: Expression) -> List[Expression]:
+    """Returns the distinct nodes of an expression, each one after its operands. Iterative so deep expressions do not hit the recursion limit."""
+    order = []
+    seen = set()
+    stack = [(expr, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        if node in seen:
+            continue
+        seen.add(node)
+        stack.append((node, True))
+        for operand in reversed(node.get_operands()):
+            stack.append((operand, False))
+    return order
+
+
+def kind_code(gate: Expression) -> int:
+    """The code of the kind of a gate, the one of its base class for subclasses such as FixedPointSecret."""
+    code = KIND_CODES.get(type(gate))
+    if code is None:
+        code = next(
+            KIND_CODES[kind] for kind in type(gate).__mro__ if kind in KIND_CODES
+        )
+    return code
+
+
+def nb_limbs() -> int:
+    """The number of words of a field element."""
+    return max(1, (Share.FIELD_Q.bit_length() + WORD_BITS - 1) // WORD_BITS)
+
+
+def element_words(value: int) -> List[int]:
+    """Splits a field element into words, least significant first."""
+    return [(value >> (WORD_BITS * limb)) & WORD_MASK for limb in range(nb_limbs())]
+
+
+def pack_words(words: Sequence[int]) -> bytes:
+    """Encodes words as 64 bits little-endian integers."""
+    packed = array("Q", words)
+    if not LITTLE_ENDIAN:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def structure(gates: List[Expression], gate_ids: Dict[Expression, int]) -> List[int]:
+    """
+    Encodes the gates of a circuit into words, one record per gate: the code of its kind, then
+    its parameters and the numbers of its operands. Scalars are reduced in the field, secrets
+    have no value: the structure is all the parties agree on.
+    """
+    FIELD_Q = Share.FIELD_Q
+    words: List[int] = []
+    for gate in gates:
+        words.append(kind_code(gate))
+        if isinstance(gate, Scalar):
+            words += element_words(gate.value % FIELD_Q)
+        elif isinstance(gate, Secret):
+            continue
+        elif isinstance(gate, MatMul):
+            words += [gate.rows, gate.inner, gate.cols]
+            words += [gate_ids[operand] for operand in gate.get_operands()]
+        elif isinstance(gate, InnerProduct):
+            words.append(len(gate.xs))
+            words += [gate_ids[operand] for operand in gate.get_operands()]
+        elif isinstance(gate, MatrixEntry):
+            words += [gate_ids[gate.product], gate.row, gate.col]
+        elif isinstance(gate, BitDecompose):
+            words += [len(gate.bits), gate_ids[gate.a]]
+        elif isinstance(gate, Bit):
+            words += [gate_ids[gate.decomposition], gate.index]
+        elif isinstance(gate, Truncate):
+            words += [gate.bits, gate_ids[gate.a]]
+        else:
+            words += [gate_ids[gate.a], gate_ids[gate.b]]
+    return words
+
+
+def content_hash(words: List[int]) -> str:
+    """The digest of the structure of a circuit, along with the field and the format it is compiled for."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{FORMAT_VERSION}:{Share.FIELD_Q};".encode())
+    digest.update(pack_words(words))
+    return digest.hexdigest()
+
+
+class LinearLayer:
+    """
+    A sparse matrix of affine forms over wires: row i computes
+    sum(coefficients[i][k] * wires[indices[i][k]]) + constants[i], reduced once modulo FIELD_Q.
+    """
+
+    def __init__(self, forms: List[Tuple[Dict[int, int], int]]):
+        self.indices = [list(terms.keys()) for terms, _ in forms]
+        self.coefficients = [list(terms.values()) for terms, _ in forms]
+        self.constants = [constant for _, constant in forms]
+
+    @classmethod
+    def from_rows(
+        cls,
+        indices: List[List[int]],
+        coefficients: List[List[int]],
+        constants: List[int],
+    ) -> "LinearLayer":
+        """A layer given directly by its rows, as loaded from a compiled circuit."""
+        layer = cls.__new__(cls)
+        layer.indices = indices
+        layer.coefficients = coefficients
+        layer.constants = constants
+        return layer
+
+    def __len__(self) -> int:
+        return len(self.constants)
+
+    def apply(self, wires: List[Optional[int]], with_constants: bool) -> List[int]:
+        """Computes every row on the given wire values. Constants are added only if asked to."""
+        FIELD_Q = Share.FIELD_Q
+        get = wires.__getitem__
+        rows = [
+            sum(map(operator.mul, coefficients, map(get, indices)))
+            for indices, coefficients in zip(self.indices, self.coefficients)
+        ]
+        if with_constants:
+            return [
+                (row + constant) % FIELD_Q
+                for row, constant in zip(rows, self.constants)
+            ]
+        return [row % FIELD_Q for row in rows]
+
+
+class Circuit:
+    """
+    An expression compiled into gates numbered from 0, each gate after its operands.
+
+    Additions, substractions and multiplications by a constant are affine, hence need no
+    communication: the compiler folds every affine subcircuit into affine forms over wires.
+    Wires are the values that cannot be computed locally, namely the secrets, the
+    multiplications of two non-constant operands and inner products (Beaver multiplications), and
+    the coefficients of matrix products, and are numbered by their gate. Beaver multiplications
+    are grouped in layers by multiplicative depth, and the operands of a layer are computed by one
+    sparse matrix-vector product over the previous wires.
+
+    Every Beaver multiplication is a matrix product: a multiplication multiplies 1 x 1 matrices
+    and an inner product a 1 x n matrix by a n x 1 matrix. A matrix product gate has no value of
+    its own, its coefficients are the wires of its MatrixEntry gates. A multiplication of two
+    operands with the same affine form is a square, which only has one operand to open.
+
+    Comparisons (LessThan, Equals and BitDecompose) and truncations are also evaluated in the
+    layers, by interactive sub-protocols taking one or several rounds (see comparison.py and
+    fixed_point.py). A bit decomposition has no value of its own, its bits are the wires of its
+    Bit gates.
+
+    Attributes:
+        gates (List[Expression]): the distinct nodes of the expression, indexed by gate number
+        gate_ids (Dict[Expression, int]): the number of each node
+        output (int): the gate computing the value of the whole expression
+        digest (str): content hash of the structure of the circuit, identical for all parties
+        inputs (List[int]): the gates of the secrets
+        beaver (List[bool]): whether each gate is a Beaver multiplication or a sub-protocol,
+            needing preprocessing material and evaluated in a layer
+        wires (List[bool]): whether each gate is a wire
+        squares (List[bool]): whether each gate is a Beaver multiplication squaring its operand
+        protocols (List[bool]): whether each gate is evaluated by an interactive sub-protocol
+        beaver_ops (List[int]): the gates of the Beaver multiplications and sub-protocols
+        layers (List[List[int]]): the Beaver multiplications and sub-protocols of each depth
+        layer_operands (List[LinearLayer]): for each layer, the operands of its multiplications
+            one after the other, each as the coefficients of its xs followed by the ones of its
+            ys, row by row, or as its single operand for a square, or as the operands of a
+            sub-protocol
+        output_layer (LinearLayer): the single affine form of the output
+    """
+
+    def __init__(self, expr: Expression, gates: Optional[List[Expression]] = None):
+        """Compiles an expression, whose topological order may be given if already computed."""
+        self.gates = topological_order(expr) if gates is None else gates
+        self.gate_ids: Dict[Expression, int] = {
+            gate: index for index, gate in enumerate(self.gates)
+        }
+        self.output = self.gate_ids[expr]
+        self.digest = content_hash(structure(self.gates, self.gate_ids))
+        self.constants = self.constant_values()
+        self.inputs = [
+            index for index, gate in enumerate(self.gates) if isinstance(gate, Secret)
+        ]
+        self.beaver = [self.is_beaver(gate) for gate in self.gates]
+        self.beaver_ops = [index for index, beaver in enumerate(self.beaver) if beaver]
+        self.wires = [
+            self.beaver[index]
+            or isinstance(gate, Secret)
+            or (
+                isinstance(gate, MatrixEntry)
+                and self.beaver[self.gate_ids[gate.product]]
+            )
+            or (
+                isinstance(gate, Bit) and self.beaver[self.gate_ids[gate.decomposition]]
+            )
+            for index, gate in enumerate(self.gates)
+        ]
+        self.protocols = [
+            beaver and isinstance(gate, PROTOCOLS)
+            for gate, beaver in zip(self.gates, self.beaver)
+        ]
+
+        self.squares = [False] * len(self.gates)
+        depths = [0] * len(self.gates)
+        self.layers: List[List[int]] = []
+        operand_forms: List[List[Tuple[Dict[int, int], int]]] = []
+        for gate in self.beaver_ops:
+            forms = [
+                self.affine_form(operand) for operand in self.operands(self.gates[gate])
+            ]
+            if isinstance(self.gates[gate], MultOp) and forms[0] == forms[1]:
+                self.squares[gate] = True
+                forms = forms[:1]
+            depth = 1 + max(
+                (depths[wire] for terms, _ in forms for wire in terms), default=0
+            )
+            depths[gate] = depth
+            for output in self.product_outputs(gate):
+                if output is not None:
+                    depths[output] = depth
+            if depth > len(self.layers):
+                self.layers.append([])
+                operand_forms.append([])
+            self.layers[depth - 1].append(gate)
+            operand_forms[depth - 1] += forms
+        self.layer_operands = [LinearLayer(forms) for forms in operand_forms]
+        self.output_layer = LinearLayer([self.affine_form(self.output)])
+
+    def operands(self, gate: Expression) -> List[int]:
+        """
+        Returns the gate numbers of the operands of an operation. The operands of a coefficient
+        of a matrix product are its row of xs followed by its column of ys, as an inner product.
+        """
+        if isinstance(gate, MatrixEntry):
+            product = gate.product
+            terms = product.xs[gate.row] + tuple(row[gate.col] for row in product.ys)
+            return [self.gate_ids[term] for term in terms]
+        return [self.gate_ids[operand] for operand in gate.get_operands()]
+
+    def is_beaver(self, gate: Expression) -> bool:
+        """
+        Whether a gate is a multiplication of two non-constant operands, or an inner product with
+        such a product among its terms.
+        """
+        if isinstance(gate, PROTOCOLS):
+            return any(
+                self.constants[operand] is None for operand in self.operands(gate)
+            )
+        if isinstance(gate, MatMul):
+            # some coefficient multiplies two non-constant operands
+            operands = self.operands(gate)
+            xs = operands[: gate.rows * gate.inner]
+            ys = operands[gate.rows * gate.inner :]
+            return any(
+                any(self.constants[x] is None for x in xs[k :: gate.inner])
+                and any(
+                    self.constants[y] is None
+                    for y in ys[k * gate.cols : (k + 1) * gate.cols]
+                )
+                for k in range(gate.inner)
+            )
+        if not isinstance(gate, (MultOp, InnerProduct)):
+            return False
+        operands = self.operands(gate)
+        length = len(operands) // 2
+        return any(
+            self.constants[x] is None and self.constants[y] is None
+            for x, y in zip(operands[:length], operands[length:])
+        )
+
+    def product_shape(self, gate: int) -> Tuple[int, int, int]:
+        """The dimensions (rows, inner, cols) of the matrices of a Beaver multiplication."""
+        node = self.gates[gate]
+        if isinstance(node, MatMul):
+            return node.rows, node.inner, node.cols
+        return 1, len(node.get_operands()) // 2, 1
+
+    def operand_rows(self, gate: int) -> int:
+        """The number of rows of the operands of a gate of a layer in layer_operands."""
+        if self.squares[gate]:
+            return 1
+        if self.protocols[gate]:
+            return len(self.gates[gate].get_operands())
+        rows, inner, cols = self.product_shape(gate)
+        return rows * inner + inner * cols
+
+    def product_outputs(self, gate: int) -> List[Optional[int]]:
+        """
+        The wires a gate of a layer computes: the gate itself, or the coefficients of a matrix
+        product row by row, or the bits of a decomposition, None for the ones the expression
+        does not use.
+        """
+        node = self.gates[gate]
+        if isinstance(node, MatMul):
+            return [self.gate_ids.get(entry) for row in node.entries for entry in row]
+        if isinstance(node, BitDecompose):
+            return [self.gate_ids.get(bit) for bit in node.bits]
+        return [gate]
+
+    def preprocessing(self, gate: int) -> Tuple[str, Tuple[int, ...]]:
+        """The kind and shape of the material a Beaver multiplication needs from the trusted third party."""
+        node = self.gates[gate]
+        if isinstance(node, Truncate) and self.protocols[gate]:
+            return "truncation", (node.bits,)
+        if self.protocols[gate]:
+            nb_operands = len(node.get_operands())
+            triplets = protocol_triplets(type(node), nb_operands, Share.FIELD_Q)
+            return "solved_bits", (nb_bits(), triplets)
+        if isinstance(node, MatMul):
+            return "matrix", self.product_shape(gate)
+        if isinstance(node, InnerProduct):
+            return "inner", (len(node.xs),)
+        if self.squares[gate]:
+            return "square", ()
+        return "triplet", ()
+
+    def openings(self, gate: int) -> Tuple[int, ...]:
+        """
+        The number of values a Beaver multiplication or a sub-protocol opens in each of its
+        rounds: a multiplication opens its masked operands at once, and a truncation its masked
+        operand.
+        """
+        node = self.gates[gate]
+        if self.protocols[gate] and not isinstance(node, Truncate):
+            nb_operands = len(node.get_operands())
+            return protocol_openings(type(node), nb_operands, Share.FIELD_Q)
+        return (self.operand_rows(gate),)
+
+    def rounds(self, gate: int) -> int:
+        """The number of rounds of openings of a Beaver multiplication or a sub-protocol."""
+        return len(self.openings(gate))
+
+    def constant_values(self) -> List[Optional[int]]:
+        """The value of every gate that only depends on scalars, None for the other gates."""
+        FIELD_Q = Share.FIELD_Q
+        values: List[Optional[int]] = []
+        for gate in self.gates:
+            if isinstance(gate, Scalar):
+                values.append(gate.value % FIELD_Q)
+            elif isinstance(gate, Secret):
+                values.append(None)
+            elif isinstance(gate, (MatMul, BitDecompose)):
+                # the value of a matrix product or a decomposition is in its entries
+                values.append(None)
+            elif isinstance(gate, Bit):
+                value = values[self.gate_ids[gate.decomposition.a]]
+                values.append(None if value is None else (value >> gate.index) & 1)
+            elif isinstance(gate, Truncate):
+                value = values[self.gate_ids[gate.a]]
+                if value is None:
+                    values.append(None)
+                else:
+                    # truncates the signed value, exactly
+                    if value > (FIELD_Q - 1) // 2:
+                        value -= FIELD_Q
+                    values.append((value >> gate.bits) % FIELD_Q)
+            elif isinstance(gate, (InnerProduct, MatrixEntry)):
+                operands = [values[operand] for operand in self.operands(gate)]
+                if any(value is None for value in operands):
+                    values.append(None)
+                else:
+                    length = len(operands) // 2
+                    products = map(operator.mul, operands[:length], operands[length:])
+                    values.append(sum(products) % FIELD_Q)
+            else:
+                a, b = (values[operand] for operand in self.operands(gate))
+                if a is None or b is None:
+                    values.append(None)
+                elif isinstance(gate, AddOp):
+                    values.append((a + b) % FIELD_Q)
+                elif isinstance(gate, SubOp):
+                    values.append((a - b) % FIELD_Q)
+                elif isinstance(gate, LessThan):
+                    values.append(int((a - b) % FIELD_Q > (FIELD_Q - 1) // 2))
+                elif isinstance(gate, Equals):
+                    values.append(int(a == b))
+                else:
+                    values.append(a * b % FIELD_Q)
+        return values
+
+    def affine_form(self, gate: int) -> Tuple[Dict[int, int], int]:
+        """
+        Expresses a gate as an affine form sum(terms[wire] * wire) + constant, by propagating
+        coefficients from the gate down its affine subcircuit until reaching wires or constants.
+        """
+        FIELD_Q = Share.FIELD_Q
+        # the affine nodes under the gate, visited once each even if shared
+        region = set()
+        stack = [gate]
+        while stack:
+            node = stack.pop()
+            if node in region:
+                continue
+            region.add(node)
+            node_gate = self.gates[node]
+            if self.constants[node] is None and not self.wires[node]:
+                stack.extend(self.operands(node_gate))
+
+        coefficients = dict.fromkeys(region, 0)
+        coefficients[gate] = 1
+        terms: Dict[int, int] = {}
+        constant = 0
+        # operands have lower numbers than their operations: going down the numbers, every node
+        # has received all its coefficient when it is reached
+        for node in sorted(region, reverse=True):
+            coefficient = coefficients[node] % FIELD_Q
+            node_gate = self.gates[node]
+            if coefficient == 0:
+                continue
+            if self.constants[node] is not None:
+                constant += coefficient * self.constants[node]
+            elif self.wires[node]:
+                terms[node] = coefficient
+            elif isinstance(node_gate, AddOp):
+                a, b = self.operands(node_gate)
+                coefficients[a] += coefficient
+                coefficients[b] += coefficient
+            elif isinstance(node_gate, SubOp):
+                a, b = self.operands(node_gate)
+                coefficients[a] += coefficient
+                coefficients[b] -= coefficient
+            else:
+                # products by a constant, or inner products and coefficients of matrix products
+                # whose terms all have a constant side
+                operands = self.operands(node_gate)
+                length = len(operands) // 2
+                for a, b in zip(operands[:length], operands[length:]):
+                    if self.constants[a] is not None:
+                        coefficients[b] += coefficient * self.constants[a]
+                    else:
+                        coefficients[a] += coefficient * self.constants[b]
+        return terms, constant % FIELD_Q
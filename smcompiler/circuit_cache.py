@@ -0,0 +1,392 @@
+"""
+Compact on-disk format of compiled circuits, and a cache of compilations keyed by content hash.
+
+A compiled circuit is a header (a magic number, the format version, the field, the content hash
+of the circuit and its number of words) followed by 64 bits little-endian words: the structure of
+the expression, one record per gate (see circuit.structure), then what the compiler derived from
+it, the flags and constants of the gates, the layers, and the sparse affine forms of the operands
+of each layer and of the output. Field elements take as many words as the field needs. Loading
+decodes the words into the circuit without compiling anything, and rebuilds the nodes of the
+expression from the structure, iteratively, unless the caller already has them.
+
+The content hash only depends on the structure of the expression, not on the values of its
+secrets, so an expression built again the same way, in this process or another one sharing the
+cache directory, is loaded rather than compiled again.
+"""
+
+import gc
+import os
+import struct
+import tempfile
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from circuit import (
+    FORMAT_VERSION,
+    KINDS,
+    LITTLE_ENDIAN,
+    WORD_BITS,
+    Circuit,
+    LinearLayer,
+    content_hash,
+    element_words,
+    nb_limbs,
+    pack_words,
+    structure,
+    topological_order,
+)
+from expression import (
+    Bit,
+    BitDecompose,
+    Expression,
+    InnerProduct,
+    MatMul,
+    MatrixEntry,
+    Scalar,
+    Secret,
+    Truncate,
+)
+
+MAGIC = b"SMCCIRCT"
+# magic, format version, number of words of a field element, content hash, number of words
+HEADER = struct.Struct("<8sQQ16sQ")
+# Flags of the gates, one word per gate.
+BEAVER, WIRE, SQUARE, PROTOCOL, CONSTANT = (1 << bit for bit in range(5))
+# Number of compiled circuits kept in memory by a cache.
+CAPACITY = 64
+
+
+def dumps(circuit: Circuit) -> bytes:
+    """Encodes a compiled circuit."""
+    limbs = nb_limbs()
+    words = structure(circuit.gates, circuit.gate_ids)
+    header = [len(circuit.gates), circuit.output, len(words)]
+
+    constants: List[int] = []
+    flags = []
+    for index in range(len(circuit.gates)):
+        flag = (
+            BEAVER * circuit.beaver[index]
+            | WIRE * circuit.wires[index]
+            | SQUARE * circuit.squares[index]
+            | PROTOCOL * circuit.protocols[index]
+        )
+        if circuit.constants[index] is not None:
+            flag |= CONSTANT
+            constants += element_words(circuit.constants[index])
+        flags.append(flag)
+    words += flags + constants
+
+    words.append(len(circuit.layers))
+    for layer in circuit.layers:
+        words.append(len(layer))
+        words += layer
+    # the rows of each linear layer, as their lengths then all their indices, coefficients and
+    # constants one after the other, so that they are decoded by slicing
+    for linear in circuit.layer_operands + [circuit.output_layer]:
+        words.append(len(linear))
+        words += [len(indices) for indices in linear.indices]
+        for indices in linear.indices:
+            words += indices
+        for coefficients in linear.coefficients:
+            for coefficient in coefficients:
+                words += element_words(coefficient)
+        for constant in linear.constants:
+            words += element_words(constant)
+
+    digest = bytes.fromhex(circuit.digest)
+    return HEADER.pack(
+        MAGIC, FORMAT_VERSION, limbs, digest, len(header) + len(words)
+    ) + pack_words(header + words)
+
+
+def loads(
+    data: bytes,
+    gates: Optional[List[Expression]] = None,
+    secrets: Optional[Iterable[Secret]] = None,
+) -> Circuit:
+    """
+    Decodes a compiled circuit. The nodes of the expression are the given gates, in topological
+    order, or are rebuilt from the structure around the given secrets, in the order of the
+    inputs, or fresh ones.
+    """
+    # the collector would walk the growing circuit over and over while it is decoded
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return decode(data, gates, secrets)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def decode(
+    data: bytes,
+    gates: Optional[List[Expression]],
+    secrets: Optional[Iterable[Secret]],
+) -> Circuit:
+    magic, version, limbs, digest, nb_words = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a compiled circuit")
+    if version != FORMAT_VERSION:
+        raise ValueError(
+            f"The circuit has format {version}, this version reads {FORMAT_VERSION}"
+        )
+    if limbs != nb_limbs():
+        raise ValueError("The circuit was compiled for another field")
+    words = array("Q")
+    words.frombytes(data[HEADER.size : HEADER.size + nb_words * 8])
+    if not LITTLE_ENDIAN:
+        words.byteswap()
+    words = words.tolist()
+
+    nb_gates, output, size = words[:3]
+    position = 3 + size
+    if gates is None:
+        gates = expression_gates(words[3:position], secrets)
+    elif len(gates) != nb_gates:
+        raise ValueError(f"The circuit has {nb_gates} gates, not {len(gates)}")
+
+    circuit = Circuit.__new__(Circuit)
+    circuit.gates = gates
+    circuit.gate_ids = {gate: index for index, gate in enumerate(gates)}
+    circuit.output = output
+    circuit.digest = digest.hex()
+    circuit.inputs = [
+        index for index, gate in enumerate(gates) if isinstance(gate, Secret)
+    ]
+
+    flags = words[position : position + nb_gates]
+    position += nb_gates
+    circuit.beaver = [bool(flag & BEAVER) for flag in flags]
+    circuit.wires = [bool(flag & WIRE) for flag in flags]
+    circuit.squares = [bool(flag & SQUARE) for flag in flags]
+    circuit.protocols = [bool(flag & PROTOCOL) for flag in flags]
+    circuit.beaver_ops = [
+        index for index, beaver in enumerate(circuit.beaver) if beaver
+    ]
+    nb_constants = sum(1 for flag in flags if flag & CONSTANT)
+    values = iter(read_elements(words, position, nb_constants, limbs))
+    position += nb_constants * limbs
+    circuit.constants = [next(values) if flag & CONSTANT else None for flag in flags]
+
+    circuit.layers = []
+    nb_layers = words[position]
+    position += 1
+    for _ in range(nb_layers):
+        length = words[position]
+        circuit.layers.append(words[position + 1 : position + 1 + length])
+        position += 1 + length
+    linear_layers = []
+    for _ in range(nb_layers + 1):
+        layer, position = read_linear_layer(words, position, limbs)
+        linear_layers.append(layer)
+    circuit.layer_operands = linear_layers[:-1]
+    circuit.output_layer = linear_layers[-1]
+    return circuit
+
+
+def read_element(words: List[int], position: int, limbs: int) -> Tuple[int, int]:
+    """Decodes the field element at a position, and returns it with the next position."""
+    if limbs == 1:
+        return words[position], position + 1
+    value = 0
+    for limb in range(limbs):
+        value |= words[position + limb] << (WORD_BITS * limb)
+    return value, position + limbs
+
+
+def read_elements(words: List[int], position: int, count: int, limbs: int) -> List[int]:
+    """Decodes count field elements from a position."""
+    if limbs == 1:
+        return words[position : position + count]
+    return [
+        read_element(words, start, limbs)[0]
+        for start in range(position, position + count * limbs, limbs)
+    ]
+
+
+def read_linear_layer(
+    words: List[int], position: int, limbs: int
+) -> Tuple[LinearLayer, int]:
+    """Decodes the rows of a linear layer at a position, and returns it with the next position."""
+    nb_rows = words[position]
+    position += 1
+    lengths = words[position : position + nb_rows]
+    position += nb_rows
+    offsets = list(accumulate(lengths, initial=0))
+    size = offsets[-1]
+    indices = words[position : position + size]
+    position += size
+    coefficients = read_elements(words, position, size, limbs)
+    position += size * limbs
+    constants = read_elements(words, position, nb_rows, limbs)
+    position += nb_rows * limbs
+    rows = list(zip(offsets, offsets[1:]))
+    layer = LinearLayer.from_rows(
+        [indices[start:end] for start, end in rows],
+        [coefficients[start:end] for start, end in rows],
+        constants,
+    )
+    return layer, position
+
+
+def expression_gates(
+    words: Sequence[int], secrets: Optional[Iterable[Secret]] = None
+) -> List[Expression]:
+    """Rebuilds the nodes of an expression from its structure, in topological order."""
+    limbs = nb_limbs()
+    secrets = iter(secrets) if secrets is not None else None
+    gates: List[Expression] = []
+    position = 0
+    while position < len(words):
+        kind = KINDS[words[position]]
+        position += 1
+        if kind is Scalar:
+            value, position = read_element(words, position, limbs)
+            gates.append(Scalar(value))
+        elif kind is Secret:
+            gates.append(next(secrets) if secrets is not None else Secret())
+        elif kind is MatMul:
+            rows, inner, cols = words[position : position + 3]
+            position += 3
+            nb_xs = rows * inner
+            nb_operands = nb_xs + inner * cols
+            operands = [
+                gates[operand] for operand in words[position : position + nb_operands]
+            ]
+            position += nb_operands
+            xs = [operands[row * inner : (row + 1) * inner] for row in range(rows)]
+            ys = [
+                operands[nb_xs + row * cols : nb_xs + (row + 1) * cols]
+                for row in range(inner)
+            ]
+            gates.append(MatMul(xs, ys))
+        elif kind is InnerProduct:
+            length = words[position]
+            operands = [
+                gates[operand]
+                for operand in words[position + 1 : position + 1 + 2 * length]
+            ]
+            position += 1 + 2 * length
+            gates.append(InnerProduct(operands[:length], operands[length:]))
+        elif kind is MatrixEntry:
+            product, row, col = words[position : position + 3]
+            position += 3
+            gates.append(gates[product].entries[row][col])
+        elif kind is BitDecompose:
+            nb_bits, operand = words[position : position + 2]
+            position += 2
+            gates.append(BitDecompose(gates[operand], nb_bits))
+        elif kind is Bit:
+            decomposition, index = words[position : position + 2]
+            position += 2
+            gates.append(gates[decomposition].bits[index])
+        elif kind is Truncate:
+            bits, operand = words[position : position + 2]
+            position += 2
+            gates.append(Truncate(gates[operand], bits))
+        else:
+            a, b = words[position : position + 2]
+            position += 2
+            gates.append(kind(gates[a], gates[b]))
+    return gates
+
+
+def save(circuit: Circuit, path: str) -> None:
+    """Writes a compiled circuit to a file."""
+    write_atomically(dumps(circuit), path)
+
+
+def write_atomically(data: bytes, path: str) -> None:
+    """Writes a file through a temporary one, so that concurrent readers never see part of it."""
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def load(path: str, secrets: Optional[Iterable[Secret]] = None) -> Circuit:
+    """Reads a compiled circuit from a file."""
+    with open(path, "rb") as file:
+        return loads(file.read(), secrets=secrets)
+
+
+class CompileCache:
+    """
+    Compiled circuits by content hash, the last CAPACITY ones in memory and all of them in the
+    directory if one is given.
+
+    Attributes:
+        directory: where the compiled circuits are stored, or None to keep them in memory only
+        hits: number of compilations the cache saved
+        misses: number of expressions compiled
+    """
+
+    def __init__(self, directory: Optional[str] = None, capacity: int = CAPACITY):
+        self.directory = directory
+        self.capacity = capacity
+        self.memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest + ".circuit")
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """The compiled circuit of a content hash, if it was compiled before."""
+        data = self.memory.get(digest)
+        if data is not None:
+            self.memory.move_to_end(digest)
+            return data
+        if self.directory is not None and os.path.exists(self.path(digest)):
+            with open(self.path(digest), "rb") as file:
+                data = file.read()
+            self.remember(digest, data)
+        return data
+
+    def remember(self, digest: str, data: bytes) -> None:
+        self.memory[digest] = data
+        if len(self.memory) > self.capacity:
+            self.memory.popitem(last=False)
+
+    def compile(self, expr: Expression) -> Circuit:
+        """Compiles an expression, or loads its circuit if one with the same structure was compiled before."""
+        gates = topological_order(expr)
+        gate_ids = {gate: index for index, gate in enumerate(gates)}
+        digest = content_hash(structure(gates, gate_ids))
+        data = self.get(digest)
+        if data is not None:
+            self.hits += 1
+            return loads(data, gates)
+        self.misses += 1
+        circuit = Circuit(expr, gates)
+        data = dumps(circuit)
+        self.remember(digest, data)
+        if self.directory is not None:
+            write_atomically(data, self.path(digest))
+        return circuit
+
+
+cache = CompileCache(os.environ.get("SMC_CIRCUIT_CACHE"))
+
+
+def get_cache() -> CompileCache:
+    """The cache the protocol specifications compile their expressions through."""
+    return cache
+
+
+def set_cache(new_cache: CompileCache) -> None:
+    """Replaces the compile cache of this process, for instance by one backed by a directory."""
+    global cache
+    cache = new_cache
+
+
+def compile_circuit(expr: Expression) -> Circuit:
+    """Compiles an expression through the compile cache."""
+    return cache.compile(expr)
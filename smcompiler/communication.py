@@ -4,8 +4,9 @@ You should not need to change this file.
 """
 
 import json
+import threading
 import time
-from typing import Union, Tuple
+from typing import Dict, List, Optional, Sequence, Union, Tuple
 
 import requests
 
@@ -24,6 +25,57 @@ def sanitize_url_param(url_param: Union[bytes, str]) -> str:
     return url_param.replace("/", "_").replace("+", "-") # type: ignore
 
 
+def session_url(
+        server_host: str,
+        server_port: int,
+        session_id: Optional[str] = None,
+        protocol: str = "http"
+    ) -> str:
+    """
+    Base URL of the routes of a session, or of the default session if none is given.
+    """
+    base_url = f"{protocol}://{server_host}:{server_port}"
+    if session_id is None:
+        return base_url
+    return f"{base_url}/sessions/{sanitize_url_param(session_id)}"
+
+
+def create_session(
+        server_host: str,
+        server_port: int,
+        session_id: str,
+        participants: List[str],
+        protocol: str = "http",
+        threshold: Optional[int] = None
+    ) -> None:
+    """
+    Create a new session on the server with its own participants, messages and
+    trusted parameter generator. With a threshold, the trusted parameter generator
+    deals Shamir shares of that threshold instead of additive shares.
+    """
+    url = session_url(server_host, server_port, session_id, protocol)
+    print(f"POST {url}")
+    body = participants if threshold is None else {
+        "participants": participants,
+        "threshold": threshold,
+    }
+    requests.post(url, json=body).raise_for_status()
+
+
+def delete_session(
+        server_host: str,
+        server_port: int,
+        session_id: str,
+        protocol: str = "http"
+    ) -> None:
+    """
+    Delete a session and everything the server stored for it.
+    """
+    url = session_url(server_host, server_port, session_id, protocol)
+    print(f"DELETE {url}")
+    requests.delete(url).raise_for_status()
+
+
 class Communication:
     """
     Network communications with the server.
@@ -34,6 +86,7 @@ class Communication:
         client_id: Identifier of this client
         poll_delay: delay between requests in seconds (default: 0.2 s)
         protocol: network protocol to use (default: "http")
+        session_id: session of the server to talk to (default: the server's default session)
     """
 
     def __init__(
@@ -42,11 +95,25 @@ class Communication:
             server_port: int,
             client_id: str,
             poll_delay: float = 0.2,
-            protocol: str = "http"
+            protocol: str = "http",
+            session_id: Optional[str] = None
     ):
-        self.base_url = f"{protocol}://{server_host}:{server_port}"
+        self.base_url = session_url(server_host, server_port, session_id, protocol)
         self.client_id = client_id
         self.poll_delay = poll_delay
+        # Keeps the connection to the server alive between requests, one per thread
+        # as sessions are not thread-safe.
+        self.local = threading.local()
+
+
+    @property
+    def http(self) -> requests.Session:
+        """
+        HTTP session of the calling thread.
+        """
+        if not hasattr(self.local, "http"):
+            self.local.http = requests.Session()
+        return self.local.http
 
 
     def send_private_message(
@@ -65,7 +132,7 @@ class Communication:
 
         url = f"{self.base_url}/private/{client_id_san}/{receiver_id_san}/{label_san}"
         print(f"POST {url}")
-        requests.post(url, message)
+        self.http.post(url, message)
 
 
     def retrieve_private_message(
@@ -84,7 +151,7 @@ class Communication:
         # So we are doing polling to avoid introducing a new programming paradigm.
         while True:
             print(f"GET  {url}")
-            res = requests.get(url)
+            res = self.http.get(url)
             if res.status_code == 200:
                 return res.content
             time.sleep(self.poll_delay)
@@ -104,7 +171,7 @@ class Communication:
 
         url = f"{self.base_url}/public/{client_id_san}/{label_san}"
         print(f"POST {url}")
-        requests.post(url, message)
+        self.http.post(url, message)
 
 
     def retrieve_public_message(
@@ -126,12 +193,41 @@ class Communication:
         # So we are doing polling to avoid introducing a new programming paradigm.
         while True:
             print(f"GET  {url}")
-            res = requests.get(url)
+            res = self.http.get(url)
             if res.status_code == 200:
                 return res.content
             time.sleep(self.poll_delay)
 
 
+    def retrieve_public_messages(
+            self,
+            sender_ids: Sequence[str],
+            label: str,
+            count: int
+        ) -> Dict[str, bytes]:
+        """
+        Retrieve the public messages of the first `count` senders to publish one with this label.
+        """
+
+        client_id_san = sanitize_url_param(self.client_id)
+        label_san = sanitize_url_param(label)
+
+        pending = list(sender_ids)
+        messages = {}
+        while True:
+            for sender_id in list(pending):
+                sender_id_san = sanitize_url_param(sender_id)
+                url = f"{self.base_url}/public/{client_id_san}/{sender_id_san}/{label_san}"
+                print(f"GET  {url}")
+                res = self.http.get(url)
+                if res.status_code == 200:
+                    messages[sender_id] = res.content
+                    pending.remove(sender_id)
+                    if len(messages) == count:
+                        return messages
+            time.sleep(self.poll_delay)
+
+
     def retrieve_beaver_triplet_shares(
             self,
             op_id: str
@@ -146,5 +242,33 @@ class Communication:
         url = f"{self.base_url}/shares/{client_id_san}/{op_id_san}"
         print(f"GET  {url}")
 
-        res = requests.get(url)
+        res = self.http.get(url)
         return tuple(json.loads(res.text)) # type: ignore
+
+
+    def retrieve_preprocessing_shares(
+            self,
+            operations: List[Tuple[str, str, Sequence[int]]],
+            party: Optional[int] = None,
+            threshold: Optional[int] = None
+        ) -> List[List[int]]:
+        """
+        Retrieve the shares of the preprocessing material of many operations in a single request.
+        Operations are given as (op_id, kind, shape). With our index in the participants of the
+        protocol, the server checks that it deals us the shares of that index, and of the
+        threshold of the protocol, None for additive sharing.
+        """
+
+        client_id_san = sanitize_url_param(self.client_id)
+
+        url = f"{self.base_url}/shares/{client_id_san}"
+        print(f"POST {url}")
+
+        body = [
+            [sanitize_url_param(op_id), kind, list(shape)]
+            for op_id, kind, shape in operations
+        ]
+        params = {} if party is None else {"party": party, "threshold": threshold or 0}
+        res = self.http.post(url, json=body, params=params)
+        res.raise_for_status()
+        return json.loads(res.text)
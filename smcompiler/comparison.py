@@ -0,0 +1,258 @@
+"""
+Interactive sub-protocols of the comparison gates: LessThan, Equals and BitDecompose.
+
+A protocol is a generator run by every party on its shares. Each time it needs values to be
+opened it yields the list of its shares of these values, and it is sent back the opened values,
+so that the protocols of all the gates of a layer open their values together, one message per
+round. It returns the list of its output shares.
+
+The protocols follow the bit decomposition of Damgard et al. ("Unconditionally Secure
+Constant-Rounds Multi-Party Computation for Equality, Comparison, Bits and Exponentiation"),
+with a random field element r and its bits dealt by the trusted third party ("solved bits").
+The prefix ORs and carries are computed by log-depth parallel prefix circuits, so a protocol
+takes O(log l) rounds for l-bit field elements, rather than a constant number of rounds with
+the much larger constants of the unbounded fan-in constructions.
+"""
+
+import functools
+import itertools
+from typing import Callable, Dict, Generator, Iterator, List, Tuple
+
+from expression import BitDecompose, Equals, Expression, LessThan
+from secret_sharing import Share
+
+Protocol = Generator[List[int], List[int], List[int]]
+Triplets = Iterator[Tuple[int, int, int]]
+
+
+def nb_bits() -> int:
+    """The number of bits of the elements of the field."""
+    return Share.FIELD_Q.bit_length()
+
+
+def multiply(
+    xs: List[int], ys: List[int], triplets: Triplets, aggregating: bool
+) -> Protocol:
+    """Multiplies shared values pairwise in one round, with one Beaver triplet each."""
+    FIELD_Q = Share.FIELD_Q
+    material = [next(triplets) for _ in xs]
+    opened = yield [x - a for x, (a, _, _) in zip(xs, material)] + [
+        y - b for y, (_, b, _) in zip(ys, material)
+    ]
+    length = len(xs)
+    products = []
+    for i, (x, y, (_, _, c)) in enumerate(zip(xs, ys, material)):
+        x_a = opened[i]
+        y_b = opened[length + i]
+        z = c + x * y_b + y * x_a
+        if aggregating:
+            z -= x_a * y_b
+        products.append(z % FIELD_Q)
+    return products
+
+
+def prefix_or(bits: List[int], triplets: Triplets, aggregating: bool) -> Protocol:
+    """
+    Computes the ORs of the shared bits from each bit up to the most significant one,
+    bits being given least significant first, in ceil(log2(len(bits))) rounds.
+    """
+    FIELD_Q = Share.FIELD_Q
+    ors = list(bits)
+    distance = 1
+    while distance < len(ors):
+        lows = ors[: len(ors) - distance]
+        highs = ors[distance:]
+        products = yield from multiply(lows, highs, triplets, aggregating)
+        # a or b = a + b - a * b
+        for i, product in enumerate(products):
+            ors[i] = (ors[i] + highs[i] - product) % FIELD_Q
+        distance *= 2
+    return ors
+
+
+def or_all(bits: List[int], triplets: Triplets, aggregating: bool) -> Protocol:
+    """Computes the OR of all the shared bits by a balanced tree, in ceil(log2(len(bits))) rounds."""
+    FIELD_Q = Share.FIELD_Q
+    bits = list(bits)
+    while len(bits) > 1:
+        half = len(bits) // 2
+        lows = bits[:half]
+        highs = bits[half : 2 * half]
+        products = yield from multiply(lows, highs, triplets, aggregating)
+        ors = [(a + b - p) % FIELD_Q for a, b, p in zip(lows, highs, products)]
+        bits = ors + bits[2 * half :]
+    return bits
+
+
+def greater_than_public(
+    bits: List[int], public: int, triplets: Triplets, aggregating: bool
+) -> Protocol:
+    """
+    Computes [x > public] for the shared bits of x, least significant first: x is greater when,
+    at the most significant bit where they differ, the bit of public is 0.
+    """
+    FIELD_Q = Share.FIELD_Q
+    one = int(aggregating)
+    # shares of x_i xor public_i, linear as public is known
+    differences = [
+        one - bit if (public >> i) & 1 else bit for i, bit in enumerate(bits)
+    ]
+    ors = yield from prefix_or(differences, triplets, aggregating)
+    # the first difference from the top is where the prefix ORs go from 0 to 1
+    greater = 0
+    for i in range(len(bits)):
+        if not (public >> i) & 1:
+            greater += ors[i] - (ors[i + 1] if i + 1 < len(bits) else 0)
+    return [greater % FIELD_Q]
+
+
+def bit_decompose(
+    x: int, solved_bits: List[int], triplets: Triplets, aggregating: bool
+) -> Protocol:
+    """
+    Computes the shares of the bits of x, least significant first, from solved bits r.
+    We open c = x + r, so that x = c - r + q [c < r], and subtract the bits of r from the ones
+    of t = c + q [c < r] with a carry-lookahead subtractor.
+    """
+    FIELD_Q = Share.FIELD_Q
+    length = nb_bits()
+    one = int(aggregating)
+    r = solved_bits[0]
+    r_bits = solved_bits[1:]
+
+    (c,) = yield [x + r]
+    (wraps,) = yield from greater_than_public(r_bits, c, triplets, aggregating)
+    # t_i is bit i of c, or of c + q if c < r: linear in [c < r]
+    wrapped = c + FIELD_Q
+    t_bits = [
+        one * ((c >> i) & 1) + wraps * (((wrapped >> i) & 1) - ((c >> i) & 1))
+        for i in range(length)
+    ]
+
+    # t - r = t + not(r) + 1 modulo 2^l, and x < q < 2^l
+    not_r = [one - bit for bit in r_bits]
+    generates = yield from multiply(t_bits, not_r, triplets, aggregating)
+    propagates = [
+        (t + n - 2 * g) % FIELD_Q for t, n, g in zip(t_bits, not_r, generates)
+    ]
+
+    # Kogge-Stone prefix of (generate, propagate) pairs over bits 0 to l - 2
+    group_generates = generates[: length - 1]
+    group_propagates = propagates[: length - 1]
+    distance = 1
+    while distance < length - 1:
+        highs = range(distance, length - 1)
+        products = yield from multiply(
+            [group_propagates[i] for i in highs] * 2,
+            [group_generates[i - distance] for i in highs]
+            + [group_propagates[i - distance] for i in highs],
+            triplets,
+            aggregating,
+        )
+        count = len(highs)
+        for k, i in enumerate(highs):
+            group_generates[i] = (group_generates[i] + products[k]) % FIELD_Q
+            group_propagates[i] = products[count + k]
+        distance *= 2
+
+    # carry into bit i + 1 is G + P * (carry into bit 0), and the carry into bit 0 is 1
+    carries = [one] + [
+        (g + p) % FIELD_Q for g, p in zip(group_generates, group_propagates)
+    ]
+    products = yield from multiply(propagates, carries, triplets, aggregating)
+    return [
+        (p + carry - 2 * product) % FIELD_Q
+        for p, carry, product in zip(propagates, carries, products)
+    ]
+
+
+def less_than(
+    operands: List[int], solved_bits: List[int], triplets: Triplets, aggregating: bool
+) -> Protocol:
+    """[x < y] is the sign bit of x - y, that is [x - y mod q > (q - 1) / 2]."""
+    x, y = operands
+    bits = yield from bit_decompose(x - y, solved_bits, triplets, aggregating)
+    greater = yield from greater_than_public(
+        bits, (Share.FIELD_Q - 1) // 2, triplets, aggregating
+    )
+    return greater
+
+
+def equals(
+    operands: List[int], solved_bits: List[int], triplets: Triplets, aggregating: bool
+) -> Protocol:
+    """[x = y] is [x - y + r = r]: we open c = x - y + r and compare the bits of c and r."""
+    FIELD_Q = Share.FIELD_Q
+    x, y = operands
+    one = int(aggregating)
+    r = solved_bits[0]
+    r_bits = solved_bits[1:]
+    (c,) = yield [x - y + r]
+    differences = [one - bit if (c >> i) & 1 else bit for i, bit in enumerate(r_bits)]
+    (differ,) = yield from or_all(differences, triplets, aggregating)
+    return [(one - differ) % FIELD_Q]
+
+
+def decompose(
+    operands: List[int], solved_bits: List[int], triplets: Triplets, aggregating: bool
+) -> Protocol:
+    """The bits of x, least significant first."""
+    (x,) = operands
+    bits = yield from bit_decompose(x, solved_bits, triplets, aggregating)
+    return bits
+
+
+# The sub-protocol of each comparison gate, from its operands, the solved bits
+# [r, r_0, ..., r_(l-1)] and the Beaver triplets of its preprocessing material.
+PROTOCOLS: Dict[type, Callable[[List[int], List[int], Triplets, bool], Protocol]] = {
+    LessThan: less_than,
+    Equals: equals,
+    BitDecompose: decompose,
+}
+
+
+def start_protocol(
+    gate: Expression, operands: List[int], material: List[int], aggregating: bool
+) -> Protocol:
+    """Starts the protocol of a comparison gate on its material from the trusted third party."""
+    start = 1 + nb_bits()
+    values = iter(material[start:])
+    triplets = zip(values, values, values)
+    return PROTOCOLS[type(gate)](operands, material[:start], triplets, aggregating)
+
+
+@functools.lru_cache(maxsize=None)
+def dry_run(kind: type, nb_operands: int, field: int) -> Tuple[int, Tuple[int, ...]]:
+    """
+    The number of Beaver triplets of the protocol of a kind of gate in a given field, and the
+    number of values it opens in each of its rounds, found by running it on zeros: protocols do
+    not branch on the values they open.
+    """
+    counter = itertools.count()
+    triplets = ((0, 0, 0) for _ in counter)
+    protocol = PROTOCOLS[kind](
+        [0] * nb_operands, [0] * (1 + nb_bits()), triplets, False
+    )
+    request = next(protocol)
+    openings = [len(request)]
+    try:
+        while True:
+            request = protocol.send([0] * len(request))
+            openings.append(len(request))
+    except StopIteration:
+        return next(counter), tuple(openings)
+
+
+def protocol_triplets(kind: type, nb_operands: int, field: int) -> int:
+    """The number of Beaver triplets the protocol of a kind of gate consumes in a given field."""
+    return dry_run(kind, nb_operands, field)[0]
+
+
+def protocol_rounds(kind: type, nb_operands: int, field: int) -> int:
+    """The number of rounds of openings of the protocol of a kind of gate in a given field."""
+    return len(dry_run(kind, nb_operands, field)[1])
+
+
+def protocol_openings(kind: type, nb_operands: int, field: int) -> Tuple[int, ...]:
+    """The number of values the protocol of a kind of gate opens in each of its rounds."""
+    return dry_run(kind, nb_operands, field)[1]
@@ -0,0 +1,80 @@
+"""
+Fixtures of the tests running protocols on a server: one long-lived server per test module, in
+which each test runs its protocols in sessions of its own.
+"""
+
+import time
+from multiprocessing import Process
+
+import pytest
+import requests
+
+from communication import create_session, delete_session
+from server import run
+
+HOST = "localhost"
+PORT = 5000
+
+
+def start_server(port, participants, threshold=None, triplet_store=None):
+    """Runs a server in a new process, and returns the process once the server answers."""
+    process = Process(
+        target=run, args=(HOST, port, participants, threshold, triplet_store)
+    )
+    process.start()
+    while True:
+        try:
+            requests.get(f"http://{HOST}:{port}/communication_cost")
+            return process
+        except requests.ConnectionError:
+            if not process.is_alive():
+                raise RuntimeError(f"The server on port {port} did not start")
+            time.sleep(0.1)
+
+
+def stop_server(process):
+    process.terminate()
+    process.join()
+
+
+@pytest.fixture(scope="module")
+def server():
+    """The server of the tests of a module, on PORT."""
+    process = start_server(PORT, [])
+    yield process
+    stop_server(process)
+
+
+@pytest.fixture
+def new_session(server, request):
+    """
+    Creates sessions of the test on the server: new_session(participants, threshold=None) returns
+    the ID of a new session, which is deleted at the end of the test.
+    """
+    session_ids = []
+
+    def create(participants, threshold=None):
+        session_id = f"{request.node.name}.{len(session_ids)}"
+        create_session(HOST, PORT, session_id, participants, threshold=threshold)
+        session_ids.append(session_id)
+        return session_id
+
+    yield create
+    for session_id in session_ids:
+        delete_session(HOST, PORT, session_id)
+
+
+@pytest.fixture
+def dedicated_server():
+    """
+    Starts servers of the test only, for the options the sessions do not have, such as a triplet
+    store: dedicated_server(port, participants, threshold=None, triplet_store=None).
+    """
+    processes = []
+
+    def start(*args, **kwargs):
+        processes.append(start_server(*args, **kwargs))
+
+    yield start
+    for process in processes:
+        stop_server(process)
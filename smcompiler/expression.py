@@ -9,29 +9,22 @@ Example expression:
 MODIFY THIS FILE.
 """
 
-import base64
-import random
-from typing import Optional, Tuple
+import functools
+import itertools
+from typing import Dict, List, Optional, Sequence, Tuple
 
-
-ID_BYTES = 4
-
-
-def gen_id() -> bytes:
-    id_bytes = bytearray(random.getrandbits(8) for _ in range(ID_BYTES))
-    return base64.b64encode(id_bytes)
+from secret_sharing import Share
 
 
 class Expression:
     """
     Base class for an arithmetic expression.
+    Expression classes declare __slots__ so that nodes of large expressions carry no instance dict.
+    Nodes have no ID of their own: they are hashed by identity, and gates are numbered when the
+    expression is compiled into a circuit (see circuit.py).
     """
 
-    def __init__(self, id: Optional[bytes] = None):
-        # If ID is not given, then generate one.
-        if id is None:
-            id = gen_id()
-        self.id = id
+    __slots__ = ()
 
     def __add__(self, other):
         return AddOp(self, other)
@@ -42,17 +35,94 @@ class Expression:
     def __mul__(self, other):
         return MultOp(self, other)
 
-    # useful for being able to use it as keys of dictionnaries
-    def __hash__(self):
-        return hash(self.id)
+    def __pow__(self, exponent: int):
+        """
+        Raises the expression to a public non-negative integer power, following an addition
+        chain: each power is the product of two smaller ones, a square whenever possible.
+        """
+        if not isinstance(exponent, int) or exponent < 0:
+            raise ValueError(
+                "Can only raise an expression to a non-negative integer power"
+            )
+        if exponent == 0:
+            return Scalar(1)
+        powers = {1: self}
+        depths = {1: 0}
+        for value in addition_chain(exponent)[1:]:
+            # among the pairs of previous powers summing to value, the shallowest product
+            left = min(
+                (power for power in powers if value - power in powers),
+                key=lambda power: (
+                    max(depths[power], depths[value - power]),
+                    power != value - power,
+                ),
+            )
+            powers[value] = powers[left] * powers[value - left]
+            depths[value] = 1 + max(depths[left], depths[value - left])
+        return powers[exponent]
+
+    def get_operands(self) -> Tuple["Expression", ...]:
+        """Returns the sub-expressions this expression is computed from, none for terms"""
+        return ()
+
+
+# Exponents up to which __pow__ searches a shortest addition chain, square-and-multiply beyond.
+SHORTEST_CHAIN_LIMIT = 256
+
+
+@functools.lru_cache(maxsize=None)
+def addition_chain(exponent: int) -> Tuple[int, ...]:
+    """
+    Returns an addition chain 1 = c_0 < c_1 < ... < c_r = exponent, where each element is the sum
+    of two previous ones. The chain is a shortest one for exponents up to SHORTEST_CHAIN_LIMIT,
+    found by iterative deepening over star chains (whose elements all extend the previous one),
+    and the chain of square-and-multiply beyond.
+    """
+    if exponent < 1:
+        raise ValueError("Addition chains only reach positive integers")
+    if exponent <= SHORTEST_CHAIN_LIMIT:
+        length = exponent.bit_length() - 1
+        while True:
+            chain = _search_chain([1], exponent, length)
+            if chain is not None:
+                return tuple(chain)
+            length += 1
+    chain = [1]
+    for bit in bin(exponent)[3:]:
+        chain.append(2 * chain[-1])
+        if bit == "1":
+            chain.append(chain[-1] + 1)
+    return tuple(chain)
+
+
+def _search_chain(chain: List[int], exponent: int, length: int) -> Optional[List[int]]:
+    """Depth-first search of a star chain to exponent of the given length, extending chain."""
+    last = chain[-1]
+    if last == exponent:
+        return list(chain)
+    remaining = length - len(chain) + 1
+    # even doubling at every remaining step would not reach the exponent
+    if last << remaining < exponent:
+        return None
+    # largest steps first, so doublings are tried before the other additions
+    for value in sorted(
+        {last + a for a in chain if last + a <= exponent}, reverse=True
+    ):
+        chain.append(value)
+        found = _search_chain(chain, exponent, length)
+        chain.pop()
+        if found is not None:
+            return found
+    return None
 
 
 class Scalar(Expression):
     """Term representing a scalar finite field value."""
 
-    def __init__(self, value: int, id: Optional[bytes] = None):
+    __slots__ = ("value",)
+
+    def __init__(self, value: int):
         self.value = value
-        super().__init__(id)
 
     def __repr__(self):
         return f"{self.__class__.__name__}({repr(self.value)})"
@@ -61,9 +131,14 @@ class Scalar(Expression):
 class Secret(Expression):
     """Term representing a secret finite field value (variable)."""
 
-    def __init__(self, value: Optional[int] = None, id: Optional[bytes] = None):
+    __slots__ = ("value",)
+
+    def __init__(self, value: Optional[int] = None):
         self.value = value
-        super().__init__(id)
+
+    def encode(self, value) -> int:
+        """Encodes the value of this secret in a party's value_dict into a field element"""
+        return value
 
     def __repr__(self):
         return (
@@ -74,10 +149,11 @@ class Secret(Expression):
 class Op(Expression):
     """Term representing an operation expression, having two operands"""
 
+    __slots__ = ("a", "b")
+
     def __init__(self, a: Expression, b: Expression):
         if not (isinstance(a, Expression) and isinstance(b, Expression)):
             raise ValueError("Can only construct operation between expressions")
-        super().__init__()
         self.a = a
         self.b = b
 
@@ -102,6 +178,8 @@ class Op(Expression):
 class AddOp(Op):
     """Represents an addition operation"""
 
+    __slots__ = ()
+
     def __repr__(self) -> str:
         return f"({repr(self.a)} + {self.b})"
 
@@ -109,6 +187,8 @@ class AddOp(Op):
 class MultOp(Op):
     """Represents a multiplication operation"""
 
+    __slots__ = ()
+
     def __repr__(self) -> str:
         return f"{repr(self.a)} * {self.b}"
 
@@ -116,5 +196,234 @@ class MultOp(Op):
 class SubOp(Op):
     """Represents a substraction operation"""
 
+    __slots__ = ()
+
     def __repr__(self) -> str:
         return f"({repr(self.a)} - {self.b})"
+
+
+class LessThan(Op):
+    """
+    Represents the comparison [a < b], equal to 1 or 0. The operands are compared as signed
+    values: the comparison is correct when a - b lies in (-q/2, q/2), e.g. when both are in
+    [0, q/2).
+    """
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return f"({repr(self.a)} < {self.b})"
+
+
+class Equals(Op):
+    """Represents the equality test [a = b], equal to 1 or 0"""
+
+    __slots__ = ()
+
+    def __repr__(self) -> str:
+        return f"({repr(self.a)} == {self.b})"
+
+
+class BitDecompose(Expression):
+    """
+    Represents the decomposition of a value into its nb_bits lowest bits, least significant
+    first, by default all the bits of the field. Its value is a vector: its bits are the
+    expressions in `bits`.
+    """
+
+    __slots__ = ("a", "bits")
+
+    def __init__(self, a: Expression, nb_bits: Optional[int] = None):
+        if not isinstance(a, Expression):
+            raise ValueError("Can only decompose an expression")
+        field_bits = Share.FIELD_Q.bit_length()
+        if nb_bits is None:
+            nb_bits = field_bits
+        if not 0 < nb_bits <= field_bits:
+            raise ValueError(f"Can only decompose into 1 to {field_bits} bits")
+        self.a = a
+        self.bits = tuple(Bit(self, index) for index in range(nb_bits))
+
+    def get_operands(self) -> Tuple[Expression, ...]:
+        """Returns the decomposed expression"""
+        return (self.a,)
+
+    def __repr__(self) -> str:
+        return f"BitDecompose({repr(self.a)})"
+
+
+class Bit(Expression):
+    """Represents the bit of a given index of a bit decomposition"""
+
+    __slots__ = ("decomposition", "index")
+
+    def __init__(self, decomposition: BitDecompose, index: int):
+        self.decomposition = decomposition
+        self.index = index
+
+    def get_operands(self) -> Tuple[Expression, ...]:
+        """Returns the bit decomposition this bit belongs to"""
+        return (self.decomposition,)
+
+    def __repr__(self) -> str:
+        return f"{repr(self.decomposition)}[{self.index}]"
+
+
+class Truncate(Expression):
+    """
+    Represents the division of a signed value by 2^bits, rounded down or up at random, used to
+    rescale fixed-point products (see fixed_point.py)
+    """
+
+    __slots__ = ("a", "bits")
+
+    def __init__(self, a: Expression, bits: int):
+        if not isinstance(a, Expression):
+            raise ValueError("Can only truncate an expression")
+        self.a = a
+        self.bits = bits
+
+    def get_operands(self) -> Tuple[Expression, ...]:
+        """Returns the truncated expression"""
+        return (self.a,)
+
+    def __repr__(self) -> str:
+        return f"({repr(self.a)} >> {self.bits})"
+
+
+def maximum(a: Expression, b: Expression) -> Expression:
+    """The largest of two expressions, compared as LessThan does"""
+    return b + LessThan(b, a) * (a - b)
+
+
+def minimum(a: Expression, b: Expression) -> Expression:
+    """The smallest of two expressions, compared as LessThan does"""
+    return a + LessThan(b, a) * (b - a)
+
+
+class InnerProduct(Expression):
+    """Represents the inner product sum(xs[i] * ys[i]) of two vectors of expressions"""
+
+    __slots__ = ("xs", "ys")
+
+    def __init__(self, xs: Sequence[Expression], ys: Sequence[Expression]):
+        xs = tuple(xs)
+        ys = tuple(ys)
+        if not xs or len(xs) != len(ys):
+            raise ValueError(
+                "Can only compute the inner product of two vectors of the same length"
+            )
+        if not all(isinstance(term, Expression) for term in xs + ys):
+            raise ValueError("Can only compute the inner product of expressions")
+        self.xs = xs
+        self.ys = ys
+
+    def get_operands(self) -> Tuple[Expression, ...]:
+        """Returns the terms of both vectors, xs first"""
+        return self.xs + self.ys
+
+    def __repr__(self) -> str:
+        return f"InnerProduct({list(self.xs)}, {list(self.ys)})"
+
+
+class MatMul(Expression):
+    """
+    Represents the product of a rows x inner matrix xs by an inner x cols matrix ys of expressions.
+    Its value is a matrix: its coefficients are the expressions in `entries`.
+    """
+
+    __slots__ = ("xs", "ys", "rows", "inner", "cols", "entries")
+
+    def __init__(
+        self,
+        xs: Sequence[Sequence[Expression]],
+        ys: Sequence[Sequence[Expression]],
+    ):
+        xs = tuple(tuple(row) for row in xs)
+        ys = tuple(tuple(row) for row in ys)
+        if not xs or not ys or not xs[0] or not ys[0]:
+            raise ValueError("Can only multiply non-empty matrices")
+        if any(len(row) != len(xs[0]) for row in xs) or any(
+            len(row) != len(ys[0]) for row in ys
+        ):
+            raise ValueError("Can only multiply matrices with rows of the same length")
+        if len(xs[0]) != len(ys):
+            raise ValueError("Can only multiply matrices of compatible dimensions")
+        if not all(isinstance(term, Expression) for row in xs + ys for term in row):
+            raise ValueError("Can only multiply matrices of expressions")
+        self.xs = xs
+        self.ys = ys
+        self.rows, self.inner, self.cols = len(xs), len(ys), len(ys[0])
+        self.entries = tuple(
+            tuple(MatrixEntry(self, i, j) for j in range(self.cols))
+            for i in range(self.rows)
+        )
+
+    def get_operands(self) -> Tuple[Expression, ...]:
+        """Returns the coefficients of both matrices row by row, xs first"""
+        return tuple(itertools.chain.from_iterable(self.xs + self.ys))
+
+    def __repr__(self) -> str:
+        return f"MatMul({[list(row) for row in self.xs]}, {[list(row) for row in self.ys]})"
+
+
+class MatrixEntry(Expression):
+    """Represents the coefficient at a given row and column of a matrix product"""
+
+    __slots__ = ("product", "row", "col")
+
+    def __init__(self, product: MatMul, row: int, col: int):
+        self.product = product
+        self.row = row
+        self.col = col
+
+    def get_operands(self) -> Tuple[Expression, ...]:
+        """Returns the matrix product this coefficient belongs to"""
+        return (self.product,)
+
+    def __repr__(self) -> str:
+        return f"{repr(self.product)}[{self.row}][{self.col}]"
+
+
+class Matrix:
+    """
+    A matrix of expressions, multiplied with the @ operator into a single MatMul gate.
+
+    Example:
+    >>> weights = Matrix.secrets(2, 3)
+    >>> features = Matrix.secrets(3, 1)
+    >>> scores = weights @ features
+    >>> expr = scores[0][0] + scores[1][0]
+    """
+
+    __slots__ = ("entries",)
+
+    def __init__(self, entries: Sequence[Sequence[Expression]]):
+        self.entries = tuple(tuple(row) for row in entries)
+
+    @classmethod
+    def secrets(cls, rows: int, cols: int) -> "Matrix":
+        """A matrix of fresh secrets."""
+        return cls([[Secret() for _ in range(cols)] for _ in range(rows)])
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.entries), len(self.entries[0])
+
+    def __getitem__(self, row: int) -> Tuple[Expression, ...]:
+        return self.entries[row]
+
+    def __matmul__(self, other: "Matrix") -> "Matrix":
+        return Matrix(MatMul(self.entries, other.entries).entries)
+
+    def assign(self, values: Sequence[Sequence[int]]) -> Dict[Secret, int]:
+        """Maps the secrets of this matrix to the given values, to build the value_dict of a party."""
+        return {
+            entry: value
+            for row, value_row in zip(self.entries, values)
+            for entry, value in zip(row, value_row)
+            if isinstance(entry, Secret)
+        }
+
+    def __repr__(self) -> str:
+        return f"Matrix({[list(row) for row in self.entries]})"
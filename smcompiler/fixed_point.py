@@ -0,0 +1,141 @@
+"""
+Fixed-point arithmetic over the field.
+
+A real number x is encoded with f fractional bits as the field element round(x * 2^f), negative
+numbers wrapping around to q - round(|x| * 2^f). Additions work as they are, but a product has
+2f fractional bits and must be truncated by f bits to come back to the encoding. Truncation uses
+the probabilistic protocol of Catrina and Saxena ("Secure Computation With Fixed-Point
+Numbers"): with a pair (r, r >> f) from the trusted third party, the parties open a + r and
+shift it in the clear. It takes one round, and the result may be off by one unit in the last
+place.
+
+The protocol is correct and leaks at most 2^-STATISTICAL_SECURITY about a when |a| is below
+2^(magnitude_bits() - 1), so for products of encodings, |x * y| must stay below
+2^(magnitude_bits() - 1 - 2f).
+"""
+
+from typing import Generator, List, Optional, Union
+
+from expression import Expression, Scalar, Secret, Truncate
+from secret_sharing import Share
+
+# Default number of fractional bits of encodings.
+FRACTIONAL_BITS = 12
+
+# Bits of statistical security of the masking of truncations.
+STATISTICAL_SECURITY = 20
+
+Number = Union[int, float]
+
+
+def magnitude_bits() -> int:
+    """The number of bits of the signed values truncation applies to, leaving room for masks."""
+    return Share.FIELD_Q.bit_length() - STATISTICAL_SECURITY - 2
+
+
+def encode(value: Number, fractional_bits: int = FRACTIONAL_BITS) -> int:
+    """Encodes a real number into a field element with the given number of fractional bits."""
+    return round(value * (1 << fractional_bits)) % Share.FIELD_Q
+
+
+def decode(value: int, fractional_bits: int = FRACTIONAL_BITS) -> float:
+    """Decodes a field element into the real number it encodes, as a signed value."""
+    FIELD_Q = Share.FIELD_Q
+    if value > (FIELD_Q - 1) // 2:
+        value -= FIELD_Q
+    return value / (1 << fractional_bits)
+
+
+class FixedPointSecret(Secret):
+    """A secret real number, encoded with the given number of fractional bits when shared."""
+
+    __slots__ = ("fractional_bits",)
+
+    def __init__(
+        self, value: Optional[Number] = None, fractional_bits: int = FRACTIONAL_BITS
+    ):
+        super().__init__(value)
+        self.fractional_bits = fractional_bits
+
+    def encode(self, value) -> int:
+        return encode(value, self.fractional_bits)
+
+
+class Fixed:
+    """
+    A fixed-point expression: wraps an expression whose value encodes a real number with
+    fractional_bits fractional bits, and truncates products back to this encoding.
+
+    Example:
+    >>> price = Fixed.secret()
+    >>> quantity = Fixed.secret()
+    >>> total = price * quantity * 1.2 + 5
+    >>> expr = total.expr
+    >>> value_dict = {price.expr: 3.25}
+    """
+
+    __slots__ = ("expr", "fractional_bits")
+
+    def __init__(self, expr: Expression, fractional_bits: int = FRACTIONAL_BITS):
+        self.expr = expr
+        self.fractional_bits = fractional_bits
+
+    @classmethod
+    def secret(cls, fractional_bits: int = FRACTIONAL_BITS) -> "Fixed":
+        """A fresh secret real number."""
+        return cls(FixedPointSecret(fractional_bits=fractional_bits), fractional_bits)
+
+    def decode(self, value: int) -> float:
+        """Decodes the result of the protocol computing this expression."""
+        return decode(value, self.fractional_bits)
+
+    def _operand(self, other: Union["Fixed", Number]) -> Expression:
+        if isinstance(other, Fixed):
+            if other.fractional_bits != self.fractional_bits:
+                raise ValueError(
+                    "Can only operate on fixed-point values of the same precision"
+                )
+            return other.expr
+        return Scalar(encode(other, self.fractional_bits))
+
+    def __add__(self, other: Union["Fixed", Number]) -> "Fixed":
+        return Fixed(self.expr + self._operand(other), self.fractional_bits)
+
+    def __radd__(self, other: Number) -> "Fixed":
+        return Fixed(self._operand(other) + self.expr, self.fractional_bits)
+
+    def __sub__(self, other: Union["Fixed", Number]) -> "Fixed":
+        return Fixed(self.expr - self._operand(other), self.fractional_bits)
+
+    def __rsub__(self, other: Number) -> "Fixed":
+        return Fixed(self._operand(other) - self.expr, self.fractional_bits)
+
+    def __mul__(self, other: Union["Fixed", Number]) -> "Fixed":
+        if isinstance(other, int):
+            # integers keep the encoding, no truncation needed
+            return Fixed(self.expr * Scalar(other), self.fractional_bits)
+        product = self.expr * self._operand(other)
+        return Fixed(Truncate(product, self.fractional_bits), self.fractional_bits)
+
+    def __rmul__(self, other: Number) -> "Fixed":
+        return self * other
+
+    def __repr__(self) -> str:
+        return f"Fixed({repr(self.expr)}, {self.fractional_bits})"
+
+
+def truncate(
+    bits: int, operands: List[int], material: List[int], aggregating: bool
+) -> Generator[List[int], List[int], List[int]]:
+    """
+    The truncation protocol, in the form of the sub-protocols of comparison.py: we open
+    c = a + 2^(k-1) + r, where the shift makes a positive, and c >> bits - r >> bits - 2^(k-1-bits)
+    is a >> bits, plus the carry of the low bits of a + r.
+    """
+    FIELD_Q = Share.FIELD_Q
+    (a,) = operands
+    r, r_high = material
+    one = int(aggregating)
+    shift = 1 << (magnitude_bits() - 1)
+    (c,) = yield [a + one * shift + r]
+    return [(one * ((c >> bits) - (shift >> bits)) - r_high) % FIELD_Q]
@@ -0,0 +1,120 @@
+"""
+Number-theoretic transforms: the discrete Fourier transform over the field of the shares, which
+evaluates a polynomial at all the N-th roots of unity, and interpolates it back, in O(N log N).
+N must be a power of two dividing the size of the field minus one.
+"""
+
+import functools
+from typing import List, Tuple
+
+from prime_gen import root_of_unity
+
+# Below this size, schoolbook products of polynomials are faster than transforms in Python.
+SCHOOLBOOK_LIMIT = 32
+
+
+def domain_size(count: int) -> int:
+    """The smallest power of two at least count."""
+    return 1 << max(count - 1, 0).bit_length()
+
+
+@functools.lru_cache(maxsize=None)
+def twiddles(size: int, field: int, inverse: bool) -> Tuple[Tuple[int, ...], ...]:
+    """
+    The powers of the root of unity (or of its inverse) used by each butterfly stage of a
+    transform of the given size, cached per size.
+    """
+    root = root_of_unity(size, field)
+    if inverse:
+        root = pow(root, -1, field)
+    stages = []
+    length = 2
+    while length <= size:
+        step = pow(root, size // length, field)
+        powers = [1]
+        for _ in range(length // 2 - 1):
+            powers.append(powers[-1] * step % field)
+        stages.append(tuple(powers))
+        length *= 2
+    return tuple(stages)
+
+
+def ntt(values: List[int], field: int, inverse: bool = False) -> List[int]:
+    """
+    The values at 1, w, ..., w^(N - 1) of the polynomial with the given N coefficients, w being
+    the N-th root of unity of `root_of_unity`, or the coefficients from the values if inverse.
+    Iterative radix-2 Cooley-Tukey transform.
+    """
+    size = len(values)
+    if size == 0 or size & (size - 1):
+        raise ValueError(f"The size of a transform must be a power of two, got {size}")
+    # bit-reversal permutation
+    bits = size.bit_length() - 1
+    result = [0] * size
+    for index, value in enumerate(values):
+        reversed_index = int(format(index, f"0{bits}b")[::-1], 2) if bits else 0
+        result[reversed_index] = value % field
+
+    for stage, powers in enumerate(twiddles(size, field, inverse)):
+        half = 1 << stage
+        for start in range(0, size, 2 * half):
+            for j, power in enumerate(powers, start):
+                u = result[j]
+                v = result[j + half] * power % field
+                result[j] = (u + v) % field
+                result[j + half] = (u - v) % field
+
+    if inverse:
+        scale = pow(size, -1, field)
+        result = [value * scale % field for value in result]
+    return result
+
+
+def poly_multiply(xs: List[int], ys: List[int], field: int) -> List[int]:
+    """The coefficients of the product of two polynomials, lowest degree first."""
+    if not xs or not ys:
+        return []
+    length = len(xs) + len(ys) - 1
+    if min(len(xs), len(ys)) <= SCHOOLBOOK_LIMIT:
+        product = [0] * length
+        for i, x in enumerate(xs):
+            for j, y in enumerate(ys):
+                product[i + j] += x * y
+        return [value % field for value in product]
+    size = domain_size(length)
+    x_values = ntt(xs + [0] * (size - len(xs)), field)
+    y_values = ntt(ys + [0] * (size - len(ys)), field)
+    return ntt([x * y for x, y in zip(x_values, y_values)], field, inverse=True)[
+        :length
+    ]
+
+
+def vanishing_polynomial(points: List[int], field: int) -> List[int]:
+    """The coefficients of the product of (x - point) over the points, by a tree of products."""
+    polynomials = [[-point % field, 1] for point in points] or [[1]]
+    while len(polynomials) > 1:
+        pairs = zip(polynomials[::2], polynomials[1::2])
+        products = [poly_multiply(xs, ys, field) for xs, ys in pairs]
+        polynomials = products + polynomials[len(products) * 2 :]
+    return polynomials[0]
+
+
+@functools.lru_cache(maxsize=None)
+def lagrange_at_zero(
+    exponents: Tuple[int, ...], size: int, field: int
+) -> Tuple[int, ...]:
+    """
+    The coefficients interpolating a polynomial at 0 from its values at the powers w^e of the
+    size-th root of unity, cached per set of exponents. With Z the vanishing polynomial of the
+    points, the coefficient of x_i is Z(0) / (-x_i Z'(x_i)), and Z' is evaluated at all the
+    roots by a single transform: O(m log^2 m + size log size) rather than O(m^2) for m points.
+    """
+    root = root_of_unity(size, field)
+    points = [pow(root, exponent, field) for exponent in exponents]
+    vanishing = vanishing_polynomial(points, field)
+    derivative = [k * coefficient for k, coefficient in enumerate(vanishing)][1:]
+    derivative_values = ntt(derivative + [0] * (size - len(derivative)), field)
+    return tuple(
+        vanishing[0] * pow(-point * derivative_values[exponent], -1, field) % field
+        for exponent, point in zip(exponents, points)
+    )
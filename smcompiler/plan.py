@@ -0,0 +1,123 @@
+"""
+Execution plans: everything a party needs to run a protocol, derived once from its specification.
+
+The plan is the same for every party, who only looks up its own entries: the compiled circuit
+with its gates in evaluation order, the messages of each round with their labels, the material
+each gate needs and which party provides which inputs.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from circuit import Circuit
+from expression import Secret
+from preprocessing import check_material, check_scheme
+from secret_sharing import SharingScheme, sharing_scheme
+
+
+class ExecutionPlan:
+    """
+    The compiled form of a ProtocolSpec, picklable so that it can be shipped to the parties.
+
+    Attributes:
+        participant_ids (Tuple[str, ...]): the parties, in the order of their shares
+        threshold, packing, dealer_free: as in the ProtocolSpec
+        circuit (Circuit): the expression compiled into numbered gates, in evaluation order
+        scheme (SharingScheme): the secret sharing scheme of the protocol
+        adds_constants (Dict[str, bool]): whether each party adds the public constants
+        inputs (Optional[Dict[str, List[int]]]): the input gates of each party, if the
+            specification gives the owners of the secrets
+        preprocessing (List[Tuple[int, str, Tuple[int, ...]]]): the gate, kind and shape of the
+            material of every Beaver multiplication and sub-protocol of a run
+        rounds (List[List[str]]): the keys of the labels of the openings of each layer, one per
+            round
+        nonce (str): as in the ProtocolSpec, namespacing the labels of its messages
+    """
+
+    # the keys of the labels of the inputs sent by a party, and of the opening of the output
+    INPUTS = "inputs."
+    OUTPUT = "final_share"
+
+    def __init__(
+        self,
+        participant_ids: Sequence[str],
+        circuit: Circuit,
+        threshold: Optional[int] = None,
+        packing: Optional[int] = None,
+        dealer_free: bool = False,
+        input_owners: Optional[Dict[Secret, str]] = None,
+        nonce: str = "",
+    ):
+        self.participant_ids = tuple(participant_ids)
+        self.nonce = nonce
+        self.threshold = threshold
+        self.packing = packing
+        self.dealer_free = dealer_free
+        self.circuit = circuit
+        self.scheme: SharingScheme = sharing_scheme(threshold, len(participant_ids))
+        if dealer_free:
+            check_scheme(self.scheme, len(participant_ids))
+        self.adds_constants = {
+            id: self.scheme.adds_constants(party)
+            for party, id in enumerate(participant_ids)
+        }
+
+        self.inputs: Optional[Dict[str, List[int]]] = None
+        if input_owners is not None:
+            self.inputs = {id: [] for id in participant_ids}
+            for secret, owner in input_owners.items():
+                if owner not in self.inputs:
+                    raise ValueError(f"{owner} owns {secret} but is not a participant")
+                if secret in self.circuit.gate_ids:
+                    self.inputs[owner].append(self.circuit.gate_ids[secret])
+            missing = set(self.circuit.inputs) - {
+                gate for gates in self.inputs.values() for gate in gates
+            }
+            if missing:
+                raise ValueError(f"Secrets of gates {sorted(missing)} have no owner")
+
+        self.preprocessing: List[Tuple[int, str, Tuple[int, ...]]] = [
+            (gate, *circuit.preprocessing(gate)) for gate in circuit.beaver_ops
+        ]
+        if dealer_free:
+            check_material(kind for _, kind, _ in self.preprocessing)
+        self.rounds: List[List[str]] = []
+        for depth, layer in enumerate(circuit.layers):
+            nb_rounds = max(circuit.rounds(gate) for gate in layer)
+            self.rounds.append(
+                [f"layer{depth}"]
+                + [f"layer{depth}.{round}" for round in range(1, nb_rounds)]
+            )
+
+    def label(self, run: int, key: str) -> str:
+        """
+        The label of a message, namespaced by the circuit, the specification and the run it
+        belongs to so that runs never collide, even of specifications of the same structure
+        sharing a session.
+        """
+        return f"{self.circuit.digest}.{self.nonce}.{run}.{key}"
+
+    def input_key(self, id: str) -> str:
+        """The key of the label of the inputs a party sends."""
+        return self.INPUTS + id
+
+    def senders(self, client_id: str) -> List[str]:
+        """
+        The parties that send their input shares to a party: the other parties owning secrets,
+        or all of them if the owners are unknown.
+        """
+        return [
+            id
+            for id in self.participant_ids
+            if id != client_id and (self.inputs is None or self.inputs[id])
+        ]
+
+    def owns(self, client_id: str, secret: Secret) -> bool:
+        """Whether a party may provide the value of a secret."""
+        gate = self.circuit.gate_ids.get(secret)
+        if gate is None:
+            return False
+        return self.inputs is None or gate in self.inputs[client_id]
+
+    def nb_rounds(self) -> int:
+        """The number of rounds of openings of a run, the output included."""
+        return sum(len(keys) for keys in self.rounds) + 1
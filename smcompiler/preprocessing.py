@@ -0,0 +1,170 @@
+"""
+Dealer-free preprocessing: the parties generate the material of their products themselves, in
+one batch per run ahead of its online phase, instead of retrieving it from the trusted third party.
+
+With Shamir sharing of threshold t among n >= 2t + 1 parties, the product of the shares of two
+values is a share of their product on a polynomial of degree 2t, which n parties can still
+interpolate. Following Gennaro, Rabin and Rabin ("Simplified VSS and fast-track multiparty
+computations"), each party reshares its local products with degree t, and the parties recombine
+the reshares with the Lagrange coefficients of all the n points:
+- in a first round, each party deals random values, whose sums are the shared a and b;
+- in a second round, each party deals its local products of a and b, whose combination is c.
+This is secure against a semi-honest minority, like the rest of the protocol.
+"""
+
+import pickle
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from communication import Communication
+from secret_sharing import (
+    ShamirSharing,
+    Share,
+    SharingScheme,
+    matrix_product,
+    random_field_elements,
+)
+
+# The shape (rows, inner, cols) of the product of each kind of material, from its shape.
+PRODUCT_SHAPES: Dict[str, Callable[..., Tuple[int, int, int]]] = {
+    "triplet": lambda: (1, 1, 1),
+    "square": lambda: (1, 1, 1),
+    "inner": lambda length: (1, length, 1),
+    "matrix": lambda rows, inner, cols: (rows, inner, cols),
+}
+
+
+def material_size(kind: str, shape: tuple) -> int:
+    """The number of field elements of a party's shares of some preprocessing material."""
+    if kind in PRODUCT_SHAPES:
+        rows, inner, cols = PRODUCT_SHAPES[kind](*shape)
+        if kind == "square":
+            return 2
+        return rows * inner + inner * cols + rows * cols
+    if kind == "solved_bits":
+        nb_bits, nb_triplets = shape
+        return 1 + nb_bits + 3 * nb_triplets
+    if kind == "truncation":
+        return 2
+    if kind == "random_bits":
+        return shape[0]
+    raise ValueError(f"Unknown preprocessing material {kind}")
+
+
+def check_scheme(scheme: SharingScheme, num_parties: int) -> None:
+    """Raises a ValueError unless the parties can multiply shares of the scheme without a dealer."""
+    if not isinstance(scheme, ShamirSharing):
+        raise ValueError("Dealer-free preprocessing needs Shamir sharing")
+    if num_parties < 2 * scheme.threshold + 1:
+        raise ValueError(
+            f"Dealer-free preprocessing needs at least {2 * scheme.threshold + 1} parties"
+            f" for a threshold of {scheme.threshold}, got {num_parties}"
+        )
+
+
+def check_material(kinds: Iterable[str]) -> None:
+    """Raises a ValueError unless the parties can generate material of the kinds without a dealer."""
+    for kind in kinds:
+        if kind not in PRODUCT_SHAPES:
+            raise ValueError(
+                f"The {kind} material cannot be generated without a dealer"
+            )
+
+
+def deal(
+    comm: Communication,
+    participant_ids: Sequence[str],
+    scheme: SharingScheme,
+    label: str,
+    values: List[int],
+) -> List[List[int]]:
+    """
+    Shares our values among the parties, in one message per party, and returns the shares we
+    hold of the values dealt by every party, by party.
+    """
+    rows = scheme.share(values, len(participant_ids))
+    for id, row in zip(participant_ids, rows):
+        if id != comm.client_id:
+            comm.send_private_message(
+                id, f"{label}.{comm.client_id}", pickle.dumps(row)
+            )
+    mine = participant_ids.index(comm.client_id)
+    return [
+        (
+            rows[mine]
+            if id == comm.client_id
+            else pickle.loads(comm.retrieve_private_message(f"{label}.{id}"))
+        )
+        for id in participant_ids
+    ]
+
+
+def generate_material(
+    comm: Communication,
+    participant_ids: Sequence[str],
+    scheme: SharingScheme,
+    label: str,
+    operations: List[Tuple[str, Sequence[int]]],
+) -> List[List[int]]:
+    """
+    Generates together with the other parties the material of the given (kind, shape) operations,
+    and returns our shares of it, laid out like the material of the trusted third party: a, b and
+    c for the products, a and a^2 for the squares. Every party must call it with the same label
+    and operations.
+    """
+    FIELD_Q = Share.FIELD_Q
+    num_parties = len(participant_ids)
+    check_scheme(scheme, num_parties)
+    check_material(kind for kind, _ in operations)
+    shapes = [PRODUCT_SHAPES[kind](*shape) for kind, shape in operations]
+    # a square only needs a, as b is a
+    sizes = [
+        rows * inner + (0 if kind == "square" else inner * cols)
+        for (kind, _), (rows, inner, cols) in zip(operations, shapes)
+    ]
+
+    # the sum of random values dealt by every party is random unless all of them collude
+    dealt = deal(
+        comm,
+        participant_ids,
+        scheme,
+        f"{label}.random",
+        random_field_elements(sum(sizes)),
+    )
+    randomness = [sum(column) % FIELD_Q for column in zip(*dealt)]
+
+    # our shares of a, b and of their product on a polynomial of degree 2t
+    factors = []
+    products = []
+    offset = 0
+    for (kind, _), (rows, inner, cols), size in zip(operations, shapes, sizes):
+        a = randomness[offset : offset + rows * inner]
+        b = a if kind == "square" else randomness[offset + rows * inner : offset + size]
+        offset += size
+        factors.append(a if kind == "square" else a + b)
+        products += matrix_product(a, b, rows, inner, cols)
+
+    # the degree 2t polynomial is interpolated at 0 from its values at the n points
+    reshared = deal(
+        comm,
+        participant_ids,
+        scheme,
+        f"{label}.products",
+        [value % FIELD_Q for value in products],
+    )
+    coefficients = scheme.lagrange_coefficients(tuple(range(num_parties)))
+    c = matrix_product(
+        list(coefficients),
+        [value for row in reshared for value in row],
+        1,
+        num_parties,
+        len(products),
+    )
+
+    material = []
+    offset = 0
+    for values, (rows, _, cols) in zip(factors, shapes):
+        material.append(
+            values + [value % FIELD_Q for value in c[offset : offset + rows * cols]]
+        )
+        offset += rows * cols
+    return material
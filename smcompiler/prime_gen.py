@@ -61,6 +61,49 @@ def gen_prime(min: int = 2 << 15, max: int = 2 << 16, k: int = 16) -> int:
     return n
 
 
+def gen_ntt_prime(
+    order_bits: int, min: int = 2 << 15, max: int = 2 << 16, k: int = 16
+) -> int:
+    """
+    Returns a prime q = c * 2^order_bits + 1 in [min, max], so that the field of size q has
+    roots of unity of every order up to 2^order_bits, as number-theoretic transforms need.
+    """
+    step = 1 << order_bits
+    low = -(-(min - 1) // step)
+    high = (max - 1) // step
+    if low > high:
+        raise ValueError(
+            f"No number of the form c * 2^{order_bits} + 1 in [{min}, {max}]"
+        )
+    tested = set()
+    while len(tested) <= high - low:
+        c = randbelow(high - low + 1) + low
+        if c in tested:
+            continue
+        tested.add(c)
+        if is_prime(k=k, n=c * step + 1):
+            return c * step + 1
+    raise ValueError(f"No prime of the form c * 2^{order_bits} + 1 in [{min}, {max}]")
+
+
+def root_of_unity(order: int, q: int) -> int:
+    """
+    Returns a primitive root of unity of the given power of two order modulo the prime q, the
+    same one at every call, so that parties deriving it separately agree on it.
+    """
+    if order & (order - 1) or (q - 1) % order:
+        raise ValueError(f"There is no root of unity of order {order} modulo {q}")
+    if order == 1:
+        return 1
+    for x in range(2, q):
+        root = pow(x, (q - 1) // order, q)
+        # the order of root divides order, a power of two, so it is exactly order unless
+        # root^(order / 2) is already 1
+        if pow(root, order // 2, q) != 1:
+            return root
+    raise ValueError(f"{q} is not a prime")
+
+
 if __name__ == "__main__":
     """give the number of bits as argument"""
     if len(argv) > 1:
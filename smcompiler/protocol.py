@@ -1,4 +1,9 @@
-from expression import Expression
+import os
+from typing import Dict, Optional
+
+from circuit_cache import compile_circuit, dumps, loads
+from expression import Expression, Secret
+from plan import ExecutionPlan
 
 
 class ProtocolSpec:
@@ -7,11 +12,86 @@ class ProtocolSpec:
     Attributes:
         participant_ids: List of IDs of the participating clients
         expr: Expression to be computed
+        threshold: threshold t of the Shamir sharing the parties use, any t + 1 of them
+            reconstructing the values, or None for additive sharing (default: None). It must
+            match the one of the session on the server.
+        packing: number k of records packed in each share by `SMCParty.evaluate_batch`, which
+            needs a threshold and at least threshold + k participants (default: None)
+        dealer_free: whether the parties generate the material of their products themselves
+            rather than retrieving it from the trusted third party, which needs a threshold t
+            and at least 2t + 1 participants (default: False)
+        input_owners: the participant providing the value of each secret, if known in advance,
+            so that the parties only exchange the input shares of the owners (default: None)
+        nonce: namespaces the labels of the messages of the protocol, so that protocols of the
+            same structure can run in the same session, each with its own nonce. All the parties
+            must use the same one. Without it, the labels only depend on the structure of the
+            expression, so that parties building the specification on their own agree on them
+            (default: "")
     """
 
-    def __init__(self, participant_ids: list, expr: Expression):
+    def __init__(
+        self,
+        participant_ids: list,
+        expr: Expression,
+        threshold: Optional[int] = None,
+        packing: Optional[int] = None,
+        dealer_free: bool = False,
+        input_owners: Optional[Dict[Secret, str]] = None,
+        nonce: str = "",
+    ):
         self.participant_ids = participant_ids
         self.expr = expr
+        self.threshold = threshold
+        self.packing = packing
+        self.dealer_free = dealer_free
+        self.input_owners = input_owners
+        self.nonce = nonce
+        self.plan: Optional[ExecutionPlan] = None
+
+    def compile(self) -> ExecutionPlan:
+        """
+        Compiles the specification into the execution plan all the parties run, once: the plan
+        is kept, and shipped along with the specification when it is pickled. The expression is
+        compiled through the compile cache (see circuit_cache.py).
+        """
+        if self.plan is None:
+            self.plan = ExecutionPlan(
+                self.participant_ids,
+                compile_circuit(self.expr),
+                self.threshold,
+                self.packing,
+                self.dealer_free,
+                self.input_owners,
+                self.nonce,
+            )
+        return self.plan
+
+    def __getstate__(self) -> dict:
+        """
+        Pickles the compiled circuit in its compact format instead of the tree of the expression,
+        which pickle walks recursively. The secrets are pickled as they are, so that they remain
+        the keys of the value dictionaries pickled along with the specification.
+        """
+        circuit = self.compile().circuit
+        state = self.__dict__.copy()
+        del state["expr"], state["plan"]
+        state["circuit"] = dumps(circuit)
+        state["secrets"] = [circuit.gates[gate] for gate in circuit.inputs]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        circuit = loads(state.pop("circuit"), secrets=state.pop("secrets"))
+        self.__dict__.update(state)
+        self.expr = circuit.gates[circuit.output]
+        self.plan = ExecutionPlan(
+            self.participant_ids,
+            circuit,
+            self.threshold,
+            self.packing,
+            self.dealer_free,
+            self.input_owners,
+            self.nonce,
+        )
 
 
     
@@ -0,0 +1,141 @@
+"""
+Sources of cryptographically secure randomness for sharing secrets and generating preprocessing
+material, handing out uniform field elements, integers and bits in bulk.
+
+Bytes are drawn from large buffers rather than one system call per value: either from
+os.urandom, or from a pseudorandom generator seeded from it, BLAKE2b keyed by the seed in counter
+mode, which is reproducible from its seed and splits into independent streams. Field elements
+are sampled by rejection from as many bits as the field has, so they are exactly uniform.
+"""
+
+import hashlib
+import os
+import sys
+import threading
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+# Bytes drawn from the system at once.
+BUFFER_SIZE = 1 << 16
+# 64 bits values can then be decoded from the buffers as machine integers.
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+
+class RandomSource(ABC):
+    """A source of uniform random bytes, and of the values drawn from them."""
+
+    @abstractmethod
+    def random_bytes(self, count: int) -> bytes:
+        """count uniform random bytes"""
+
+    def integers(self, count: int, bits: int) -> List[int]:
+        """count uniform integers of bits bits"""
+        nb_bytes = (bits + 7) // 8
+        buffer = self.random_bytes(count * nb_bytes)
+        if nb_bytes == 8 and LITTLE_ENDIAN:
+            values = memoryview(buffer).cast("Q").tolist()
+        else:
+            values = [
+                int.from_bytes(buffer[start : start + nb_bytes], "little")
+                for start in range(0, len(buffer), nb_bytes)
+            ]
+        if bits == 8 * nb_bytes:
+            return values
+        mask = (1 << bits) - 1
+        return [value & mask for value in values]
+
+    def field_elements(self, count: int, field: int) -> List[int]:
+        """count uniform elements of the field of the given size, by rejection sampling"""
+        bits = field.bit_length()
+        values: List[int] = []
+        while len(values) < count:
+            missing = count - len(values)
+            # draws a bit more than needed, as values above the field are rejected
+            drawn = self.integers(missing + missing // 4 + 8, bits)
+            values += [value for value in drawn if value < field]
+        return values[:count]
+
+    def bits(self, count: int) -> List[int]:
+        """count uniform bits"""
+        randomness = int.from_bytes(self.random_bytes((count + 7) // 8), "little")
+        return [(randomness >> i) & 1 for i in range(count)]
+
+
+class SystemRandomSource(RandomSource):
+    """
+    Randomness of os.urandom, drawn BUFFER_SIZE bytes at a time. The buffer is dropped in a child
+    process after a fork, so that processes never hand out the same bytes.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buffer = b""
+        self.position = 0
+        self.pid = os.getpid()
+
+    def random_bytes(self, count: int) -> bytes:
+        if count >= BUFFER_SIZE:
+            return os.urandom(count)
+        with self.lock:
+            if self.pid != os.getpid():
+                self.buffer = b""
+                self.position = 0
+                self.pid = os.getpid()
+            if self.position + count > len(self.buffer):
+                self.buffer = os.urandom(BUFFER_SIZE)
+                self.position = 0
+            start = self.position
+            self.position += count
+            return self.buffer[start : self.position]
+
+
+class SeededRandomSource(RandomSource):
+    """
+    A pseudorandom generator: the blocks of BLAKE2b keyed by a 32 bytes seed, of a counter.
+    The same seed gives the same randomness, and `spawn` derives independent generators, for
+    instance one per worker of a pool.
+    """
+
+    def __init__(self, seed: Optional[bytes] = None):
+        self.seed = os.urandom(32) if seed is None else seed
+        if not 16 <= len(self.seed) <= 64:
+            raise ValueError(f"A seed has 16 to 64 bytes, got {len(self.seed)}")
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.buffer = b""
+
+    def random_bytes(self, count: int) -> bytes:
+        with self.lock:
+            if count > len(self.buffer):
+                blocks = (count - len(self.buffer) + 63) // 64
+                self.buffer += b"".join(
+                    hashlib.blake2b(
+                        counter.to_bytes(16, "little"), key=self.seed
+                    ).digest()
+                    for counter in range(self.counter, self.counter + blocks)
+                )
+                self.counter += blocks
+            result = self.buffer[:count]
+            self.buffer = self.buffer[count:]
+            return result
+
+    def spawn(self, stream: int) -> "SeededRandomSource":
+        """The generator of an independent stream, derived from the seed and the stream number."""
+        seed = hashlib.blake2b(
+            stream.to_bytes(16, "little"), key=self.seed, person=b"spawn"
+        ).digest()[:32]
+        return SeededRandomSource(seed)
+
+
+source: RandomSource = SystemRandomSource()
+
+
+def get_source() -> RandomSource:
+    """The source all the sharing and preprocessing code draws its randomness from."""
+    return source
+
+
+def set_source(new_source: RandomSource) -> None:
+    """Replaces the source of randomness of this process, for instance by a seeded generator."""
+    global source
+    source = new_source
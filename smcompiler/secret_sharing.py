@@ -2,9 +2,13 @@
 Secret sharing scheme.
 """
 
-from typing import List
-import random as rd
-from prime_gen import gen_prime
+import functools
+import operator
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+from ntt import domain_size, lagrange_at_zero, ntt
+from prime_gen import gen_prime, split_n
+from randomness import RandomSource, get_source
 
 
 class Share:
@@ -12,10 +16,18 @@ class Share:
     A secret share in a finite field.
     """
 
+    # no instance dict, a share only holds its value
+    __slots__ = ("bn",)
+
     # We could use gen_prime() at runtime statically to have different q values,
     # but for efficiency of tests we prefered having a pre-computed prime number.
-    # 3525679 is a 20 bits number computed with gen_prime method and k=32
-    FIELD_Q = 3525679
+    # 2^64 - 2^32 + 1 is a 64 bits prime, replacing the 22 bits prime 3525679 we started with:
+    # it leaves room for fixed-point values and their statistical masking (see fixed_point.py),
+    # its elements fit a machine word, and 2^32 divides q - 1 for number-theoretic transforms.
+    # The field sets the cost of every protocol: comparisons decompose 64 bits values, taking
+    # more rounds and material than with the small field, and every share is a larger element.
+    # communication_cost.json holds the costs measured with this field.
+    FIELD_Q = (1 << 64) - (1 << 32) + 1
 
     def __init__(self, value, *args, **kwargs):
         # Adapt constructor arguments as you wish
@@ -28,17 +40,17 @@ class Share:
     def __add__(self, other):
         if not isinstance(other, Share):
             raise TypeError("Can only operate between shares")
-        return Share((self.bn + other.bn) % self.FIELD_Q)
+        return Share(self.bn + other.bn)
 
     def __sub__(self, other):
         if not isinstance(other, Share):
             raise TypeError("Can only operate between shares")
-        return Share((self.bn - other.bn) % self.FIELD_Q)
+        return Share(self.bn - other.bn)
 
     def __mul__(self, other):
         if not isinstance(other, Share):
             raise TypeError("Can only operate between shares")
-        return Share((self.bn * other.bn) % self.FIELD_Q)
+        return Share(self.bn * other.bn)
 
     def __eq__(self, other) -> bool:
         if not isinstance(other, Share):
@@ -46,19 +58,370 @@ class Share:
         return self.bn == other.bn
 
 
-def share_secret(secret: int, num_shares: int) -> List[Share]:
-    """Generate secret shares as seen in class"""
+def random_field_elements(
+    count: int, source: Optional[RandomSource] = None
+) -> List[int]:
+    """Draws count uniform elements of the field from the given source of randomness, or the one of the process, by rejection sampling"""
+    return (source or get_source()).field_elements(count, Share.FIELD_Q)
+
+
+def share_secrets(
+    secrets: List[int], num_shares: int, source: Optional[RandomSource] = None
+) -> List[List[int]]:
+    """Shares many secrets at once. Returns a num_shares x len(secrets) matrix whose row i holds the share values of party i"""
     FIELD_Q = Share.FIELD_Q
-    shares_values = rd.sample(range(0, FIELD_Q), num_shares - 1)
+    nb_secrets = len(secrets)
+    randomness = random_field_elements((num_shares - 1) * nb_secrets, source)
+    random_rows = [
+        randomness[row * nb_secrets : (row + 1) * nb_secrets]
+        for row in range(num_shares - 1)
+    ]
+    first_row = list(secrets)
+    for row in random_rows:
+        first_row = [value - random for value, random in zip(first_row, row)]
+    return [[value % FIELD_Q for value in first_row]] + random_rows
 
-    share_0 = secret - (sum(shares_values) % FIELD_Q)
 
-    shares_values = [share_0] + shares_values
+def reconstruct_secrets(shares: List[List[int]]) -> List[int]:
+    """Reconstructs the secrets from a parties x secrets matrix of share values, with one modular reduction per secret"""
+    FIELD_Q = Share.FIELD_Q
+    return [sum(column) % FIELD_Q for column in zip(*shares)]
+
 
-    return [Share(val) for val in shares_values]
+def matrix_product(
+    xs: List[int], ys: List[int], rows: int, inner: int, cols: int
+) -> List[int]:
+    """Multiplies a rows x inner matrix by an inner x cols matrix, both flattened row by row, without reducing the result"""
+    columns = [ys[col::cols] for col in range(cols)]
+    return [
+        sum(map(operator.mul, xs[row * inner : (row + 1) * inner], column))
+        for row in range(rows)
+        for column in columns
+    ]
+
+
+def share_secret(secret: int, num_shares: int) -> List[Share]:
+    """Generate secret shares as seen in class"""
+    return [Share(row[0]) for row in share_secrets([secret], num_shares)]
 
 
 def reconstruct_secret(shares: List[Share]) -> int:
     """Reconstructs secret shares as seen in class"""
-    # important to give a start value as we did not define addition between share and int
-    return sum(shares, start=Share(0)).bn
+    return sum(share.bn for share in shares) % Share.FIELD_Q
+
+
+@functools.lru_cache(maxsize=None)
+def interpolation_matrix(
+    points: Tuple[int, ...], targets: Tuple[int, ...], field: int
+) -> Tuple[int, ...]:
+    """
+    The len(targets) x len(points) matrix, flattened row by row, mapping the values of a polynomial
+    of degree less than len(points) at the points to its values at the targets, cached per points
+    """
+    matrix = []
+    for target in targets:
+        for i, x_i in enumerate(points):
+            numerator = 1
+            denominator = 1
+            for j, x_j in enumerate(points):
+                if i != j:
+                    numerator = numerator * (target - x_j) % field
+                    denominator = denominator * (x_i - x_j) % field
+            matrix.append(numerator * pow(denominator, -1, field) % field)
+    return tuple(matrix)
+
+
+def lagrange_coefficients(points: Tuple[int, ...], field: int) -> Tuple[int, ...]:
+    """The coefficients interpolating a polynomial at 0 from its values at the given points, cached per set of points"""
+    return interpolation_matrix(points, (0,), field)
+
+
+class SharingScheme(ABC):
+    """
+    A linear secret sharing scheme. Parties are numbered from 0 in the order of the participants,
+    and shares are handled in bulk as matrices whose row i holds the share values of party i.
+    """
+
+    @abstractmethod
+    def needed_shares(self, num_shares: int) -> int:
+        """The number of shares reconstructing the secrets"""
+
+    @abstractmethod
+    def adds_constants(self, party: int) -> bool:
+        """Whether a party adds the public constants to its shares"""
+
+    @abstractmethod
+    def share(
+        self,
+        secrets: List[int],
+        num_shares: int,
+        source: Optional[RandomSource] = None,
+    ) -> List[List[int]]:
+        """
+        Shares many secrets at once, as a num_shares x len(secrets) matrix, drawing the randomness
+        from the given source, or the one of the process
+        """
+
+    @abstractmethod
+    def reconstruct(self, shares: Dict[int, List[int]]) -> List[int]:
+        """Reconstructs the secrets from the rows of share values of enough parties, by party"""
+
+
+class AdditiveSharing(SharingScheme):
+    """n-of-n additive sharing: the secrets are the sums of the shares of all the parties."""
+
+    def needed_shares(self, num_shares: int) -> int:
+        return num_shares
+
+    def adds_constants(self, party: int) -> bool:
+        # constants are added once, by the first party
+        return party == 0
+
+    def share(
+        self,
+        secrets: List[int],
+        num_shares: int,
+        source: Optional[RandomSource] = None,
+    ) -> List[List[int]]:
+        return share_secrets(secrets, num_shares, source)
+
+    def reconstruct(self, shares: Dict[int, List[int]]) -> List[int]:
+        return reconstruct_secrets(list(shares.values()))
+
+
+class ShamirSharing(SharingScheme):
+    """
+    Shamir (t, n) sharing: the share of party i is the value at i + 1 of a random polynomial of
+    degree t whose constant term is the secret, so that any t + 1 shares reconstruct it.
+    """
+
+    def __init__(self, threshold: int):
+        if threshold < 1:
+            raise ValueError(f"The threshold must be positive, got {threshold}")
+        self.threshold = threshold
+
+    def needed_shares(self, num_shares: int) -> int:
+        return self.threshold + 1
+
+    def adds_constants(self, party: int) -> bool:
+        # a constant is a polynomial of degree 0, its value is the same for every party
+        return True
+
+    def lagrange_coefficients(self, parties: Tuple[int, ...]) -> Tuple[int, ...]:
+        """The coefficients reconstructing the secrets from the shares of the given parties"""
+        return lagrange_coefficients(
+            tuple(party + 1 for party in parties), Share.FIELD_Q
+        )
+
+    def share(
+        self,
+        secrets: List[int],
+        num_shares: int,
+        source: Optional[RandomSource] = None,
+    ) -> List[List[int]]:
+        if num_shares <= self.threshold:
+            raise ValueError(
+                f"{num_shares} shares cannot hide secrets from {self.threshold} parties"
+            )
+        FIELD_Q = Share.FIELD_Q
+        degree = self.threshold
+        nb_secrets = len(secrets)
+        # the coefficients of all the polynomials, one column per secret, evaluated at
+        # 1, ..., num_shares by a product with the Vandermonde matrix of these points
+        coefficients = list(secrets) + random_field_elements(
+            degree * nb_secrets, source
+        )
+        vandermonde = [
+            pow(x, power, FIELD_Q)
+            for x in range(1, num_shares + 1)
+            for power in range(degree + 1)
+        ]
+        values = matrix_product(
+            vandermonde, coefficients, num_shares, degree + 1, nb_secrets
+        )
+        return [
+            [
+                value % FIELD_Q
+                for value in values[row * nb_secrets : (row + 1) * nb_secrets]
+            ]
+            for row in range(num_shares)
+        ]
+
+    def reconstruct(self, shares: Dict[int, List[int]]) -> List[int]:
+        FIELD_Q = Share.FIELD_Q
+        if len(shares) <= self.threshold:
+            raise ValueError(
+                f"{self.threshold + 1} shares are needed, got {len(shares)}"
+            )
+        parties = sorted(shares)[: self.threshold + 1]
+        coefficients = self.lagrange_coefficients(tuple(parties))
+        # one row vector of Lagrange coefficients times the matrix of the shares of all the secrets
+        rows = [value for party in parties for value in shares[party]]
+        nb_secrets = len(shares[parties[0]])
+        return [
+            value % FIELD_Q
+            for value in matrix_product(
+                list(coefficients), rows, 1, len(parties), nb_secrets
+            )
+        ]
+
+
+class NTTShamirSharing(ShamirSharing):
+    """
+    Shamir (t, n) sharing whose share of party i is the value at w^i of the polynomial, w being a
+    root of unity of order N, the smallest power of two at least n. Sharing is then one
+    number-theoretic transform of the coefficients per secret, and the reconstruction
+    coefficients of a set of parties are found with transforms too: O(N log N) instead of the
+    O(n t) evaluations and O(t^2) interpolations of the points 1, ..., n. N must divide
+    FIELD_Q - 1.
+    """
+
+    def __init__(self, threshold: int, num_parties: int):
+        super().__init__(threshold)
+        self.size = domain_size(num_parties)
+
+    def share(
+        self,
+        secrets: List[int],
+        num_shares: int,
+        source: Optional[RandomSource] = None,
+    ) -> List[List[int]]:
+        if num_shares <= self.threshold:
+            raise ValueError(
+                f"{num_shares} shares cannot hide secrets from {self.threshold} parties"
+            )
+        if num_shares > self.size:
+            raise ValueError(f"{num_shares} shares do not fit a domain of {self.size}")
+        FIELD_Q = Share.FIELD_Q
+        randomness = random_field_elements(self.threshold * len(secrets), source)
+        padding = [0] * (self.size - self.threshold - 1)
+        columns = [
+            ntt(
+                [secret]
+                + randomness[index * self.threshold : (index + 1) * self.threshold]
+                + padding,
+                FIELD_Q,
+            )
+            for index, secret in enumerate(secrets)
+        ]
+        return [[column[party] for column in columns] for party in range(num_shares)]
+
+    def lagrange_coefficients(self, parties: Tuple[int, ...]) -> Tuple[int, ...]:
+        return lagrange_at_zero(parties, self.size, Share.FIELD_Q)
+
+
+# From this number of parties, Shamir sharing uses number-theoretic transforms.
+NTT_PARTIES = 64
+
+
+class PackedShamirSharing(SharingScheme):
+    """
+    Packed Shamir sharing (Franklin and Yung): each polynomial, of degree t + k - 1, packs k secrets
+    as its values at 0, -1, ..., -(k - 1), and the share of party i is its value at i + 1. Any t
+    shares reveal nothing and any t + k reconstruct the k secrets, so sharing m secrets takes
+    ceil(m / k) share values per party. Shares are only added and multiplied by public values:
+    products of packed shares would double the degree of the polynomials.
+    """
+
+    def __init__(self, threshold: int, packing: int):
+        if threshold < 1 or packing < 1:
+            raise ValueError(
+                f"The threshold and the packing must be positive, got {threshold} and {packing}"
+            )
+        self.threshold = threshold
+        self.packing = packing
+
+    def needed_shares(self, num_shares: int) -> int:
+        return self.threshold + self.packing
+
+    def adds_constants(self, party: int) -> bool:
+        # a constant polynomial packs the constant in every slot
+        return True
+
+    def slots(self) -> Tuple[int, ...]:
+        """The points where the polynomials hold the secrets"""
+        return tuple(-slot % Share.FIELD_Q for slot in range(self.packing))
+
+    def share(
+        self,
+        secrets: List[int],
+        num_shares: int,
+        source: Optional[RandomSource] = None,
+    ) -> List[List[int]]:
+        """Shares the secrets k at a time, the last block padded with zeros: one column per block"""
+        if num_shares < self.threshold + self.packing:
+            raise ValueError(
+                f"{num_shares} shares cannot pack {self.packing} secrets hidden from {self.threshold} parties"
+            )
+        FIELD_Q = Share.FIELD_Q
+        degree = self.threshold + self.packing - 1
+        nb_blocks = -(-len(secrets) // self.packing)
+        # each polynomial is given by its values at the slots, holding the secrets, and at t more
+        # points, holding random values, then evaluated at 1, ..., num_shares
+        padded = list(secrets) + [0] * (nb_blocks * self.packing - len(secrets))
+        values = [
+            padded[block * self.packing + slot]
+            for slot in range(self.packing)
+            for block in range(nb_blocks)
+        ] + random_field_elements(self.threshold * nb_blocks, source)
+        points = self.slots() + tuple(
+            -point % FIELD_Q for point in range(self.packing, degree + 1)
+        )
+        matrix = interpolation_matrix(points, tuple(range(1, num_shares + 1)), FIELD_Q)
+        shares = matrix_product(list(matrix), values, num_shares, degree + 1, nb_blocks)
+        return [
+            [
+                value % FIELD_Q
+                for value in shares[row * nb_blocks : (row + 1) * nb_blocks]
+            ]
+            for row in range(num_shares)
+        ]
+
+    def reconstruct(self, shares: Dict[int, List[int]]) -> List[int]:
+        """Reconstructs the k secrets of every block, block after block"""
+        FIELD_Q = Share.FIELD_Q
+        needed = self.threshold + self.packing
+        if len(shares) < needed:
+            raise ValueError(f"{needed} shares are needed, got {len(shares)}")
+        parties = sorted(shares)[:needed]
+        matrix = interpolation_matrix(
+            tuple(party + 1 for party in parties), self.slots(), FIELD_Q
+        )
+        rows = [value for party in parties for value in shares[party]]
+        nb_blocks = len(shares[parties[0]])
+        secrets = matrix_product(list(matrix), rows, self.packing, needed, nb_blocks)
+        # the product holds the secrets slot after slot
+        return [
+            secrets[slot * nb_blocks + block] % FIELD_Q
+            for block in range(nb_blocks)
+            for slot in range(self.packing)
+        ]
+
+
+def share_packed_secret(
+    secrets: List[int], num_shares: int, threshold: int
+) -> List[Share]:
+    """Packs the secrets into one share per party, hidden from any threshold parties"""
+    scheme = PackedShamirSharing(threshold, len(secrets))
+    return [Share(row[0]) for row in scheme.share(secrets, num_shares)]
+
+
+def reconstruct_packed_secret(shares: List[Share], packing: int) -> List[int]:
+    """Reconstructs the packing secrets of shares of the first parties, from all of them"""
+    scheme = PackedShamirSharing(len(shares) - packing, packing)
+    return scheme.reconstruct({party: [share.bn] for party, share in enumerate(shares)})
+
+
+def sharing_scheme(
+    threshold: Optional[int] = None, num_parties: int = 0
+) -> SharingScheme:
+    """
+    Shamir sharing with the given threshold, or additive sharing if there is none. Shamir sharing
+    among many parties uses number-theoretic transforms when the field allows them.
+    """
+    if threshold is None:
+        return AdditiveSharing()
+    size = domain_size(num_parties)
+    if num_parties >= NTT_PARTIES and size <= 1 << split_n(Share.FIELD_Q)[0]:
+        return NTTShamirSharing(threshold, num_parties)
+    return ShamirSharing(threshold)
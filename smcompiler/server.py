@@ -5,40 +5,128 @@ You should not need to change this file.
 
 import collections
 import sys
+import threading
 from os import environ
 from typing import Dict, List, Optional, Tuple
 
-from flask import Flask, request, Response, jsonify
+from flask import Flask, abort, request, Response, jsonify
 
-from ttp import TrustedParamGenerator
+from secret_sharing import sharing_scheme
+from triplet_store import TripletStore
+from ttp import TrustedParamGenerator, check_request
 
 
+class Session:
+    """
+    An isolated computation hosted by the server: its own participants, message
+    store and trusted parameter generator, which deals Shamir shares if the session has a
+    threshold.
+    """
+
+    def __init__(self, participants: List[str], threshold: Optional[int] = None):
+        self.store: Dict[str, Dict[Tuple[str, str], bytes]] = collections.defaultdict(
+            dict
+        )
+        self.ttp: TrustedParamGenerator = TrustedParamGenerator(
+            sharing_scheme(threshold, len(participants))
+        )
+        # guards the communication cost, which concurrent requests add to
+        self.cost_lock = threading.Lock()
+        for participant in participants:
+            self.ttp.add_participant(participant)
+
+
+# Routes without a session prefix act on the default session, the one set up by run().
+DEFAULT_SESSION = "default"
+
 environ["WERKZEUG_RUN_MAIN"] = "true"
 app: Flask = Flask("Trusted Third Party Server")
-store: Dict[str, Dict[Tuple[str, str], bytes]] = collections.defaultdict(dict)
-ttp: TrustedParamGenerator = TrustedParamGenerator()
+sessions: Dict[str, Session] = {DEFAULT_SESSION: Session([])}
+store: Dict[str, Dict[Tuple[str, str], bytes]] = sessions[DEFAULT_SESSION].store
+ttp: TrustedParamGenerator = sessions[DEFAULT_SESSION].ttp
+# guards the creation and deletion of sessions, which concurrent requests may race on
+sessions_lock = threading.Lock()
+
+
+def _session_route(rule: str, **options):
+    """
+    Registers a view both for the default session and under /sessions/<session_id>.
+    """
+
+    def decorator(view):
+        app.route(rule, defaults={"session_id": DEFAULT_SESSION}, **options)(view)
+        app.route("/sessions/<session_id>" + rule, **options)(view)
+        return view
+
+    return decorator
+
+
+@app.route("/sessions/<session_id>", methods=["POST"])
+def create_session(session_id: str):
+    """
+    Creates a new session for the participants given as a JSON list in the body, or as
+    {"participants": [...], "threshold": t} for a session using Shamir sharing.
+    """
+    body = request.get_json(force=True)
+    threshold = None
+    if isinstance(body, dict):
+        participants = body.get("participants")
+        threshold = body.get("threshold")
+    else:
+        participants = body
+    if not isinstance(participants, list):
+        return Response(status=400)
+    if threshold is not None and (
+        type(threshold) is not int or not 0 < threshold < len(participants)
+    ):
+        return Response(status=400)
+    with sessions_lock:
+        if session_id in sessions:
+            return Response(status=409)
+        print(f"[ SESSION  ] CREATE {session_id} / PARTICIPANTS {participants}")
+        sessions[session_id] = Session(participants, threshold)
+    return Response(status=201)
+
+
+@app.route("/sessions/<session_id>", methods=["DELETE"])
+def delete_session(session_id: str):
+    """
+    Drops a session and everything stored in it.
+    """
+    if session_id == DEFAULT_SESSION:
+        return Response(status=404)
+    with sessions_lock:
+        if sessions.pop(session_id, None) is None:
+            return Response(status=404)
+    print(f"[ SESSION  ] DELETE {session_id}")
+    return Response(status=200)
+
 
 """ADDED CODE FOR COMMUNICATION COST EVALUATION"""
 
 
-@app.route("/communication_cost", methods=["GET"])
-def communication_cost():
+@_session_route("/communication_cost", methods=["GET"])
+def communication_cost(session_id: str):
     """
     Retrieves the number of bytes the server sent since the begining. Only GETed objects are counted to avoid double counting information sending.
     """
-    return str(_get_value("public", ("communication", "cost")) or 0), 200
+    session = _get_session(session_id)
+    return str(_get_value(session, "public", ("communication", "cost")) or 0), 200
 
 
 """END OF ADDED CODE FOR COMMUNICATION COST EVALUATION"""
 
 
-@app.route("/private/<sender_id>/<receiver_id>/<label>", methods=["POST"])
-def send_private_message(sender_id: str, receiver_id: str, label: str):
+@_session_route("/private/<sender_id>/<receiver_id>/<label>", methods=["POST"])
+def send_private_message(
+    sender_id: str, receiver_id: str, label: str, session_id: str
+):
     """
     The client send a private message to the server.
     """
+    session = _get_session(session_id)
     print(f"[ SEND     ] SENDER {sender_id} / LABEL {label} / RECEIVER {receiver_id}")
-    _set_value("private", (receiver_id, label), request.get_data())
+    _set_value(session, "private", (receiver_id, label), request.get_data())
     # nb_observed_bytes = _get_value("public", ("communication", "cost")) or 0
     # _set_value(
     #     "public",
@@ -48,30 +136,29 @@ def send_private_message(sender_id: str, receiver_id: str, label: str):
     return Response(status=200)
 
 
-@app.route("/private/<receiver_id>/<label>", methods=["GET"])
-def retrieve_private_message(receiver_id: str, label: str):
+@_session_route("/private/<receiver_id>/<label>", methods=["GET"])
+def retrieve_private_message(receiver_id: str, label: str, session_id: str):
     """
     The client retrieve a private message from the server.
     """
-    res = _get_value("private", (receiver_id, label))
+    session = _get_session(session_id)
+    res = _get_value(session, "private", (receiver_id, label))
     if res is not None:
         print(f"[ RETRIEVE ] RECEIVER {receiver_id} / LABEL {label}")
-        nb_observed_bytes = _get_value("public", ("communication", "cost")) or 0
-        _set_value(
-            "public", ("communication", "cost"), nb_observed_bytes + sys.getsizeof(res)
-        )
+        _count_sent_bytes(session, sys.getsizeof(res))
         return res, 200
 
     return Response(status=404)
 
 
-@app.route("/public/<sender_id>/<label>", methods=["POST"])
-def publish_message(sender_id: str, label: str):
+@_session_route("/public/<sender_id>/<label>", methods=["POST"])
+def publish_message(sender_id: str, label: str, session_id: str):
     """
     The client publish a public message on the server.
     """
+    session = _get_session(session_id)
     print(f"[ PUBLISH  ] SENDER {sender_id} / LABEL {label}")
-    _set_value("public", (sender_id, label), request.get_data())
+    _set_value(session, "public", (sender_id, label), request.get_data())
     # nb_observed_bytes = _get_value("public", ("communication", "cost")) or 0
     # _set_value(
     #     "public",
@@ -81,63 +168,150 @@ def publish_message(sender_id: str, label: str):
     return Response(status=200)
 
 
-@app.route("/public/<receiver_id>/<sender_id>/<label>", methods=["GET"])
-def retrieve_public_message(receiver_id: str, sender_id: str, label: str):
+@_session_route("/public/<receiver_id>/<sender_id>/<label>", methods=["GET"])
+def retrieve_public_message(
+    receiver_id: str, sender_id: str, label: str, session_id: str
+):
     """
     The client retrieve a public message from the server.
     """
-    res = _get_value("public", (sender_id, label))
+    session = _get_session(session_id)
+    res = _get_value(session, "public", (sender_id, label))
     if res is not None:
         print(
             f"[ RETRIEVE ] RECEIVER {receiver_id}. LABEL {label} / SENDER {sender_id}"
         )
-        nb_observed_bytes = _get_value("public", ("communication", "cost")) or 0
-        _set_value(
-            "public", ("communication", "cost"), nb_observed_bytes + sys.getsizeof(res)
-        )
+        _count_sent_bytes(session, sys.getsizeof(res))
         return res, 200
     return Response(status=404)
 
 
-@app.route("/shares/<client_id>/<op_id>", methods=["GET"])
-def retrieve_share(client_id: str, op_id: str):
+@_session_route("/shares/<client_id>/<op_id>", methods=["GET"])
+def retrieve_share(client_id: str, op_id: str, session_id: str):
     """
     The client retrieve Beaver triplets generated by the server.
     """
-    shares = ttp.retrieve_share(client_id, op_id)
+    session = _get_session(session_id)
+    if client_id not in session.ttp.participant_ids:
+        return Response(status=404)
+    shares = session.ttp.retrieve_share(client_id, op_id)
     # TODO: fixme
-    nb_observed_bytes = _get_value("public", ("communication", "cost")) or 0
-    _set_value(
-        "public",
-        ("communication", "cost"),
-        nb_observed_bytes + sys.getsizeof(jsonify([share.bn for share in shares])),
+    _count_sent_bytes(
+        session, sys.getsizeof(jsonify([share.bn for share in shares]))
     )
     return jsonify([share.bn for share in shares]), 200
 
 
-def _set_value(pool: str, channel: Tuple[str, str], data: bytes) -> None:
+@_session_route("/shares/<client_id>", methods=["POST"])
+def retrieve_shares(client_id: str, session_id: str):
+    """
+    The client retrieve the preprocessing material of all the operations listed in the body at
+    once, as a JSON list of [op_id, kind, shape]. Clients that are not participants of the
+    session are not found. Unknown kinds and invalid or too large shapes
+    are bad requests, for which no material is generated. The client may give its index in the
+    participants of its protocol as the party parameter, which is a conflict if the session
+    registered the participants in another order. Likewise, the threshold parameter gives the
+    threshold of the sharing of its protocol, 0 standing for additive sharing, which is a
+    conflict if the session shares with another one.
+    """
+    session = _get_session(session_id)
+    if client_id not in session.ttp.participant_ids:
+        return Response(status=404)
+    party = request.args.get("party", type=int)
+    threshold = request.args.get("threshold", type=int)
+    try:
+        if party is not None:
+            session.ttp.check_party(client_id, party)
+        if threshold is not None:
+            session.ttp.check_threshold(threshold or None)
+    except ValueError as error:
+        print(f"[ SHARES   ] {error}")
+        return Response(status=409)
+    operations = request.get_json(force=True)
+    try:
+        for _, kind, shape in operations:
+            check_request(kind, shape)
+    except (TypeError, ValueError):
+        return Response(status=400)
+    print(f"[ SHARES   ] RECEIVER {client_id} / {len(operations)} OPERATIONS")
+    shares = [
+        [
+            share.bn
+            for share in session.ttp.retrieve_preprocessing(
+                client_id, op_id, kind, shape
+            )
+        ]
+        for op_id, kind, shape in operations
+    ]
+    res = jsonify(shares)
+    _count_sent_bytes(session, sys.getsizeof(res.get_data()))
+    return res, 200
+
+
+def _get_session(session_id: str) -> Session:
+    """
+    Returns the session with the given ID, aborting the request if it does not exist.
+    """
+    if session_id not in sessions:
+        abort(404)
+    return sessions[session_id]
+
+
+def _count_sent_bytes(session: Session, nb_bytes: int) -> None:
+    """
+    Adds the given number of bytes to the communication cost of a session.
+    """
+    with session.cost_lock:
+        nb_observed_bytes = (
+            _get_value(session, "public", ("communication", "cost")) or 0
+        )
+        _set_value(
+            session, "public", ("communication", "cost"), nb_observed_bytes + nb_bytes
+        )
+
+
+def _set_value(
+    session: Session, pool: str, channel: Tuple[str, str], data: bytes
+) -> None:
     """
     Push data to a channel in a given pool and send an event.
     """
-    store[pool][channel] = data
+    session.store[pool][channel] = data
 
 
-def _get_value(pool: str, channel: Tuple[str, str]) -> Optional[bytes]:
+def _get_value(
+    session: Session, pool: str, channel: Tuple[str, str]
+) -> Optional[bytes]:
     """
     Subscribe to a channel in a given pool and get it once ready.
     """
-    if channel not in store[pool]:
+    if channel not in session.store[pool]:
         return None
-    return store[pool][channel]
+    return session.store[pool][channel]
 
 
-def run(host: str, port: int, participants: List[str]) -> None:
+def run(
+    host: str,
+    port: int,
+    participants: List[str],
+    threshold: Optional[int] = None,
+    triplet_store: Optional[str] = None,
+) -> None:
     """
-    Register the participants, then run the server.
+    Register the participants in the default session, then run the server.
+    Other sessions can be created at runtime through POST /sessions/<session_id>.
+    With a threshold, the default session uses Shamir sharing, and with the path of a triplet
+    store, it serves the Beaver triplets of the store. Requests are served concurrently, each in
+    its own thread.
     """
+    ttp.scheme = sharing_scheme(threshold, len(participants))
+    if triplet_store is not None:
+        store = TripletStore(triplet_store)
+        store.check(ttp.scheme, len(participants))
+        ttp.store = store
     for participant in participants:
         ttp.add_participant(participant)
-    app.run(host, port, debug=True, threaded=False, processes=1)
+    app.run(host, port, debug=True, threaded=True)
 
 
 def main(args: List[str]) -> None:
@@ -5,13 +5,19 @@ MODIFY THIS FILE.
 """
 # You might want to import more classes if needed.
 
+import collections
 import pickle
-from typing import Dict, Set, Tuple, Union
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
+from comparison import Protocol, start_protocol
 from communication import Communication
-from expression import AddOp, Expression, MultOp, Op, Scalar, Secret, SubOp
+from expression import Secret, Truncate
+from fixed_point import truncate
+from preprocessing import generate_material
 from protocol import ProtocolSpec
-from secret_sharing import Share, reconstruct_secret, share_secret
+from secret_sharing import PackedShamirSharing, Share, SharingScheme, matrix_product
 
 # Feel free to add as many imports as you want.
 
@@ -19,7 +25,8 @@ from secret_sharing import Share, reconstruct_secret, share_secret
 class SMCParty:
     """
     A client that executes an SMC protocol to collectively compute a value of an expression together
-    with other clients.
+    with other clients. The expression is compiled once, so the same party can evaluate it on many
+    inputs with `evaluate` or `evaluate_stream`, each evaluation living in its own label namespace.
 
     Attributes:
         client_id: Identifier of this client
@@ -27,8 +34,13 @@ class SMCParty:
         server_port: port of the server
         protocol_spec (ProtocolSpec): Protocol specification
         value_dict (dict): Dictionary assigning values to secrets belonging to this client.
-        my_shares (Dict[Secret, Share]): dictionnary associating this client's share for the given secrets
-        b_triple (Dict[Expression, Tuple[int, int, int]]): the retrieved shares for the seen expressions
+        session_id: session of the server the protocol runs in (default: the server's default session)
+        plan (ExecutionPlan): the protocol compiled once for all the parties
+        circuit (Circuit): the expression compiled into numbered gates
+        beaver_ops (List[int]): the gates of the multiplications needing a Beaver triplet
+        nb_runs (int): number of evaluations started so far, used to namespace their labels
+        scheme (SharingScheme): the secret sharing scheme given by the threshold of the protocol
+        party (int): our index in the participants, that is our share's point with Shamir sharing
     """
 
     def __init__(
@@ -38,152 +50,413 @@ class SMCParty:
         server_port: int,
         protocol_spec: ProtocolSpec,
         value_dict: Dict[Secret, int],
+        session_id: Optional[str] = None,
     ):
-        self.comm = Communication(server_host, server_port, client_id)
+        self.comm = Communication(
+            server_host, server_port, client_id, session_id=session_id
+        )
 
         self.client_id = client_id
         self.protocol_spec = protocol_spec
         self.value_dict = value_dict
-        self.my_shares = {}
-        self.b_triplet = {}
+
+        self.plan = protocol_spec.compile()
+        self.circuit = self.plan.circuit
+        self.beaver_ops = self.circuit.beaver_ops
+        self.scheme = self.plan.scheme
+        self.party = self.plan.participant_ids.index(client_id)
+        self.aggregating = self.plan.adds_constants[client_id]
+        self.nb_runs = 0
+        self.runs_lock = threading.Lock()
+        # Beaver triplets already fetched for future runs, by run number
+        self.prefetched: Dict[int, Dict[int, List[int]]] = {}
 
     def is_aggregating_client(self):
         """
-        We specify the aggregating client as the first participant
+        We specify the aggregating client as the first participant. With Shamir sharing, every
+        participant adds the constants.
         """
-        return self.protocol_spec.participant_ids[0] == self.client_id
+        return self.aggregating
 
     def run(self) -> int:
         """
         The method the client use to do the SMC.
         """
-        self.send_secret_shares()
-        for id in self.protocol_spec.participant_ids:
-            if id != self.client_id:
-                # we wait for every party to have sent their share
-                self.comm.retrieve_public_message(id, id + "_sent")
-        my_final_share = self.process_expression(self.protocol_spec.expr)
-        self.comm.publish_message(
-            "final_share_" + self.client_id, pickle.dumps(my_final_share)
-        )
-        all_final_shares = [my_final_share]
-        for id in self.protocol_spec.participant_ids:
-            if id != self.client_id:
-                all_final_shares.append(
-                    pickle.loads(
-                        self.comm.retrieve_public_message(id, "final_share_" + id)
-                    )
+        return self.evaluate(self.value_dict)
+
+    def evaluate(self, inputs: Dict[Secret, int]) -> int:
+        """
+        Runs the protocol once on the given values of this client's secrets and returns the result.
+        Can be called repeatedly: each call uses fresh labels and fresh Beaver triplets.
+        """
+        return self.evaluate_run(self.next_run(), inputs)
+
+    def evaluate_stream(
+        self, inputs: Iterable[Dict[Secret, int]], window: int = 4
+    ) -> Iterator[int]:
+        """
+        Evaluates the expression on each element of `inputs` and yields the results in order.
+        Up to `window` runs are in flight at once, so the input sharing of the next runs happens
+        while the previous ones wait on their Beaver openings. All parties must use the same inputs
+        order, as runs are numbered in submission order, but each may keep its own number of runs
+        in flight: the messages and the material of a run only depend on the run.
+        """
+        with ThreadPoolExecutor(max_workers=window) as executor:
+            pending = collections.deque()
+            for value_dict in inputs:
+                if len(pending) == window:
+                    yield pending.popleft().result()
+                if self.nb_runs not in self.prefetched:
+                    self.prefetch(window)
+                pending.append(
+                    executor.submit(self.evaluate_run, self.next_run(), value_dict)
+                )
+            while pending:
+                yield pending.popleft().result()
+
+    def next_run(self) -> int:
+        """Allocates the number of a new run."""
+        with self.runs_lock:
+            run = self.nb_runs
+            self.nb_runs += 1
+            return run
+
+    def evaluate_run(self, run: int, inputs: Dict[Secret, int]) -> int:
+        """Runs the protocol for the given run number. Safe to call concurrently for different runs."""
+        triplets = self.prefetched.pop(run, None)
+        if triplets is None:
+            triplets = self.fetch_triplets([run])[run]
+
+        my_shares = self.send_secret_shares(inputs, run)
+        input_shares = self.gather_secret_shares(run, my_shares)
+        my_final_share = self.process_expression(run, input_shares, triplets)
+        return self.open_values(run, self.plan.OUTPUT, [my_final_share.bn])[0]
+
+    def evaluate_batch(self, inputs: List[Dict[Secret, int]]) -> List[int]:
+        """
+        Evaluates a linear expression on many records at once with packed Shamir sharing: each
+        share holds the values of k records, so a party sends ceil(len(inputs) / k) shares of each
+        of its secrets instead of len(inputs). Every party must give the same number of records.
+        """
+        spec = self.plan
+        if spec.threshold is None or spec.packing is None:
+            raise ValueError("Packed evaluations need a threshold and a packing")
+        if self.circuit.beaver_ops:
+            raise ValueError(
+                "Only linear expressions can be evaluated on packed shares"
+            )
+        scheme = PackedShamirSharing(spec.threshold, spec.packing)
+        run = self.next_run()
+
+        # one column per block of records for each of our secrets
+        secrets = self.circuit_secrets(inputs[0]) if inputs else []
+        gates = [self.circuit.gate_ids[secret] for secret in secrets]
+        values = [
+            secret.encode(value_dict[secret])
+            for secret in secrets
+            for value_dict in inputs
+        ]
+        nb_blocks = -(-len(inputs) // spec.packing)
+        blocks = [
+            scheme.share(values[index : index + len(inputs)], len(spec.participant_ids))
+            for index in range(0, len(values), len(inputs))
+        ]
+        my_shares = {}
+        for party, id in enumerate(spec.participant_ids):
+            rows = [(gate, shares[party]) for gate, shares in zip(gates, blocks)]
+            if id == self.client_id:
+                my_shares = dict(rows)
+            elif self.client_id in spec.senders(id):
+                self.comm.send_private_message(
+                    id,
+                    self.label(run, spec.input_key(self.client_id)),
+                    pickle.dumps(rows),
                 )
-        return reconstruct_secret(all_final_shares)
-
-    def send_secret_shares(self) -> None:
-        """Method to create and send shares for each secret owned by this client to all of the other parties of the protocol"""
-        num_participants = len(self.protocol_spec.participant_ids)
-        for secret in self.value_dict.keys():
-            secret_val = self.value_dict[secret]
-            shares = share_secret(secret_val, num_participants)
-            for index, id in enumerate(self.protocol_spec.participant_ids):
-                if id == self.client_id:
-                    # we store our local share
-                    self.my_shares[secret] = shares[index]
-                else:
-                    serialized_share = pickle.dumps(shares[index])
-                    self.comm.send_private_message(
-                        id, str(secret.id.__hash__()), serialized_share
+        input_shares = self.gather_secret_shares(run, {})
+        input_shares.update(my_shares)
+
+        wires: List[Optional[int]] = [None] * len(self.circuit.gates)
+        outputs = []
+        for block in range(nb_blocks):
+            for gate, shares in input_shares.items():
+                wires[gate] = shares[block]
+            outputs.append(self.circuit.output_layer.apply(wires, True)[0])
+        results = self.open_values(run, spec.OUTPUT, outputs, scheme)
+        return results[: len(inputs)]
+
+    def prefetch(self, nb_runs: int) -> None:
+        """
+        Fetches in a single request the Beaver triplets of the next `nb_runs` evaluations. Without
+        a dealer, the parties generate the material of each run in the run itself instead, as
+        they may prefetch different runs.
+        """
+        if self.plan.dealer_free:
+            return
+        runs = [
+            run
+            for run in range(self.nb_runs, self.nb_runs + nb_runs)
+            if run not in self.prefetched
+        ]
+        self.prefetched.update(self.fetch_triplets(runs))
+
+    def fetch_triplets(self, runs: List[int]) -> Dict[int, Dict[int, List[int]]]:
+        """
+        Retrieves the Beaver triplets of every multiplication of the given runs in one request.
+        The triplet of a matrix product is the coefficients of its a, then b, then c, row by row,
+        and the one of a square is [a, a^2]. Without a dealer, the parties generate the material
+        of each run together, under the labels of the run, so that it does not depend on which
+        runs each party fetches at once.
+        """
+        if not self.beaver_ops or not runs:
+            return {run: {} for run in runs}
+        if self.plan.dealer_free:
+            operations = [(kind, shape) for _, kind, shape in self.plan.preprocessing]
+            return {
+                run: dict(
+                    zip(
+                        self.beaver_ops,
+                        generate_material(
+                            self.comm,
+                            self.plan.participant_ids,
+                            self.scheme,
+                            self.label(run, "preprocessing"),
+                            operations,
+                        ),
                     )
-        # we inform others we finished sending our shares
-        self.comm.publish_message(self.client_id + "_sent", "Done")
-
-    def retrieve_share(self, secret: Secret) -> Share:
-        """Manages the share retrieving associated to a secret. Maintains locally the already retrieved shares and queries the server otherwise."""
-        if secret in self.my_shares:
-            return self.my_shares[secret]
-        else:
-            share = pickle.loads(
-                self.comm.retrieve_private_message(str(secret.id.__hash__()))
+                )
+                for run in runs
+            }
+        operations = [
+            (self.label(run, str(op)), kind, shape)
+            for run in runs
+            for op, kind, shape in self.plan.preprocessing
+        ]
+        shares = iter(
+            self.comm.retrieve_preprocessing_shares(
+                operations, self.party, self.plan.threshold
             )
-            self.my_shares[secret] = share
-            return share
-
-    def retrieve_biever_triplet(self, expr: Expression) -> Tuple[int, int, int]:
-        """Manages the beaver triplet retrieving associated to an expression. Maintains locally the already retrieved triplet and queries the server otherwise."""
-        if expr in self.b_triplet:
-            return self.b_triplet[expr]
-        else:
-            triplet = self.comm.retrieve_beaver_triplet_shares(expr.id)
-            self.b_triplet[expr] = triplet
-            return triplet
-
-    # Suggestion: To process expressions, make use of the *visitor pattern* like so:
-    def process_expression(self, expr: Expression) -> Share:
-        if isinstance(expr, Scalar):
-            # returns as share so it can be combined with overriden operations with other shares
-            return Share(expr.value)
-
-        if isinstance(expr, Secret):
-            return self.retrieve_share(expr)
-
-        assert isinstance(expr, Op)
-        x, y = expr.get_operands()
-        x_share = self.process_expression(x)
-        y_share = self.process_expression(y)
-        has_scalar_operand = expr.scalar_operand()
-        if isinstance(expr, AddOp) or isinstance(expr, SubOp):
-            if has_scalar_operand == 0 or self.is_aggregating_client():
-                # we do not have constant to add/sub or we can because we're aggregators
-                if isinstance(expr, AddOp):
-                    return x_share + y_share
-                if isinstance(expr, SubOp):
-                    return x_share - y_share
-            else:
-                if has_scalar_operand == 3:
-                    # both operands are scalar, nothing to add to secret sharing if not aggregating
-                    return Share(0)
-                elif has_scalar_operand == 2:
-                    # right operand only is scalar, send my left share
-                    return x_share
-                elif has_scalar_operand == 1:
-                    # left operand only is scalar, send my right share
-                    return y_share
-                else:
-                    raise ValueError("Unkown value of the scalar_operand method")
-        elif isinstance(expr, MultOp):
-            if has_scalar_operand > 0:
-                # one or more are scalar operands, we are in multiplication by constant
-                return x_share * y_share
-            else:
-                a, b, c = self.retrieve_biever_triplet(expr)
-                a = Share(a)
-                b = Share(b)
-                c = Share(c)
-                x_a = x_share - a
-                y_b = y_share - b
-                self.comm.publish_message(
-                    "beaver:x_a" + str(expr.id.__hash__()), pickle.dumps(x_a)
+        )
+        return {run: {op: next(shares) for op in self.beaver_ops} for run in runs}
+
+    def label(self, run: int, key: Union[int, str]) -> str:
+        """
+        The label of a message, namespaced by the circuit and the run it belongs to so that
+        runs never collide. Keys are gate numbers or short names.
+        """
+        return self.plan.label(run, str(key))
+
+    def circuit_secrets(self, secrets: Iterable[Secret]) -> List[Secret]:
+        """
+        The secrets we give the value of that the circuit computes with, the others being
+        ignored. Raises a ValueError if we give the value of one of them we do not own.
+        """
+        secrets = [secret for secret in secrets if secret in self.circuit.gate_ids]
+        for secret in secrets:
+            if not self.plan.owns(self.client_id, secret):
+                raise ValueError(f"{self.client_id} does not own {secret}")
+        return secrets
+
+    def send_secret_shares(
+        self, inputs: Dict[Secret, int], run: int
+    ) -> Dict[int, Share]:
+        """
+        Method to create and send shares for each secret owned by this client to all of the other parties of the protocol.
+        All the shares destined to a party go in a single message, sent even when we own no secret unless the plan
+        knows the owners of the secrets. Returns our own shares.
+        """
+        secrets = self.circuit_secrets(inputs)
+        gates = [self.circuit.gate_ids[secret] for secret in secrets]
+        shares = self.scheme.share(
+            [secret.encode(inputs[secret]) for secret in secrets],
+            len(self.plan.participant_ids),
+        )
+        my_shares = {}
+        for id, row in zip(self.plan.participant_ids, shares):
+            if id == self.client_id:
+                # we store our local shares
+                my_shares = {gate: Share(value) for gate, value in zip(gates, row)}
+            elif self.client_id in self.plan.senders(id):
+                self.comm.send_private_message(
+                    id,
+                    self.label(run, self.plan.input_key(self.client_id)),
+                    pickle.dumps(list(zip(gates, row))),
                 )
-                self.comm.publish_message(
-                    "beaver:y_b" + str(expr.id.__hash__()), pickle.dumps(y_b)
+        return my_shares
+
+    def gather_secret_shares(
+        self, run: int, my_shares: Dict[int, Share]
+    ) -> Dict[int, int]:
+        """Retrieves the shares the other parties sent us and merges them with ours, by input gate."""
+        input_shares = {gate: share.bn for gate, share in my_shares.items()}
+        for id in self.plan.senders(self.client_id):
+            received = pickle.loads(
+                self.comm.retrieve_private_message(
+                    self.label(run, self.plan.input_key(id))
+                )
+            )
+            input_shares.update(received)
+        return input_shares
+
+    def open_values(
+        self,
+        run: int,
+        key: str,
+        values: List[int],
+        scheme: Optional[SharingScheme] = None,
+    ) -> List[int]:
+        """
+        Publishes our shares of many values in a single message and reconstructs the values from
+        the messages of the first parties to publish theirs, as many as the sharing scheme needs:
+        all of them with additive sharing, any t + 1 with Shamir sharing. Uses the scheme of the
+        protocol unless another one is given.
+        """
+        scheme = scheme or self.scheme
+        self.comm.publish_message(self.label(run, key), pickle.dumps(values))
+        participants = self.plan.participant_ids
+        needed = scheme.needed_shares(len(participants))
+        all_shares = {self.party: values}
+        if needed > 1:
+            messages = self.comm.retrieve_public_messages(
+                [id for id in participants if id != self.client_id],
+                self.label(run, key),
+                needed - 1,
+            )
+            for id, message in messages.items():
+                all_shares[participants.index(id)] = pickle.loads(message)
+        return scheme.reconstruct(all_shares)
+
+    def process_expression(
+        self,
+        run: int,
+        input_shares: Dict[int, int],
+        triplets: Dict[int, List[int]],
+    ) -> Share:
+        """
+        Evaluates the circuit layer by layer and returns our share of the expression's value.
+        The operands of a layer are computed locally in one sparse product, then all its Beaver
+        multiplications open their masked operands together, along with the first openings of
+        its sub-protocols, whose next rounds are also batched.
+        """
+        FIELD_Q = Share.FIELD_Q
+        aggregating = self.is_aggregating_client()
+        squares = self.circuit.squares
+        protocols = self.circuit.protocols
+        wires: List[Optional[int]] = [None] * len(self.circuit.gates)
+        for gate, value in input_shares.items():
+            wires[gate] = value
+
+        for depth, (layer, operands) in enumerate(
+            zip(self.circuit.layers, self.circuit.layer_operands)
+        ):
+            operand_values = operands.apply(wires, aggregating)
+            # the operands of each product are its xs followed by its ys, masked by its a and b,
+            # or the single operand of a square, masked by its a; comparisons and truncations
+            # start their sub-protocols, whose first openings go in the same message
+            products = []
+            running = []
+            masked = []
+            offset = 0
+            for gate in layer:
+                size = self.circuit.operand_rows(gate)
+                values = operand_values[offset : offset + size]
+                offset += size
+                if protocols[gate]:
+                    protocol = self.start_protocol(gate, values, triplets[gate])
+                    running.append((gate, protocol))
+                    continue
+                products.append((gate, values))
+                for value, mask in zip(values, triplets[gate]):
+                    masked.append(value - mask)
+            requests = [protocol.send(None) for _, protocol in running]
+            opened = self.open_values(
+                run,
+                self.plan.rounds[depth][0],
+                masked + [value for request in requests for value in request],
+            )
+            offset = 0
+            for gate, values in products:
+                if squares[gate]:
+                    # x^2 = (x - a)^2 + 2 (x - a) a + a^2
+                    a, a_square = triplets[gate]
+                    x_a = opened[offset]
+                    z = a_square + 2 * x_a * a
+                    if aggregating:
+                        z += x_a * x_a
+                    wires[gate] = z % FIELD_Q
+                    offset += 1
+                    continue
+                # performs beaver triplet product with notations similar to the one in the slides,
+                # on matrices: z = c + x.(y - b) + (x - a).y - (x - a).(y - b)
+                rows, inner, cols = self.circuit.product_shape(gate)
+                middle = rows * inner
+                x = values[:middle]
+                y = values[middle:]
+                x_a = opened[offset : offset + middle]
+                y_b = opened[offset + middle : offset + len(values)]
+                if aggregating:
+                    y = [value - mask for value, mask in zip(y, y_b)]
+                z = zip(
+                    triplets[gate][len(values) :],
+                    matrix_product(x, y_b, rows, inner, cols),
+                    matrix_product(x_a, y, rows, inner, cols),
+                )
+                for output, (c, left, right) in zip(
+                    self.circuit.product_outputs(gate), z
+                ):
+                    if output is not None:
+                        wires[output] = (c + left + right) % FIELD_Q
+                offset += len(values)
+            self.run_protocols(run, depth, running, requests, opened[offset:], wires)
+
+        return Share(self.circuit.output_layer.apply(wires, aggregating)[0])
+
+    def start_protocol(
+        self, gate: int, operands: List[int], material: List[int]
+    ) -> Protocol:
+        """Starts the sub-protocol of a comparison or a truncation on its operands and material."""
+        node = self.circuit.gates[gate]
+        aggregating = self.is_aggregating_client()
+        if isinstance(node, Truncate):
+            return truncate(node.bits, operands, material, aggregating)
+        return start_protocol(node, operands, material, aggregating)
+
+    def run_protocols(
+        self,
+        run: int,
+        depth: int,
+        protocols: List[Tuple[int, Protocol]],
+        requests: List[List[int]],
+        opened: List[int],
+        wires: List[Optional[int]],
+    ) -> None:
+        """
+        Runs the sub-protocols of a layer to completion, given the values
+        opened for their first requests. Each round opens the values of all the protocols still
+        running in a single message, and the outputs of the protocols are stored in the wires.
+        """
+        round = 0
+        while protocols:
+            running = []
+            next_requests = []
+            offset = 0
+            for (gate, protocol), request in zip(protocols, requests):
+                response = opened[offset : offset + len(request)]
+                offset += len(request)
+                try:
+                    next_requests.append(protocol.send(response))
+                    running.append((gate, protocol))
+                except StopIteration as done:
+                    for output, value in zip(
+                        self.circuit.product_outputs(gate), done.value
+                    ):
+                        if output is not None:
+                            wires[output] = value
+            protocols = running
+            requests = next_requests
+            if protocols:
+                round += 1
+                opened = self.open_values(
+                    run,
+                    self.plan.rounds[depth][round],
+                    [value for request in requests for value in request],
                 )
-                for client in self.protocol_spec.participant_ids:
-                    # performs beaver triplet product with notations similar to the one in the slides
-                    if client != self.client_id:
-                        x_a = x_a + pickle.loads(
-                            self.comm.retrieve_public_message(
-                                client, "beaver:x_a" + str(expr.id.__hash__())
-                            )
-                        )
-                        y_b = y_b + pickle.loads(
-                            self.comm.retrieve_public_message(
-                                client, "beaver:y_b" + str(expr.id.__hash__())
-                            )
-                        )
-                z = c + (x_share * y_b) + (y_share * x_a)
-                if self.is_aggregating_client():
-                    z = z - (x_a * y_b)
-                return z
-        else:
-            raise TypeError("Unrecognized type of operation")
-
-        # Call specialized methods for each expression type, and have these specialized
-        # methods in turn call `process_expression` on their sub-expressions to process
-        # further.
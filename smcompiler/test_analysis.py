@@ -0,0 +1,153 @@
+"""
+Tests for the static analysis of the cost of protocols, against the costs the server measures.
+"""
+
+from multiprocessing import Process, Queue
+
+import pytest
+import requests
+
+from analysis import (
+    TRANSPORTS,
+    analyze,
+    analyze_expression,
+    material_size,
+    prediction_errors,
+)
+from comparison import protocol_rounds, protocol_triplets
+from expression import InnerProduct, LessThan, Scalar, Secret
+from protocol import ProtocolSpec
+from communication import session_url
+from secret_sharing import Share
+
+from smc_party import SMCParty
+
+
+def smc_client(client_id, prot, value_dict, session_id, queue):
+    cli = SMCParty(
+        client_id,
+        "localhost",
+        5000,
+        protocol_spec=prot,
+        value_dict=value_dict,
+        session_id=session_id,
+    )
+    queue.put(cli.run())
+
+
+def measure(session_id, prot, values):
+    """
+    Runs the protocol in a session and returns the communication cost the server measured.
+    """
+    queue = Queue()
+    clients = [
+        Process(
+            target=smc_client, args=(id, prot, values.get(id, {}), session_id, queue)
+        )
+        for id in prot.participant_ids
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    results = [queue.get() for _ in clients]
+    url = session_url("localhost", 5000, session_id)
+    cost = int(requests.get(f"{url}/communication_cost").content)
+
+    assert all(result == results[0] for result in results)
+    return cost
+
+
+def test_static_analysis():
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    xs = [Secret() for _ in range(3)]
+    expr = (a + b) * c * a + InnerProduct(xs, xs[::-1]) + LessThan(a, b) - Scalar(2)
+    report = analyze_expression(expr, 3)
+
+    assert report.gates["Secret"] == 6
+    assert report.gates["MultOp"] == 2
+    assert report.gates["InnerProduct"] == report.gates["LessThan"] == 1
+    assert report.multiplications == 4
+    assert report.depth == 2
+    # the comparison runs its rounds in the first layer, then the product by a and the output
+    assert report.rounds == protocol_rounds(LessThan, 2, Share.FIELD_Q) + 2
+    assert report.material == {"triplet": 2, "inner": 1, "solved_bits": 1}
+    nb_triplets = protocol_triplets(LessThan, 2, Share.FIELD_Q)
+    assert report.triplets == 3 + nb_triplets
+    assert report.field_elements == 2 * 3 + 7 + material_size(
+        "solved_bits", (Share.FIELD_Q.bit_length(), nb_triplets)
+    )
+    # two input messages, one from every other party per round, and the material
+    assert report.messages == {id: 2 + 2 * report.rounds + 1 for id in report.messages}
+
+
+def test_transports():
+    a = Secret()
+    b = Secret()
+    payload = analyze_expression(a * b, 4, transport="payload")
+    for transport, overhead in TRANSPORTS.items():
+        report = analyze_expression(a * b, 4, transport=transport)
+        for id, nb_bytes in report.bytes_per_party.items():
+            assert (
+                nb_bytes == payload.bytes_per_party[id] + overhead * report.messages[id]
+            )
+    with pytest.raises(ValueError):
+        analyze_expression(a * b, 4, transport="carrier pigeon")
+
+
+def test_shamir_and_owners():
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    participants = ["Alice", "Bob", "Charlie", "David", "Elusinia"]
+    spec = ProtocolSpec(
+        participants,
+        a * b + c,
+        threshold=2,
+        input_owners={a: "Alice", b: "Alice", c: "Bob"},
+    )
+    report = analyze(spec)
+    # the openings come from t other parties, and the inputs from their owners only
+    assert report.messages["Alice"] == 1 + 2 * 2 + 1
+    assert report.messages["Charlie"] == 2 + 2 * 2 + 1
+    assert report.bytes_per_party["Charlie"] == report.bytes_per_party["David"]
+    assert report.bytes_per_party["Alice"] < report.bytes_per_party["David"]
+
+    dealer_free = analyze(
+        ProtocolSpec(participants, a * b + c, threshold=2, dealer_free=True)
+    )
+    # the material is dealt by every other party in two rounds
+    assert dealer_free.messages["Charlie"] == 4 + 2 * 2 + 2 * 4
+
+
+def test_predictions_match_measurements(new_session):
+    """The predicted costs are upper bounds of the ones the server measures, within 10%."""
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    participants = ["Alice", "Bob", "Charlie"]
+    values = {"Alice": {a: 3}, "Bob": {b: 14}, "Charlie": {c: 2}}
+    specs = {
+        "test_sum": ProtocolSpec(participants, a + b + c),
+        "test_products": ProtocolSpec(participants, (a + b) * c * a - Scalar(2)),
+        "test_comparison": ProtocolSpec(participants, LessThan(a, b) * c),
+    }
+    measured = {
+        name: measure(new_session(participants), spec, values)
+        for name, spec in specs.items()
+    }
+
+    owners = {a: "Alice", b: "Bob", c: "Charlie"}
+    five = participants + ["David", "Elusinia"]
+    spec = ProtocolSpec(five, a * b + c, threshold=2, input_owners=owners)
+    specs["test_shamir"] = spec
+    session_id = new_session(five, threshold=2)
+    measured["test_shamir"] = measure(session_id, spec, values)
+
+    predicted = {name: analyze(spec).total_bytes() for name, spec in specs.items()}
+    errors = prediction_errors(predicted, measured)
+    assert set(errors) == set(specs)
+    for name, error in errors.items():
+        assert 0 <= error < 0.1, (name, predicted[name], measured[name])
@@ -0,0 +1,252 @@
+"""
+Unit tests for the compilation of expressions into circuits.
+"""
+
+from circuit import Circuit, topological_order
+from expression import (
+    BitDecompose,
+    Equals,
+    InnerProduct,
+    LessThan,
+    Matrix,
+    Scalar,
+    Secret,
+)
+from secret_sharing import Share
+
+
+def test_topological_order():
+    a = Secret()
+    b = Secret()
+    shared = a * b
+    expr = shared + shared * Scalar(2)
+    order = topological_order(expr)
+    assert len(order) == 6
+    assert order[-1] is expr
+    assert order.count(shared) == 1
+    for gate in order:
+        if gate is not a and gate is not b and hasattr(gate, "a"):
+            assert order.index(gate.a) < order.index(gate)
+            assert order.index(gate.b) < order.index(gate)
+
+
+def test_deep_expression():
+    a = Secret()
+    expr = a
+    for i in range(5000):
+        expr = expr + Scalar(i)
+    circuit = Circuit(expr)
+    assert len(circuit.gates) == 10001
+    assert circuit.output == 10000
+
+
+def test_gate_numbering_is_structural():
+    def build():
+        a = Secret()
+        b = Secret()
+        return (a + b) * a - Scalar(3)
+
+    first = Circuit(build())
+    second = Circuit(build())
+    assert first.digest == second.digest
+    assert [type(gate) for gate in first.gates] == [type(gate) for gate in second.gates]
+    assert first.gate_ids[first.gates[-1]] == second.output == len(second.gates) - 1
+    for index, gate in enumerate(first.gates):
+        if hasattr(gate, "a"):
+            assert first.operands(gate) == second.operands(second.gates[index])
+
+    a = Secret()
+    b = Secret()
+    assert Circuit((a + b) * a - Scalar(4)).digest != first.digest
+    assert Circuit((a + b) * b - Scalar(3)).digest != first.digest
+
+
+def test_sums_fold_into_one_row():
+    secrets = [Secret() for _ in range(2)]
+    expr = secrets[0]
+    for i in range(512):
+        expr += secrets[(i + 1) % 2]
+    circuit = Circuit(expr)
+    assert circuit.layers == []
+    # the whole chain is a single row over the two secrets
+    output = circuit.output_layer
+    assert len(output) == 1
+    ids = circuit.gate_ids
+    assert dict(zip(output.indices[0], output.coefficients[0])) == {
+        ids[secrets[0]]: 257,
+        ids[secrets[1]]: 256,
+    }
+
+
+def test_affine_layers():
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    shared = a - b
+    first = (shared + c) * shared
+    second = a * b
+    third = (c + Scalar(2)) * second
+    expr = first * (Scalar(2) + Scalar(1)) - third
+    circuit = Circuit(expr)
+    ids = circuit.gate_ids
+    minus_one = Share.FIELD_Q - 1
+    assert circuit.inputs == [ids[a], ids[b], ids[c]]
+    assert circuit.layers == [[ids[first], ids[second]], [ids[third]]]
+
+    first_layer = circuit.layer_operands[0]
+    rows = [
+        dict(zip(*row)) for row in zip(first_layer.indices, first_layer.coefficients)
+    ]
+    assert rows == [
+        {ids[a]: 1, ids[b]: minus_one, ids[c]: 1},
+        {ids[a]: 1, ids[b]: minus_one},
+        {ids[a]: 1},
+        {ids[b]: 1},
+    ]
+    second_layer = circuit.layer_operands[1]
+    assert second_layer.constants == [2, 0]
+
+    output = circuit.output_layer
+    assert dict(zip(output.indices[0], output.coefficients[0])) == {
+        ids[first]: 3,
+        ids[third]: minus_one,
+    }
+
+    # a = 5, b = 3, c = 4
+    wires = [None] * len(circuit.gates)
+    wires[ids[a]], wires[ids[b]], wires[ids[c]] = 5, 3, 4
+    assert first_layer.apply(wires, True) == [6, 2, 5, 3]
+    assert second_layer.apply([0] * len(wires), True) == [2, 0]
+    assert second_layer.apply([0] * len(wires), False) == [0, 0]
+
+
+def test_constant_expression():
+    expr = (Scalar(3) + Scalar(4)) * Scalar(5) - Scalar(40)
+    circuit = Circuit(expr)
+    assert circuit.beaver_ops == []
+    assert circuit.output_layer.constants == [Share.FIELD_Q - 5]
+    # multiplying by a constant subexpression is not a Beaver multiplication
+    a = Secret()
+    assert Circuit(a * (Scalar(1) + Scalar(1))).beaver_ops == []
+
+
+def test_inner_product():
+    xs = [Secret() for _ in range(3)]
+    ys = [Secret() for _ in range(3)]
+    product = InnerProduct(xs, [y + Scalar(1) for y in ys])
+    expr = product * xs[0]
+    circuit = Circuit(expr)
+    ids = circuit.gate_ids
+    # one wire opened in one layer, whatever the length of the vectors
+    assert circuit.layers == [[ids[product]], [ids[expr]]]
+    assert circuit.preprocessing(ids[product]) == ("inner", (3,))
+    assert circuit.preprocessing(ids[expr]) == ("triplet", ())
+    operands = circuit.layer_operands[0]
+    assert len(operands) == 6
+    assert operands.constants == [0, 0, 0, 1, 1, 1]
+
+    # with a constant vector, the inner product is a local linear combination
+    affine = Circuit(InnerProduct(xs, [Scalar(2), Scalar(3), Scalar(4)]))
+    assert affine.layers == []
+    output = affine.output_layer
+    assert dict(zip(output.indices[0], output.coefficients[0])) == {
+        affine.gate_ids[x]: coefficient for x, coefficient in zip(xs, [2, 3, 4])
+    }
+
+
+def test_matrix_product():
+    xs = Matrix.secrets(2, 3)
+    ys = Matrix.secrets(3, 2)
+    product = xs @ ys
+    expr = product[0][0] * product[1][1] + product[0][1]
+    circuit = Circuit(expr)
+    ids = circuit.gate_ids
+    matmul = ids[product[0][0].product]
+    # the whole product is one gate of the first layer, its coefficients are wires
+    assert circuit.layers == [[matmul], [ids[expr.a]]]
+    assert circuit.preprocessing(matmul) == ("matrix", (2, 3, 2))
+    assert len(circuit.layer_operands[0]) == 6 + 6
+    assert circuit.product_outputs(matmul) == [
+        ids[product[0][0]],
+        ids[product[0][1]],
+        None,
+        ids[product[1][1]],
+    ]
+    second_layer = circuit.layer_operands[1]
+    assert second_layer.indices == [[ids[product[0][0]]], [ids[product[1][1]]]]
+
+    # by a constant matrix, the product is a local linear combination
+    constant = Matrix(
+        [[Scalar(2), Scalar(0)], [Scalar(1), Scalar(1)], [Scalar(0), Scalar(5)]]
+    )
+    affine = Circuit((xs @ constant)[1][1])
+    assert affine.layers == []
+    output = affine.output_layer
+    assert dict(zip(output.indices[0], output.coefficients[0])) == {
+        affine.gate_ids[xs[1][1]]: 1,
+        affine.gate_ids[xs[1][2]]: 5,
+    }
+
+
+def test_square_detection():
+    a = Secret()
+    b = Secret()
+    square = a * a
+    same_form = (a + b) * (b + a)
+    product = (a + b) * (a - b)
+    expr = square + same_form + product
+    circuit = Circuit(expr)
+    ids = circuit.gate_ids
+    assert circuit.squares[ids[square]] and circuit.squares[ids[same_form]]
+    assert not circuit.squares[ids[product]]
+    assert circuit.preprocessing(ids[square]) == ("square", ())
+    assert circuit.preprocessing(ids[product]) == ("triplet", ())
+    # one row per square, two for the product
+    assert len(circuit.layer_operands[0]) == 4
+
+
+def test_power():
+    x = Secret()
+    circuit = Circuit(x**15)
+    # chain 1, 2, 4, 5, 10, 15: x^2, x^4 and x^10 are squares
+    assert len(circuit.beaver_ops) == 5
+    assert len(circuit.layers) == 5
+    assert sum(circuit.squares) == 3
+
+
+def test_comparisons():
+    a = Secret()
+    b = Secret()
+    less = LessThan(a, b)
+    product = a * b
+    decomposition = BitDecompose(product, 4)
+    weighted = less * a
+    equals = Equals(a, Scalar(3))
+    expr = weighted + decomposition.bits[3] + equals
+    circuit = Circuit(expr)
+    ids = circuit.gate_ids
+    # comparisons sit in the layers like multiplications, what uses them waits for them
+    assert circuit.layers == [
+        [ids[less], ids[product], ids[equals]],
+        [ids[weighted], ids[decomposition]],
+    ]
+    assert circuit.protocols[ids[less]] and circuit.protocols[ids[decomposition]]
+    assert circuit.wires[ids[decomposition.bits[3]]]
+    kind, (nb_bits, nb_triplets) = circuit.preprocessing(ids[less])
+    assert kind == "solved_bits" and nb_bits == Share.FIELD_Q.bit_length()
+    assert nb_triplets > 0
+    assert circuit.product_outputs(ids[decomposition]) == [
+        None,
+        None,
+        None,
+        ids[decomposition.bits[3]],
+    ]
+
+    # comparisons of constants are folded
+    constant = Circuit(
+        LessThan(Scalar(2), Scalar(5))
+        + Equals(Scalar(4), Scalar(4))
+        + BitDecompose(Scalar(6)).bits[1]
+    )
+    assert constant.layers == []
+    assert constant.output_layer.constants == [3]
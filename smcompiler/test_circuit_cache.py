@@ -0,0 +1,153 @@
+"""
+Unit tests for the on-disk format of compiled circuits and the compile cache.
+"""
+
+import pickle
+import sys
+
+import pytest
+
+from circuit import Circuit
+from circuit_cache import CompileCache, dumps, load, loads, save
+from expression import (
+    BitDecompose,
+    Equals,
+    InnerProduct,
+    LessThan,
+    MatMul,
+    Scalar,
+    Secret,
+    Truncate,
+)
+from fixed_point import FixedPointSecret
+from protocol import ProtocolSpec
+
+
+def build():
+    """An expression with every kind of gate, and its secrets."""
+    a = Secret()
+    b = FixedPointSecret()
+    c = Secret()
+    product = MatMul([[a, b], [c, Scalar(3)]], [[a], [b]])
+    decomposition = BitDecompose(a * b, 4)
+    expr = (
+        LessThan(a, b) * c
+        + product.entries[1][0]
+        + decomposition.bits[2]
+        + Truncate(a * c, 3)
+        + InnerProduct([a, b], [c, c])
+        - Scalar(-2)
+        + Equals(a, Scalar(1))
+        + (a + b) * (a + b)
+    )
+    return expr, [a, b, c]
+
+
+def assert_same_circuit(first: Circuit, second: Circuit):
+    for attribute in [
+        "output",
+        "digest",
+        "inputs",
+        "constants",
+        "beaver",
+        "wires",
+        "squares",
+        "protocols",
+        "beaver_ops",
+        "layers",
+    ]:
+        assert getattr(first, attribute) == getattr(second, attribute), attribute
+    for layer, other in zip(
+        first.layer_operands + [first.output_layer],
+        second.layer_operands + [second.output_layer],
+    ):
+        assert layer.indices == other.indices
+        assert layer.coefficients == other.coefficients
+        assert layer.constants == other.constants
+    assert len(first.layer_operands) == len(second.layer_operands)
+
+
+def test_round_trip():
+    expr, secrets = build()
+    circuit = Circuit(expr)
+    loaded = loads(dumps(circuit))
+    assert_same_circuit(circuit, loaded)
+    # the nodes are rebuilt with the same kinds, and compile to the same circuit
+    assert [type(gate) for gate in loaded.gates] == [
+        Secret if isinstance(gate, Secret) else type(gate) for gate in circuit.gates
+    ]
+    assert_same_circuit(circuit, Circuit(loaded.gates[loaded.output]))
+
+    # around the given secrets, or the caller's own nodes
+    loaded = loads(dumps(circuit), secrets=secrets)
+    assert [loaded.gates[gate] for gate in loaded.inputs] == secrets
+    loaded = loads(dumps(circuit), circuit.gates)
+    assert loaded.gate_ids[expr] == circuit.output
+
+
+def test_invalid_data(tmp_path):
+    expr, _ = build()
+    data = dumps(Circuit(expr))
+    with pytest.raises(ValueError):
+        loads(b"NOTACIRC" + data[8:])
+    with pytest.raises(ValueError):
+        loads(data, [Secret()])
+
+    path = str(tmp_path / "circuit")
+    save(Circuit(expr), path)
+    assert_same_circuit(Circuit(expr), load(path))
+
+
+def test_structural_hash():
+    first, _ = build()
+    second, _ = build()
+    assert Circuit(first).digest == Circuit(second).digest
+    # constants are compared in the field
+    a = Secret()
+    assert Circuit(a * Scalar(-1)).digest != Circuit(a * Scalar(1)).digest
+    assert Circuit(a * Scalar(-1)).digest == Circuit(Secret() * Scalar(-1)).digest
+
+
+def test_compile_cache(tmp_path):
+    cache = CompileCache(str(tmp_path))
+    first, _ = build()
+    circuit = cache.compile(first)
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # an expression with the same structure is loaded, with its own nodes
+    second, secrets = build()
+    loaded = cache.compile(second)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert_same_circuit(circuit, loaded)
+    assert loaded.gates[loaded.output] is second
+    assert all(secret in loaded.gate_ids for secret in secrets)
+
+    # and from the directory by another cache
+    other = CompileCache(str(tmp_path))
+    third, _ = build()
+    assert_same_circuit(circuit, other.compile(third))
+    assert (other.hits, other.misses) == (1, 0)
+
+    a = Secret()
+    cache.compile(a * a)
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_pickled_deep_specification():
+    # deeper than the recursion limit, which pickling the expression itself would hit
+    secrets = [Secret() for _ in range(2 * sys.getrecursionlimit())]
+    expr = secrets[0]
+    for secret in secrets[1:]:
+        expr = expr + secret
+    expr = expr * secrets[0]
+    spec = ProtocolSpec(["Alice", "Bob"], expr)
+    value_dict = {secret: index for index, secret in enumerate(secrets)}
+
+    loaded_spec, loaded_values = pickle.loads(pickle.dumps((spec, value_dict)))
+    plan = loaded_spec.plan
+    assert plan.circuit.digest == spec.compile().circuit.digest
+    assert loaded_spec.expr is plan.circuit.gates[plan.circuit.output]
+    # the secrets of the value dictionary are the ones of the circuit
+    assert set(loaded_values) == {
+        plan.circuit.gates[gate] for gate in plan.circuit.inputs
+    }
@@ -0,0 +1,72 @@
+"""
+Unit tests for the comparison sub-protocols, run locally for all the parties at once.
+"""
+
+import random
+
+from comparison import nb_bits, protocol_triplets, start_protocol
+from expression import BitDecompose, Equals, LessThan, Secret
+from secret_sharing import Share, reconstruct_secrets, share_secrets
+from ttp import SolvedBits
+
+HALF = (Share.FIELD_Q - 1) // 2
+
+
+def simulate(gate, inputs, nb_parties=3):
+    """Runs the protocol of a gate for every party and returns its outputs and its rounds."""
+    material = SolvedBits(
+        nb_parties,
+        nb_bits(),
+        protocol_triplets(type(gate), len(inputs), Share.FIELD_Q),
+    )
+    shares = share_secrets(inputs, nb_parties)
+    protocols = [
+        start_protocol(
+            gate,
+            shares[party],
+            [share.bn for share in material.get_shares(party)],
+            party == 0,
+        )
+        for party in range(nb_parties)
+    ]
+    requests = [protocol.send(None) for protocol in protocols]
+    rounds = 0
+    outputs = []
+    while not outputs:
+        opened = reconstruct_secrets(requests)
+        rounds += 1
+        requests = []
+        for protocol in protocols:
+            try:
+                requests.append(protocol.send(opened))
+            except StopIteration as done:
+                outputs.append(done.value)
+    # all the parties finish in the same round
+    assert len(outputs) == nb_parties
+    return reconstruct_secrets(outputs), rounds
+
+
+def test_less_than():
+    x, y = Secret(), Secret()
+    pairs = [(3, 5), (5, 3), (7, 7), (0, HALF), (HALF, 0)]
+    pairs += [(random.randrange(HALF), random.randrange(HALF)) for _ in range(10)]
+    for a, b in pairs:
+        (result,), rounds = simulate(LessThan(x, y), [a, b], nb_parties=2 + a % 3)
+        assert result == int(a < b)
+    # logarithmic in the number of bits
+    assert rounds <= 4 * nb_bits().bit_length()
+
+
+def test_equals():
+    x, y = Secret(), Secret()
+    for a, b in [(7, 7), (7, 8), (0, 0), (0, Share.FIELD_Q - 1)]:
+        (result,), _ = simulate(Equals(x, y), [a, b])
+        assert result == int(a == b)
+
+
+def test_bit_decompose():
+    x = Secret()
+    for value in [0, 1, 12345, Share.FIELD_Q - 1, random.randrange(Share.FIELD_Q)]:
+        bits, _ = simulate(BitDecompose(x), [value])
+        assert len(bits) == nb_bits()
+        assert bits == [(value >> i) & 1 for i in range(nb_bits())]
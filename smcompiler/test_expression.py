@@ -5,7 +5,20 @@ Testing expressions is not obligatory.
 MODIFY THIS FILE.
 """
 
-from expression import Secret, Scalar
+import pytest
+
+from expression import (
+    BitDecompose,
+    Equals,
+    InnerProduct,
+    LessThan,
+    MatMul,
+    Matrix,
+    Secret,
+    Scalar,
+    addition_chain,
+    maximum,
+)
 
 
 # Example test, you can adapt it to your needs.
@@ -40,3 +53,79 @@ def test_operations():
     d = Scalar(5)
     scal_op = c * d
     assert scal_op.scalar_operand() == 3
+
+
+def test_inner_product():
+    a = Secret(1)
+    b = Secret(2)
+    c = Scalar(3)
+    expr = InnerProduct([a, b], [c, a + b])
+    assert (
+        repr(expr)
+        == "InnerProduct([Secret(1), Secret(2)], [Scalar(3), (Secret(1) + Secret(2))])"
+    )
+    assert expr.get_operands() == (a, b, c, expr.ys[1])
+    with pytest.raises(ValueError):
+        InnerProduct([a, b], [c])
+    with pytest.raises(ValueError):
+        InnerProduct([], [])
+    with pytest.raises(ValueError):
+        InnerProduct([a], [3])
+
+
+def test_matrix_product():
+    xs = Matrix.secrets(2, 3)
+    ys = Matrix.secrets(3, 1)
+    product = xs @ ys
+    assert product.shape == (2, 1)
+    entry = product[1][0]
+    assert (entry.row, entry.col) == (1, 0)
+    assert entry.get_operands() == (entry.product,)
+    assert entry.product.get_operands() == xs[0] + xs[1] + ys[0] + ys[1] + ys[2]
+    assert xs.assign([[1, 2, 3], [4, 5, 6]])[xs[1][0]] == 4
+    with pytest.raises(ValueError):
+        xs @ xs
+    with pytest.raises(ValueError):
+        MatMul([[Secret()], [Secret(), Secret()]], [[Secret()]])
+    with pytest.raises(ValueError):
+        MatMul([], [])
+
+
+def test_addition_chain():
+    # lengths of the shortest addition chains
+    for exponent, length in ((1, 0), (2, 1), (15, 5), (23, 6), (71, 9), (127, 10)):
+        chain = addition_chain(exponent)
+        assert len(chain) - 1 == length
+        assert chain[0] == 1 and chain[-1] == exponent
+        for index, value in enumerate(chain[1:], 1):
+            previous = chain[:index]
+            assert any(value - a in previous for a in previous)
+    # beyond the search, square-and-multiply
+    assert len(addition_chain(1 << 20)) - 1 == 20
+
+
+def test_power():
+    a = Secret()
+    assert repr(a ** 1) == "Secret()"
+    assert repr(a ** 0) == "Scalar(1)"
+    # x^4 is the square of the square of x
+    fourth = a ** 4
+    assert fourth.a is fourth.b and fourth.a.a is a and fourth.a.b is a
+    with pytest.raises(ValueError):
+        a ** -1
+    with pytest.raises(ValueError):
+        a ** Scalar(2)
+
+
+def test_comparisons():
+    a = Secret(1)
+    b = Secret(2)
+    assert repr(LessThan(a, b)) == "(Secret(1) < Secret(2))"
+    assert repr(Equals(a, Scalar(3))) == "(Secret(1) == Scalar(3))"
+    decomposition = BitDecompose(a, 8)
+    assert len(decomposition.bits) == 8
+    assert decomposition.bits[5].get_operands() == (decomposition,)
+    assert repr(decomposition.bits[5]) == "BitDecompose(Secret(1))[5]"
+    with pytest.raises(ValueError):
+        BitDecompose(a, 1000)
+    assert repr(maximum(a, b)) == "(Secret(2) + (Secret(2) < Secret(1)) * (Secret(1) - Secret(2)))"
@@ -0,0 +1,75 @@
+"""
+Unit tests for fixed-point encodings and truncation.
+"""
+
+import random
+
+import pytest
+
+from circuit import Circuit
+from expression import Scalar, Truncate
+from fixed_point import (
+    Fixed,
+    FixedPointSecret,
+    decode,
+    encode,
+    magnitude_bits,
+    truncate,
+)
+from secret_sharing import Share, reconstruct_secrets, share_secrets
+from ttp import TruncationPair
+
+
+def test_encoding():
+    assert encode(1.5, 4) == 24
+    assert decode(encode(-2.25, 8), 8) == -2.25
+    assert encode(-1, 0) == Share.FIELD_Q - 1
+    assert FixedPointSecret(fractional_bits=3).encode(0.5) == 4
+
+
+def test_fixed_expressions():
+    x = Fixed.secret(8)
+    y = Fixed.secret(8)
+    product = x * y
+    assert isinstance(product.expr, Truncate) and product.expr.bits == 8
+    # integers keep the encoding, reals are encoded and truncated
+    assert not isinstance((x * 3).expr, Truncate)
+    assert isinstance((x * 0.5).expr, Truncate)
+    assert (x + 1.5).expr.b.value == encode(1.5, 8)
+    with pytest.raises(ValueError):
+        x + Fixed.secret(4)
+
+
+def test_constant_truncation():
+    # -3.8 is -61 / 16, which truncates to -16 / 4
+    circuit = Circuit(Truncate(Scalar(encode(-3.8, 4)), 2))
+    assert decode(circuit.output_layer.constants[0], 2) == -4
+
+
+def test_truncate():
+    bits = 10
+    bound = 1 << (magnitude_bits() - 2)
+    for value in [0, 5, -5, 1 << 20, -(1 << 30)] + [
+        random.randrange(-bound, bound) for _ in range(20)
+    ]:
+        nb_parties = 3
+        pair = TruncationPair(nb_parties, bits)
+        shares = share_secrets([value % Share.FIELD_Q], nb_parties)
+        protocols = [
+            truncate(
+                bits,
+                shares[party],
+                [share.bn for share in pair.get_shares(party)],
+                party == 0,
+            )
+            for party in range(nb_parties)
+        ]
+        opened = reconstruct_secrets([protocol.send(None) for protocol in protocols])
+        outputs = []
+        for protocol in protocols:
+            with pytest.raises(StopIteration) as done:
+                protocol.send(opened)
+            outputs.append(done.value.value)
+        (result,) = reconstruct_secrets(outputs)
+        # rounded down or up
+        assert decode(result, 0) - (value >> bits) in (0, 1)
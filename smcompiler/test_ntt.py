@@ -0,0 +1,63 @@
+"""
+Unit tests for the number-theoretic transforms.
+"""
+
+from ntt import (
+    domain_size,
+    lagrange_at_zero,
+    ntt,
+    poly_multiply,
+    vanishing_polynomial,
+)
+from prime_gen import root_of_unity
+from secret_sharing import Share, lagrange_coefficients, random_field_elements
+
+
+def test_domain_size():
+    counts = (0, 1, 2, 3, 4, 5, 256, 257)
+    sizes = [1, 1, 2, 4, 4, 8, 256, 512]
+    assert [domain_size(count) for count in counts] == sizes
+
+
+def test_ntt():
+    FIELD_Q = Share.FIELD_Q
+    for size in (1, 2, 8, 64):
+        coefficients = random_field_elements(size)
+        root = root_of_unity(size, FIELD_Q)
+        values = ntt(coefficients, FIELD_Q)
+        assert values == [
+            sum(c * pow(root, i * j, FIELD_Q) for i, c in enumerate(coefficients))
+            % FIELD_Q
+            for j in range(size)
+        ]
+        assert ntt(values, FIELD_Q, inverse=True) == coefficients
+
+
+def test_poly_multiply():
+    FIELD_Q = Share.FIELD_Q
+    xs = random_field_elements(50)
+    ys = random_field_elements(70)
+    product = [0] * 119
+    for i, x in enumerate(xs):
+        for j, y in enumerate(ys):
+            product[i + j] += x * y
+    assert poly_multiply(xs, ys, FIELD_Q) == [value % FIELD_Q for value in product]
+    assert poly_multiply([2, 1], [3, 1], FIELD_Q) == [6, 5, 1]
+    assert vanishing_polynomial([1, 2, 3], FIELD_Q) == [
+        FIELD_Q - 6,
+        11,
+        FIELD_Q - 6,
+        1,
+    ]
+
+
+def test_lagrange_at_zero():
+    FIELD_Q = Share.FIELD_Q
+    root = root_of_unity(16, FIELD_Q)
+    exponents = (0, 3, 4, 9, 15)
+    points = tuple(pow(root, exponent, FIELD_Q) for exponent in exponents)
+    assert lagrange_at_zero(exponents, 16, FIELD_Q) == lagrange_coefficients(
+        points, FIELD_Q
+    )
+    # at all the roots of unity, the constant coefficient is the mean of the values
+    assert set(lagrange_at_zero(tuple(range(8)), 8, FIELD_Q)) == {pow(8, -1, FIELD_Q)}
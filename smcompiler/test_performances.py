@@ -1,10 +1,12 @@
 """
 Test for measuring performance with pytest-benchmark
 """
+import base64
 import inspect
 import json
 import random as rd
 import time
+import tracemalloc
 from multiprocessing import Process, Queue
 from os.path import exists
 from typing import Optional
@@ -12,8 +14,9 @@ from typing import Optional
 import pytest
 import requests
 
-from expression import Expression, Scalar, Secret
+from expression import AddOp, Expression, Scalar, Secret
 from protocol import ProtocolSpec
+from secret_sharing import Share
 from server import run
 from smc_party import SMCParty
 
@@ -735,3 +738,51 @@ def test_nb_scal_mul_400(benchmark):
     write_comm_cost(str(inspect.currentframe().f_code.co_name))
     benchmark(run_processes, clients, queue)
     check_results_stop_serv_proc(server_proc, queue, len(clients))
+
+
+"""
+Memory footprint of expression nodes and shares
+"""
+
+
+class DictNode:
+    """Node storing its attributes in an instance dict, as expressions did before using __slots__"""
+
+    def __init__(self, a, b):
+        self.id = base64.b64encode(rd.getrandbits(32).to_bytes(4, "little"))
+        self.a = a
+        self.b = b
+
+
+class DictShare:
+    """Share storing its value in an instance dict, as shares did before using __slots__"""
+
+    def __init__(self, value):
+        self.bn = value % Share.FIELD_Q
+
+
+def bytes_per_object(factory, nb_objects: int = 100000) -> float:
+    """Average number of bytes allocated by each object built by factory(i)."""
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    objects = [factory(i) for i in range(nb_objects)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the list holding the objects costs one pointer per object
+    return (end - start) / len(objects) - 8
+
+
+def test_memory_per_node():
+    leaf = Secret()
+    before = bytes_per_object(lambda i: DictNode(leaf, leaf))
+    after = bytes_per_object(lambda i: AddOp(leaf, leaf))
+    print(f"Expression node: {before:.0f} bytes before, {after:.0f} bytes after")
+    assert after < before
+
+
+def test_memory_per_share():
+    # large values so that the ints themselves are not cached
+    before = bytes_per_object(lambda i: DictShare(i + 1000))
+    after = bytes_per_object(lambda i: Share(i + 1000))
+    print(f"Share: {before:.0f} bytes before, {after:.0f} bytes after")
+    assert after < before
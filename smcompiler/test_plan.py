@@ -0,0 +1,125 @@
+"""
+Unit tests for the execution plans compiled from the protocol specifications.
+"""
+
+import pickle
+
+import pytest
+
+from comparison import protocol_rounds
+from expression import LessThan, Scalar, Secret
+from protocol import ProtocolSpec
+from secret_sharing import AdditiveSharing, NTTShamirSharing, Share
+
+PARTICIPANTS = ["Alice", "Bob", "Charlie"]
+
+
+def test_compile_is_memoized():
+    a = Secret()
+    b = Secret()
+    spec = ProtocolSpec(PARTICIPANTS, a * b + Scalar(2))
+    plan = spec.compile()
+    assert spec.compile() is plan
+    assert plan.participant_ids == tuple(PARTICIPANTS)
+    assert isinstance(plan.scheme, AdditiveSharing)
+    # only the first party adds the constants with additive sharing
+    assert plan.adds_constants == {"Alice": True, "Bob": False, "Charlie": False}
+
+
+def test_rounds_and_preprocessing():
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    less = LessThan(a, b)
+    product = a * b
+    expr = less * c + product
+    plan = ProtocolSpec(PARTICIPANTS, expr).compile()
+    ids = plan.circuit.gate_ids
+
+    # the comparison runs its rounds in the first layer, the products open in one
+    nb_rounds = protocol_rounds(LessThan, 2, Share.FIELD_Q)
+    assert plan.rounds[0][:2] == ["layer0", "layer0.1"]
+    assert len(plan.rounds[0]) == nb_rounds
+    assert plan.rounds[1] == ["layer1"]
+    assert plan.nb_rounds() == nb_rounds + 2
+
+    gates = [gate for gate, _, _ in plan.preprocessing]
+    assert gates == plan.circuit.beaver_ops
+    assert (ids[product], "triplet", ()) in plan.preprocessing
+    assert plan.label(3, "layer1") == f"{plan.circuit.digest}.{plan.nonce}.3.layer1"
+
+
+def test_input_owners():
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    expr = a * b + c
+    plan = ProtocolSpec(
+        PARTICIPANTS, expr, input_owners={a: "Alice", b: "Alice", c: "Charlie"}
+    ).compile()
+    ids = plan.circuit.gate_ids
+    assert plan.inputs == {
+        "Alice": [ids[a], ids[b]],
+        "Bob": [],
+        "Charlie": [ids[c]],
+    }
+    # nobody waits for Bob, who has no input
+    assert plan.senders("Bob") == ["Alice", "Charlie"]
+    assert plan.senders("Alice") == ["Charlie"]
+    assert plan.owns("Alice", a) and not plan.owns("Bob", a)
+    assert not plan.owns("Alice", Secret())
+
+    # without owners, every party sends its shares to every other
+    plan = ProtocolSpec(PARTICIPANTS, expr).compile()
+    assert plan.inputs is None
+    assert plan.senders("Bob") == ["Alice", "Charlie"]
+    assert plan.owns("Bob", a)
+
+
+def test_invalid_input_owners():
+    a = Secret()
+    b = Secret()
+    with pytest.raises(ValueError):
+        ProtocolSpec(PARTICIPANTS, a + b, input_owners={a: "Alice"}).compile()
+    with pytest.raises(ValueError):
+        ProtocolSpec(PARTICIPANTS, a + b, input_owners={a: "Alice", b: "Eve"}).compile()
+    # dealer-free preprocessing needs an honest majority above the threshold
+    with pytest.raises(ValueError):
+        ProtocolSpec(PARTICIPANTS, a * b, threshold=2, dealer_free=True).compile()
+    # and the parties only generate the material of products themselves
+    with pytest.raises(ValueError):
+        ProtocolSpec(
+            PARTICIPANTS, LessThan(a, b), threshold=1, dealer_free=True
+        ).compile()
+
+
+def test_pickled_plan():
+    a = Secret()
+    b = Secret()
+    spec = ProtocolSpec(
+        PARTICIPANTS, a * b - Scalar(1), threshold=1, input_owners={a: "Bob", b: "Bob"}
+    )
+    spec.compile()
+    plan = pickle.loads(pickle.dumps(spec)).plan
+    assert plan.rounds == spec.plan.rounds
+    assert plan.preprocessing == spec.plan.preprocessing
+    assert plan.circuit.digest == spec.plan.circuit.digest
+    assert plan.senders("Alice") == ["Bob"]
+    assert plan.scheme.threshold == 1
+    assert not isinstance(plan.scheme, NTTShamirSharing)
+
+
+def test_labels_are_namespaced_by_nonce():
+    def build(nonce=""):
+        a = Secret()
+        b = Secret()
+        return ProtocolSpec(PARTICIPANTS, a * b, nonce=nonce).compile()
+
+    # parties building the same specification on their own agree on the labels
+    first = build()
+    assert first.label(0, "layer0") == build().label(0, "layer0")
+    # the same circuit, but the messages of one protocol are never read by the other
+    second = build("second")
+    assert first.circuit.digest == second.circuit.digest
+    assert first.label(0, "layer0") != second.label(0, "layer0")
+    assert second.label(0, "layer0").split(".")[1] == "second"
@@ -0,0 +1,76 @@
+"""
+Tests for the dealer-free generation of the material of the products.
+"""
+
+import time
+from multiprocessing import Process, Queue
+
+import pytest
+
+from communication import Communication
+from preprocessing import check_scheme, generate_material
+from secret_sharing import AdditiveSharing, ShamirSharing, Share, matrix_product
+from server import run
+
+PARTICIPANTS = ["Alice", "Bob", "Charlie", "David", "Elusinia"]
+OPERATIONS = [("triplet", ()), ("square", ()), ("inner", (3,)), ("matrix", (2, 3, 2))]
+
+
+def generating_client(client_id, queue):
+    comm = Communication("localhost", 5000, client_id)
+    material = generate_material(
+        comm, PARTICIPANTS, ShamirSharing(2), "preprocessing", OPERATIONS
+    )
+    queue.put((client_id, material))
+
+
+def test_check_scheme():
+    check_scheme(ShamirSharing(2), 5)
+    with pytest.raises(ValueError):
+        check_scheme(ShamirSharing(2), 4)
+    with pytest.raises(ValueError):
+        check_scheme(AdditiveSharing(), 3)
+
+
+def test_generate_material():
+    server = Process(target=run, args=("localhost", 5000, PARTICIPANTS))
+    server.start()
+    time.sleep(3)
+
+    queue = Queue()
+    clients = [
+        Process(target=generating_client, args=(name, queue)) for name in PARTICIPANTS
+    ]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    results = dict(queue.get() for _ in clients)
+
+    server.terminate()
+    server.join()
+    time.sleep(2)
+
+    # any 3 of the 5 parties reconstruct the same material
+    scheme = ShamirSharing(2)
+    opened = [
+        [
+            scheme.reconstruct(
+                {party: results[PARTICIPANTS[party]][index] for party in parties}
+            )
+            for index in range(len(OPERATIONS))
+        ]
+        for parties in ((0, 1, 2), (2, 3, 4))
+    ]
+    assert opened[0] == opened[1]
+    triplet, square, inner, matrix = opened[0]
+
+    a, b, c = triplet
+    assert a * b % Share.FIELD_Q == c
+    a, a_square = square
+    assert a * a % Share.FIELD_Q == a_square
+    assert (
+        inner[-1] == sum(x * y for x, y in zip(inner[:3], inner[3:6])) % Share.FIELD_Q
+    )
+    product = matrix_product(matrix[:6], matrix[6:12], 2, 3, 2)
+    assert matrix[12:] == [value % Share.FIELD_Q for value in product]
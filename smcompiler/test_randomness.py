@@ -0,0 +1,73 @@
+"""
+Unit tests for the sources of randomness.
+"""
+
+import multiprocessing
+
+import pytest
+
+from randomness import (
+    RandomSource,
+    SeededRandomSource,
+    SystemRandomSource,
+    get_source,
+    set_source,
+)
+from secret_sharing import Share, random_field_elements
+
+
+def draw(source, queue):
+    queue.put(source.random_bytes(32))
+
+
+def test_field_elements():
+    for source in (SystemRandomSource(), SeededRandomSource()):
+        values = source.field_elements(10000, Share.FIELD_Q)
+        assert len(values) == 10000
+        assert all(0 <= value < Share.FIELD_Q for value in values)
+        assert len(set(values)) == 10000
+        small = source.field_elements(1000, 7)
+        assert set(small) == set(range(7))
+        assert set(source.bits(1000)) == {0, 1}
+        assert all(0 <= value < 1 << 20 for value in source.integers(1000, 20))
+
+
+def test_seeded_source():
+    seed = bytes(range(32))
+    first = SeededRandomSource(seed)
+    second = SeededRandomSource(seed)
+    # the same stream, whatever the sizes it is drawn by
+    assert first.random_bytes(100) + first.random_bytes(3) == second.random_bytes(103)
+    assert first.spawn(1).random_bytes(64) == second.spawn(1).random_bytes(64)
+    assert first.spawn(1).random_bytes(64) != first.spawn(2).random_bytes(64)
+    assert SeededRandomSource().random_bytes(32) != SeededRandomSource().random_bytes(
+        32
+    )
+    with pytest.raises(ValueError):
+        SeededRandomSource(b"short")
+
+
+def test_forked_source():
+    source = SystemRandomSource()
+    source.random_bytes(1)
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    child = context.Process(target=draw, args=(source, queue))
+    child.start()
+    child.join()
+    # the child does not hand out the rest of the buffer of the parent
+    assert queue.get() != source.random_bytes(32)
+
+
+def test_set_source():
+    default = get_source()
+    try:
+        set_source(SeededRandomSource(bytes(32)))
+        first = random_field_elements(5)
+        set_source(SeededRandomSource(bytes(32)))
+        assert random_field_elements(5) == first
+    finally:
+        set_source(default)
+    # a source must at least give random bytes
+    with pytest.raises(TypeError):
+        RandomSource()
@@ -4,6 +4,8 @@ Testing secret sharing is not obligatory.
 
 MODIFY THIS FILE.
 """
+import pytest
+
 from prime_gen import *
 from secret_sharing import *
 
@@ -71,3 +73,158 @@ def test_secret_reconstruction():
     num_shares_2 = 5
     shares_2 = share_secret(secret, num_shares_2)
     assert reconstruct_secret(shares_2) == secret
+
+
+def test_random_field_elements():
+    values = random_field_elements(10000)
+    assert len(values) == 10000
+    assert all(0 <= value < Share.FIELD_Q for value in values)
+    # 10000 draws among ~3.5M values collide a few times, but not hundreds of times
+    assert len(set(values)) > 9900
+
+
+def test_bulk_sharing():
+    secrets = [0, 1, 12, Share.FIELD_Q - 1, 123456]
+    for num_shares in (1, 2, 5):
+        shares = share_secrets(secrets, num_shares)
+        assert len(shares) == num_shares
+        assert all(len(row) == len(secrets) for row in shares)
+        assert reconstruct_secrets(shares) == secrets
+    assert reconstruct_secrets(share_secrets([], 3)) == []
+
+
+def test_incomplete_scheme():
+    class Incomplete(SharingScheme):
+        def share(self, secrets, num_shares):
+            return [list(secrets)] * num_shares
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_matrix_product():
+    # [[1, 2], [3, 4], [5, 6]] . [[1, 0, 2], [0, 1, 3]]
+    xs = [1, 2, 3, 4, 5, 6]
+    ys = [1, 0, 2, 0, 1, 3]
+    assert matrix_product(xs, ys, 3, 2, 3) == [1, 2, 8, 3, 4, 18, 5, 6, 28]
+    assert matrix_product([2, 3], [4, 5], 1, 2, 1) == [23]
+
+
+def test_shamir_sharing():
+    scheme = ShamirSharing(2)
+    secrets = [0, 1, 12, Share.FIELD_Q - 1, 123456]
+    shares = scheme.share(secrets, 5)
+    assert len(shares) == 5
+    assert all(len(row) == len(secrets) for row in shares)
+    # any 3 of the 5 shares reconstruct the secrets
+    for parties in ((0, 1, 2), (4, 2, 0), (1, 3, 4)):
+        assert (
+            scheme.reconstruct({party: shares[party] for party in parties}) == secrets
+        )
+    assert scheme.reconstruct(dict(enumerate(shares))) == secrets
+    # shares are linear, and constants are added by every party
+    sums = {
+        party: [(value + 5) % Share.FIELD_Q for value in shares[party]]
+        for party in (0, 3, 4)
+    }
+    assert scheme.reconstruct(sums) == [
+        (value + 5) % Share.FIELD_Q for value in secrets
+    ]
+
+    with pytest.raises(ValueError):
+        scheme.reconstruct({0: shares[0], 1: shares[1]})
+    with pytest.raises(ValueError):
+        scheme.share(secrets, 2)
+
+
+def test_lagrange_coefficients():
+    FIELD_Q = Share.FIELD_Q
+    coefficients = lagrange_coefficients((1, 2, 3), FIELD_Q)
+    assert coefficients == (3, FIELD_Q - 3, 1)
+    assert sum(coefficients) % FIELD_Q == 1
+    assert lagrange_coefficients((1, 2, 3), FIELD_Q) is coefficients
+
+
+def test_sharing_schemes():
+    additive = sharing_scheme()
+    assert isinstance(additive, AdditiveSharing)
+    assert additive.needed_shares(4) == 4
+    assert [additive.adds_constants(party) for party in range(3)] == [
+        True,
+        False,
+        False,
+    ]
+    shares = additive.share([7, 8], 3)
+    assert additive.reconstruct(dict(enumerate(shares))) == [7, 8]
+
+    shamir = sharing_scheme(1)
+    assert isinstance(shamir, ShamirSharing)
+    assert shamir.needed_shares(4) == 2
+    assert all(shamir.adds_constants(party) for party in range(3))
+
+
+def test_packed_sharing():
+    scheme = PackedShamirSharing(2, 3)
+    secrets = list(range(10))
+    shares = scheme.share(secrets, 6)
+    # 10 secrets packed 3 by 3 in 4 share values per party
+    assert len(shares) == 6
+    assert all(len(row) == 4 for row in shares)
+    assert scheme.needed_shares(6) == 5
+    # any 5 of the 6 parties reconstruct the secrets, the last block padded with zeros
+    for parties in ((0, 1, 2, 3, 4), (5, 3, 1, 0, 2)):
+        opened = scheme.reconstruct({party: shares[party] for party in parties})
+        assert opened == secrets + [0, 0]
+    # adding packed shares adds the secrets slot by slot, constants are added by every party
+    sums = {
+        party: [
+            (x + y + 7) % Share.FIELD_Q for x, y in zip(shares[party], shares[party])
+        ]
+        for party in range(5)
+    }
+    assert scheme.reconstruct(sums)[:10] == [2 * secret + 7 for secret in secrets]
+
+    with pytest.raises(ValueError):
+        scheme.reconstruct({party: shares[party] for party in range(4)})
+    with pytest.raises(ValueError):
+        scheme.share(secrets, 4)
+
+
+def test_packed_secret():
+    shares = share_packed_secret([4, 5, 6], 7, 2)
+    assert len(shares) == 7
+    assert reconstruct_packed_secret(shares, 3) == [4, 5, 6]
+    assert reconstruct_packed_secret(shares[:5], 3) == [4, 5, 6]
+
+
+def test_ntt_prime_generation():
+    q = gen_ntt_prime(10, 1 << 20, 1 << 24)
+    assert (1 << 20) <= q <= (1 << 24)
+    assert (q - 1) % (1 << 10) == 0
+    assert is_prime(16, q)
+
+    root = root_of_unity(1 << 10, q)
+    assert pow(root, 1 << 10, q) == 1
+    assert pow(root, 1 << 9, q) != 1
+    # the same root at every call
+    assert root_of_unity(1 << 10, q) == root
+    with pytest.raises(ValueError):
+        root_of_unity(1 << 33, Share.FIELD_Q)
+    with pytest.raises(ValueError):
+        gen_ntt_prime(20, 1 << 10, 1 << 12)
+
+
+def test_ntt_shamir_sharing():
+    scheme = sharing_scheme(100, 256)
+    assert isinstance(scheme, NTTShamirSharing)
+    secrets = [0, 1, Share.FIELD_Q - 1, 123456]
+    shares = scheme.share(secrets, 256)
+    assert len(shares) == 256
+    for parties in (range(101), range(155, 256), range(0, 256, 2)):
+        assert (
+            scheme.reconstruct({party: shares[party] for party in parties}) == secrets
+        )
+    with pytest.raises(ValueError):
+        scheme.reconstruct({party: shares[party] for party in range(100)})
+    with pytest.raises(ValueError):
+        scheme.share(secrets, 257)
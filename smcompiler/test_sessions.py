@@ -0,0 +1,238 @@
+"""
+Tests for running several computations in separate sessions of one server.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process, Queue
+
+from expression import Scalar, Secret
+from protocol import ProtocolSpec
+from secret_sharing import ShamirSharing, Share
+from server import app, sessions
+
+from smc_party import SMCParty
+
+
+def smc_client(client_id, prot, value_dict, session_id, queue):
+    cli = SMCParty(
+        client_id,
+        "localhost",
+        5000,
+        protocol_spec=prot,
+        value_dict=value_dict,
+        session_id=session_id,
+    )
+    res = cli.run()
+    queue.put((session_id, res))
+    print(f"{client_id} has finished!")
+
+
+def smc_independent_client(client_id, value, session_id, queue):
+    # the party builds the specification on its own, from its own secrets
+    a, b = Secret(), Secret()
+    prot = ProtocolSpec(expr=a * b + Scalar(3), participant_ids=["Alice", "Bob"])
+    value_dict = {a: value} if client_id == "Alice" else {b: value}
+    smc_client(client_id, prot, value_dict, session_id, queue)
+
+
+def test_sessions_are_isolated():
+    client = app.test_client()
+    assert client.post("/sessions/iso_1", json=["Alice", "Bob"]).status_code == 201
+    assert client.post("/sessions/iso_2", json=["Alice", "Bob"]).status_code == 201
+    assert client.post("/sessions/iso_1", json=["Alice"]).status_code == 409
+
+    client.post("/sessions/iso_1/public/Alice/label", data=b"first")
+    client.post("/sessions/iso_2/public/Alice/label", data=b"second")
+    assert client.get("/sessions/iso_1/public/Bob/Alice/label").data == b"first"
+    assert client.get("/sessions/iso_2/public/Bob/Alice/label").data == b"second"
+    assert client.get("/public/Bob/Alice/label").status_code == 404
+
+    client.post("/sessions/iso_1/private/Alice/Bob/label", data=b"secret")
+    assert client.get("/sessions/iso_1/private/Bob/label").data == b"secret"
+    assert client.get("/sessions/iso_2/private/Bob/label").status_code == 404
+
+    # each session has its own trusted parameter generator
+    shares_1 = client.get("/sessions/iso_1/shares/Alice/op").get_json()
+    shares_2 = client.get("/sessions/iso_2/shares/Alice/op").get_json()
+    assert len(shares_1) == len(shares_2) == 3
+
+    assert int(client.get("/sessions/iso_1/communication_cost").data) > 0
+
+    assert client.delete("/sessions/iso_1").status_code == 200
+    assert client.delete("/sessions/iso_1").status_code == 404
+    assert client.get("/sessions/iso_1/public/Bob/Alice/label").status_code == 404
+    client.delete("/sessions/iso_2")
+
+
+def test_concurrent_session_creation():
+    def create(_):
+        return (
+            app.test_client().post("/sessions/race", json=["Alice", "Bob"]).status_code
+        )
+
+    with ThreadPoolExecutor(8) as executor:
+        statuses = list(executor.map(create, range(32)))
+    assert sorted(statuses) == [201] + [409] * 31
+    app.test_client().delete("/sessions/race")
+
+
+def test_shamir_sessions():
+    client = app.test_client()
+    participants = ["Alice", "Bob", "Charlie"]
+    for threshold in (0, 3, "1", 1.5, True):
+        body = {"participants": participants, "threshold": threshold}
+        assert client.post("/sessions/shamir", json=body).status_code == 400
+    body = {"participants": participants, "threshold": 1}
+    assert client.post("/sessions/shamir", json=body).status_code == 201
+
+    # any two parties reconstruct the triplets of the session
+    shares = [
+        client.get(f"/sessions/shamir/shares/{name}/op").get_json()
+        for name in participants
+    ]
+    a, b, c = ShamirSharing(1).reconstruct({0: shares[0], 2: shares[2]})
+    assert a * b % Share.FIELD_Q == c
+    client.delete("/sessions/shamir")
+
+
+def test_party_order():
+    client = app.test_client()
+    client.post("/sessions/order", json=["Alice", "Bob"])
+    operations = [["op", "triplet", []]]
+    url = "/sessions/order/shares/Bob"
+    response = client.post(url, json=operations, query_string={"party": 1})
+    assert response.status_code == 200
+    # Bob is the first party of a protocol listing the participants in another order
+    response = client.post(url, json=operations, query_string={"party": 0})
+    assert response.status_code == 409
+    client.delete("/sessions/order")
+
+
+def test_protocol_threshold():
+    client = app.test_client()
+    client.post("/sessions/threshold", json=["Alice", "Bob", "Charlie"])
+    operations = [["op", "triplet", []]]
+    url = "/sessions/threshold/shares/Alice"
+    # the session shares additively, as the protocol does without a threshold
+    response = client.post(
+        url, json=operations, query_string={"party": 0, "threshold": 0}
+    )
+    assert response.status_code == 200
+    response = client.post(
+        url, json=operations, query_string={"party": 0, "threshold": 1}
+    )
+    assert response.status_code == 409
+    client.delete("/sessions/threshold")
+
+
+def test_invalid_material_requests():
+    client = app.test_client()
+    client.post("/sessions/material", json=["Alice", "Bob"])
+    for operations in (
+        [["op", "unknown", []]],
+        [["op", "inner", [1, 2]]],
+        [["op", "random_bits", [1 << 30]]],
+        [["op", "triplet"]],
+    ):
+        response = client.post("/sessions/material/shares/Alice", json=operations)
+        assert response.status_code == 400
+    # no material is generated for the valid operations of a bad request
+    operations = [["first", "triplet", []], ["second", "unknown", []]]
+    response = client.post("/sessions/material/shares/Alice", json=operations)
+    assert response.status_code == 400
+    assert not sessions["material"].ttp.operation_triplets
+    # Eve is not a participant of the session
+    response = client.post(
+        "/sessions/material/shares/Eve", json=[["op", "triplet", []]]
+    )
+    assert response.status_code == 404
+    assert client.get("/sessions/material/shares/Eve/op").status_code == 404
+    operations = [["first", "triplet", []], ["second", "inner", [4]]]
+    shares = client.post("/sessions/material/shares/Alice", json=operations).get_json()
+    assert [len(material) for material in shares] == [3, 9]
+    client.delete("/sessions/material")
+
+
+def test_concurrent_sessions(new_session):
+    """
+    Runs two computations with different participants at the same time on one server.
+    """
+    a, b, c = Secret(), Secret(), Secret()
+    first = {"Alice": {a: 3}, "Bob": {b: 14}, "Charlie": {c: 2}}
+    first_expr = (a + b) * c + Scalar(5)
+
+    d, e = Secret(), Secret()
+    second = {"David": {d: 7}, "Elusinia": {e: 6}}
+    second_expr = d * e - Scalar(2)
+
+    queue = Queue()
+    clients = []
+    expected = {}
+    for parties, expr, result in (
+        (first, first_expr, (3 + 14) * 2 + 5),
+        (second, second_expr, 7 * 6 - 2),
+    ):
+        participants = list(parties.keys())
+        session_id = new_session(participants)
+        expected[session_id] = result
+        prot = ProtocolSpec(expr=expr, participant_ids=participants)
+        clients += [
+            Process(target=smc_client, args=(name, prot, value_dict, session_id, queue))
+            for name, value_dict in parties.items()
+        ]
+
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    results = [queue.get() for _ in clients]
+
+    for session_id, result in results:
+        assert result == expected[session_id]
+
+
+def test_same_structure_in_one_session(new_session):
+    """
+    Runs two protocols of the same structure, on different secrets, in the same session, told
+    apart by their nonces.
+    """
+    session_id = new_session(["Alice", "Bob"])
+    queue = Queue()
+    clients = []
+    for nonce, values in (("first", (3, 14)), ("second", (7, 6))):
+        a, b = Secret(), Secret()
+        prot = ProtocolSpec(
+            expr=a * b + a, participant_ids=["Alice", "Bob"], nonce=nonce
+        )
+        clients += [
+            Process(target=smc_client, args=(name, prot, value_dict, session_id, queue))
+            for name, value_dict in (("Alice", {a: values[0]}), ("Bob", {b: values[1]}))
+        ]
+
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    results = sorted(queue.get()[1] for _ in clients)
+
+    assert results == [3 * 14 + 3] * 2 + [7 * 6 + 7] * 2
+
+
+def test_independent_specifications(new_session):
+    """
+    Runs a protocol of which each party builds the specification on its own.
+    """
+    session_id = new_session(["Alice", "Bob"])
+    queue = Queue()
+    clients = [
+        Process(target=smc_independent_client, args=(name, value, session_id, queue))
+        for name, value in (("Alice", 3), ("Bob", 14))
+    ]
+
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    results = [queue.get()[1] for _ in clients]
+
+    assert results == [3 * 14 + 3] * 2
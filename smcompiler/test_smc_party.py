@@ -0,0 +1,491 @@
+"""
+Tests for reusing an SMC party across many evaluations of the same expression.
+"""
+
+from multiprocessing import Process, Queue
+
+from expression import (
+    BitDecompose,
+    Equals,
+    InnerProduct,
+    LessThan,
+    Matrix,
+    Scalar,
+    Secret,
+    maximum,
+)
+from fixed_point import Fixed
+from protocol import ProtocolSpec
+from secret_sharing import Share
+from triplet_store import TripletStore
+
+from smc_party import SMCParty
+
+# the port of the servers of the tests with a triplet store, which run beside the one of the module
+STORE_PORT = 5001
+
+
+def smc_client(client_id, prot, inputs, session_id, queue, port=5000):
+    cli = SMCParty(
+        client_id,
+        "localhost",
+        port,
+        protocol_spec=prot,
+        value_dict={},
+        session_id=session_id,
+    )
+    cli.prefetch(len(inputs) - 1)
+    results = [cli.evaluate(value_dict) for value_dict in inputs]
+    queue.put(results)
+    print(f"{client_id} has finished!")
+
+
+def smc_stream_client(client_id, prot, inputs, session_id, queue):
+    cli = SMCParty(
+        client_id,
+        "localhost",
+        5000,
+        protocol_spec=prot,
+        value_dict={},
+        session_id=session_id,
+    )
+    results = list(cli.evaluate_stream(iter(inputs), window=3))
+    queue.put(results)
+    print(f"{client_id} has finished!")
+
+
+def smc_window_client(client_id, prot, inputs, window, session_id, queue):
+    cli = SMCParty(
+        client_id,
+        "localhost",
+        5000,
+        protocol_spec=prot,
+        value_dict={},
+        session_id=session_id,
+    )
+    results = list(cli.evaluate_stream(iter(inputs), window=window))
+    queue.put(results)
+    print(f"{client_id} has finished!")
+
+
+def smc_batch_client(client_id, prot, inputs, session_id, queue):
+    cli = SMCParty(
+        client_id,
+        "localhost",
+        5000,
+        protocol_spec=prot,
+        value_dict={},
+        session_id=session_id,
+    )
+    queue.put(cli.evaluate_batch(inputs))
+    print(f"{client_id} has finished!")
+
+
+def run_processes(session_id, *client_args, target=smc_client, **kwargs):
+    """Runs the clients in a session of the server, and returns their results."""
+    queue = Queue()
+    clients = [
+        Process(target=target, args=(*args, session_id, queue), kwargs=kwargs)
+        for args in client_args
+    ]
+
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    return [queue.get() for _ in clients]
+
+
+def test_repeated_evaluations(new_session):
+    """
+    f(a, b, c) = (a + b) * c - K, evaluated on a stream of inputs by the same parties.
+    """
+    alice_secret = Secret()
+    bob_secret = Secret()
+    charlie_secret = Secret()
+    expr = (alice_secret + bob_secret) * charlie_secret - Scalar(4)
+
+    values = [(3, 14, 2), (0, 1, 5), (7, 7, 7)]
+    participants = ["Alice", "Bob", "Charlie"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        (name, prot, [{secret: vals[index]} for vals in values])
+        for index, (name, secret) in enumerate(
+            zip(participants, (alice_secret, bob_secret, charlie_secret))
+        )
+    ]
+
+    results = run_processes(new_session(participants), *clients)
+
+    expected = [(a + b) * c - 4 for a, b, c in values]
+    for result in results:
+        assert result == expected
+
+
+def test_streaming_evaluations(new_session):
+    """
+    f(a, b) = a * b + a, evaluated with several runs in flight at once.
+    """
+    alice_secret = Secret()
+    bob_secret = Secret()
+    expr = alice_secret * bob_secret + alice_secret
+
+    values = [(i, i + 3) for i in range(7)]
+    participants = ["Alice", "Bob"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        ("Alice", prot, [{alice_secret: a} for a, _ in values]),
+        ("Bob", prot, [{bob_secret: b} for _, b in values]),
+    ]
+
+    results = run_processes(
+        new_session(participants), *clients, target=smc_stream_client
+    )
+
+    expected = [a * b + a for a, b in values]
+    for result in results:
+        assert result == expected
+
+
+def test_inner_product(new_session):
+    """
+    f(a, b) = <a, b> * a_0 + K where Alice holds the vector a and Bob the vector b.
+    """
+    xs = [Secret() for _ in range(4)]
+    ys = [Secret() for _ in range(4)]
+    expr = InnerProduct(xs, ys) * xs[0] + Scalar(7)
+
+    a = [3, 1, 4, 1]
+    b = [5, 9, 2, 6]
+    participants = ["Alice", "Bob"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        ("Alice", prot, [dict(zip(xs, a))]),
+        ("Bob", prot, [dict(zip(ys, b))]),
+    ]
+
+    results = run_processes(new_session(participants), *clients)
+
+    expected = sum(x * y for x, y in zip(a, b)) * a[0] + 7
+    for result in results:
+        assert result == [expected]
+
+
+def test_input_owners(new_session):
+    """
+    f(a, b, c) = a * b + c where Alice owns a and b, Charlie c and Bob no secret: Bob sends no
+    input shares and nobody waits for his.
+    """
+    a = Secret()
+    b = Secret()
+    c = Secret()
+    expr = a * b + c
+
+    values = [(2, 3, 4), (5, 6, 7)]
+    participants = ["Alice", "Bob", "Charlie"]
+    prot = ProtocolSpec(
+        expr=expr,
+        participant_ids=participants,
+        input_owners={a: "Alice", b: "Alice", c: "Charlie"},
+    )
+    clients = [
+        ("Alice", prot, [{a: x, b: y} for x, y, _ in values]),
+        ("Bob", prot, [{} for _ in values]),
+        ("Charlie", prot, [{c: z} for _, _, z in values]),
+    ]
+
+    results = run_processes(new_session(participants), *clients)
+
+    expected = [x * y + z for x, y, z in values]
+    for result in results:
+        assert result == expected
+
+
+def test_secrets_outside_the_expression(new_session):
+    """
+    f(a) = a + K: Bob gives the value of a secret the expression does not use, which is ignored.
+    """
+    a = Secret()
+    unused = Secret()
+    expr = a + Scalar(5)
+
+    participants = ["Alice", "Bob"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [("Alice", prot, [{a: 3}]), ("Bob", prot, [{unused: 8}])]
+
+    results = run_processes(new_session(participants), *clients)
+
+    for result in results:
+        assert result == [3 + 5]
+
+
+def test_matrix_product(new_session):
+    """
+    A linear model: Alice holds the weights W, Bob the features X and Charlie a bias, and the
+    parties compute the sum of the scores (W.X)[i][0] + bias.
+    """
+    weights = Matrix.secrets(3, 2)
+    features = Matrix.secrets(2, 1)
+    bias = Secret()
+    scores = weights @ features
+    expr = scores[0][0] + scores[1][0] * Scalar(2) + scores[2][0] + bias
+
+    w = [[1, 2], [3, 4], [5, 6]]
+    x = [[7], [8]]
+    participants = ["Alice", "Bob", "Charlie"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        ("Alice", prot, [weights.assign(w)]),
+        ("Bob", prot, [features.assign(x)]),
+        ("Charlie", prot, [{bias: 10}]),
+    ]
+
+    results = run_processes(new_session(participants), *clients)
+
+    s = [sum(wi * xi[0] for wi, xi in zip(row, x)) for row in w]
+    expected = s[0] + 2 * s[1] + s[2] + 10
+    for result in results:
+        assert result == [expected]
+
+
+def test_squares(new_session):
+    """
+    f(a, b) = a^2 + (a + b) * (b + a) - a * b, where both first products are squares.
+    """
+    alice_secret = Secret()
+    bob_secret = Secret()
+    expr = (
+        alice_secret * alice_secret
+        + (alice_secret + bob_secret) * (bob_secret + alice_secret)
+        - alice_secret * bob_secret
+    )
+
+    participants = ["Alice", "Bob", "Charlie"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        ("Alice", prot, [{alice_secret: 12}]),
+        ("Bob", prot, [{bob_secret: 5}]),
+        ("Charlie", prot, [{}]),
+    ]
+
+    results = run_processes(new_session(participants), *clients)
+
+    for result in results:
+        assert result == [12 * 12 + 17 * 17 - 12 * 5]
+
+
+def test_power(new_session):
+    """
+    f(a, b) = (a + b)^5 + a^2 + 3.
+    """
+    alice_secret = Secret()
+    bob_secret = Secret()
+    expr = (alice_secret + bob_secret) ** 5 + alice_secret**2 + Scalar(3)
+
+    participants = ["Alice", "Bob"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        ("Alice", prot, [{alice_secret: 4}]),
+        ("Bob", prot, [{bob_secret: 3}]),
+    ]
+
+    results = run_processes(new_session(participants), *clients)
+
+    for result in results:
+        assert result == [7**5 + 4**2 + 3]
+
+
+def test_comparisons(new_session):
+    """
+    The maximum of three bids, whether the first bid is above a threshold, whether the two last
+    are equal and the parity of the second, on a few inputs.
+    """
+    bids = [Secret() for _ in range(3)]
+    highest = maximum(maximum(bids[0], bids[1]), bids[2])
+    above = LessThan(Scalar(100), bids[0])
+    same = Equals(bids[1], bids[2])
+    parity = BitDecompose(bids[1], 1).bits[0]
+    expr = (
+        highest + above * Scalar(1000) + same * Scalar(10000) + parity * Scalar(100000)
+    )
+
+    values = [(120, 45, 45), (7, 300, 299), (100, 3, 90)]
+    participants = ["Alice", "Bob", "Charlie"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        (name, prot, [{secret: vals[index]} for vals in values])
+        for index, (name, secret) in enumerate(zip(participants, bids))
+    ]
+
+    results = run_processes(new_session(participants), *clients)
+
+    expected = [
+        max(a, b, c) + 1000 * (a > 100) + 10000 * (b == c) + 100000 * (b % 2)
+        for a, b, c in values
+    ]
+    for result in results:
+        assert result == expected
+
+
+def test_fixed_point(new_session):
+    """
+    A deep fixed-point computation: the compound interest of a secret amount at a secret rate,
+    over 8 years, minus fees.
+    """
+    amount = Fixed.secret()
+    rate = Fixed.secret()
+    total = amount
+    for _ in range(8):
+        total = total * (rate + 1)
+    expr = (total - 12.5).expr
+
+    participants = ["Alice", "Bob"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        ("Alice", prot, [{amount.expr: 1520.75}]),
+        ("Bob", prot, [{rate.expr: 0.035}]),
+    ]
+
+    results = run_processes(new_session(participants), *clients)
+
+    # the rate is rounded to 12 fractional bits, then each truncation may add 2^-12
+    encoded_rate = round(0.035 * 4096) / 4096
+    expected = 1520.75 * (1 + encoded_rate) ** 8 - 12.5
+    for (result,) in results:
+        assert abs(total.decode(result) - expected) < 0.1
+
+
+def test_shamir_sharing(new_session):
+    """
+    f(a, b, c, d) = (a + b) * c - K + [d < b], with (1, 4) Shamir sharing: any two parties
+    reconstruct the openings.
+    """
+    secrets = [Secret() for _ in range(4)]
+    a, b, c, d = secrets
+    expr = (a + b) * c - Scalar(4) + LessThan(d, b) * Scalar(100)
+
+    values = [(3, 14, 2, 9), (0, 1, 5, 20)]
+    participants = ["Alice", "Bob", "Charlie", "David"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants, threshold=1)
+    clients = [
+        (name, prot, [{secret: vals[index]} for vals in values])
+        for index, (name, secret) in enumerate(zip(participants, secrets))
+    ]
+
+    results = run_processes(new_session(participants, threshold=1), *clients)
+
+    expected = [(a + b) * c - 4 + 100 * (d < b) for a, b, c, d in values]
+    for result in results:
+        assert result == expected
+
+
+def test_packed_batch(new_session):
+    """
+    f(a, b, c) = 3 a + b - c + K on 10 records, packed 2 by 2 in (1, 3) Shamir shares.
+    """
+    secrets = [Secret() for _ in range(3)]
+    a, b, c = secrets
+    expr = Scalar(3) * a + b - c + Scalar(5)
+
+    values = [(i, 2 * i + 1, i * i) for i in range(10)]
+    participants = ["Alice", "Bob", "Charlie"]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants, threshold=1, packing=2)
+    clients = [
+        (name, prot, [{secret: vals[index]} for vals in values])
+        for index, (name, secret) in enumerate(zip(participants, secrets))
+    ]
+
+    results = run_processes(
+        new_session(participants, threshold=1), *clients, target=smc_batch_client
+    )
+
+    expected = [(3 * a + b - c + 5) % Share.FIELD_Q for a, b, c in values]
+    for result in results:
+        assert result == expected
+
+
+def test_dealer_free(new_session):
+    """
+    f(a, b, c) = (a + b) * c + a^2 - K with (1, 3) Shamir sharing, the parties generating the
+    material of the products themselves.
+    """
+    secrets = [Secret() for _ in range(3)]
+    a, b, c = secrets
+    expr = (a + b) * c + a * a - Scalar(4)
+
+    values = [(3, 14, 2), (0, 1, 5), (7, 7, 7)]
+    participants = ["Alice", "Bob", "Charlie"]
+    prot = ProtocolSpec(
+        expr=expr, participant_ids=participants, threshold=1, dealer_free=True
+    )
+    clients = [
+        (name, prot, [{secret: vals[index]} for vals in values])
+        for index, (name, secret) in enumerate(zip(participants, secrets))
+    ]
+
+    results = run_processes(new_session(participants, threshold=1), *clients)
+
+    expected = [(a + b) * c + a * a - 4 for a, b, c in values]
+    for result in results:
+        assert result == expected
+
+
+def test_dealer_free_stream(new_session):
+    """
+    f(a, b, c) = a * b + c with (1, 3) Shamir sharing and no dealer, evaluated on a stream by
+    parties keeping different numbers of runs in flight.
+    """
+    secrets = [Secret() for _ in range(3)]
+    a, b, c = secrets
+    expr = a * b + c
+
+    values = [(i, i + 2, 3 * i) for i in range(6)]
+    participants = ["Alice", "Bob", "Charlie"]
+    prot = ProtocolSpec(
+        expr=expr, participant_ids=participants, threshold=1, dealer_free=True
+    )
+    clients = [
+        (name, prot, [{secret: vals[index]} for vals in values], window)
+        for index, (name, secret, window) in enumerate(
+            zip(participants, secrets, (1, 2, 4))
+        )
+    ]
+
+    results = run_processes(
+        new_session(participants, threshold=1), *clients, target=smc_window_client
+    )
+
+    expected = [x * y + z for x, y, z in values]
+    for result in results:
+        assert result == expected
+
+
+def test_triplet_store(tmp_path, dedicated_server):
+    """
+    f(a, b, c) = a * b * c - K, with the Beaver triplets served from a triplet store.
+    """
+    secrets = [Secret() for _ in range(3)]
+    a, b, c = secrets
+    expr = a * b * c - Scalar(4)
+
+    participants = ["Alice", "Bob", "Charlie"]
+    path = str(tmp_path / "triplets.bin")
+    TripletStore.create(path, len(participants), 10).close()
+    values = [(3, 14, 2), (0, 1, 5)]
+    prot = ProtocolSpec(expr=expr, participant_ids=participants)
+    clients = [
+        (name, prot, [{secret: vals[index]} for vals in values])
+        for index, (name, secret) in enumerate(zip(participants, secrets))
+    ]
+
+    # the triplet store serves the default session of a server started with it
+    dedicated_server(STORE_PORT, participants, triplet_store=path)
+    results = run_processes(None, *clients, port=STORE_PORT)
+
+    expected = [(a * b * c - 4) % Share.FIELD_Q for a, b, c in values]
+    for result in results:
+        assert result == expected
+    # two products per run
+    store = TripletStore(path)
+    assert store.remaining() == 6
+    store.close()
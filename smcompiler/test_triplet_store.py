@@ -0,0 +1,180 @@
+"""
+Unit tests for the disk-backed triplet store.
+"""
+
+import pytest
+
+from randomness import SeededRandomSource, get_source, set_source
+from secret_sharing import AdditiveSharing, NTTShamirSharing, ShamirSharing, Share
+from triplet_store import CHUNK, TripletStore, generate, write_chunk
+from server import run
+from ttp import StoredTriplet, TrustedParamGenerator
+
+
+def check_triplets(shares):
+    """Checks that the shares of the parties, by party, add up to triplets."""
+    for triplets in zip(*shares):
+        a, b, c = (sum(column) % Share.FIELD_Q for column in zip(*triplets))
+        assert a * b % Share.FIELD_Q == c
+
+
+def test_store(tmp_path):
+    path = str(tmp_path / "triplets.bin")
+    store = TripletStore.create(path, 3, 5000)
+    assert store.report() == {
+        "triplets": 5000,
+        "allocated": 0,
+        "party0": 5000,
+        "party1": 5000,
+        "party2": 5000,
+    }
+    check_triplets([store.take(party, 10) for party in range(3)])
+    assert store.remaining(0) == 4990
+    # the triplets straddling the chunks generated at once are consistent too
+    check_triplets([store.take(party, 4990) for party in range(3)])
+    with pytest.raises(ValueError):
+        store.take(0, 1)
+
+    assert store.allocate() == 0
+    assert store.allocate() == 1
+    store.close()
+
+    # the cursors survive closing the store
+    store = TripletStore(path)
+    assert store.remaining() == 4998
+    assert store.remaining(1) == 0
+    store.close()
+
+
+def test_parallel_generation(tmp_path):
+    path = str(tmp_path / "triplets.bin")
+    count = 2 * CHUNK + 100
+    report = generate(path, 3, count, workers=2)
+    assert report["triplets"] == count
+    assert report["workers"] == 2
+    assert report["triplets_per_second"] > 0
+    assert report["triplets_per_second_per_core"] <= report["triplets_per_second"]
+
+    # the chunks of every worker are in place
+    store = TripletStore(path)
+    check_triplets([store.take(party, count) for party in range(3)])
+    store.close()
+
+
+def test_seeded_generation(tmp_path):
+    source = get_source()
+    set_source(SeededRandomSource(bytes(32)))
+    try:
+        generate(str(tmp_path / "triplets.bin"), 2, 2 * CHUNK, workers=2)
+        # the workers inherit the seeded source, but each chunk has its own stream
+        store = TripletStore(str(tmp_path / "triplets.bin"))
+        shares = [store.shares(party, 0, 2 * CHUNK) for party in range(2)]
+        assert shares[0][: 3 * CHUNK] != shares[0][3 * CHUNK :]
+        check_triplets([store.take(party, 2 * CHUNK) for party in range(2)])
+
+        # the same seed gives the same store, whatever the number of workers
+        set_source(SeededRandomSource(bytes(32)))
+        generate(str(tmp_path / "other.bin"), 2, 2 * CHUNK, workers=1)
+        other = TripletStore(str(tmp_path / "other.bin"))
+        assert [other.shares(party, 0, 2 * CHUNK) for party in range(2)] == shares
+    finally:
+        set_source(source)
+
+
+class ObservedSharing(AdditiveSharing):
+    """Additive sharing recording the source of randomness of the process whenever it shares."""
+
+    def __init__(self):
+        self.sources = []
+
+    def share(self, secrets, num_shares, source=None):
+        self.sources.append(get_source())
+        return super().share(secrets, num_shares, source)
+
+
+def test_chunk_source(tmp_path):
+    path = str(tmp_path / "triplets.bin")
+    TripletStore.create(path, 2, 10).close()
+    scheme = ObservedSharing()
+    # a chunk of a seeded generation draws from its own stream, leaving the source of the
+    # process to the other threads
+    write_chunk(path, 2, 10, 0, 10, scheme, bytes(32))
+    assert scheme.sources == [get_source()]
+    store = TripletStore(path)
+    check_triplets([store.take(party, 10) for party in range(2)])
+    store.close()
+
+
+def test_export(tmp_path):
+    store = TripletStore.create(str(tmp_path / "triplets.bin"), 2, 100)
+    exports = [
+        store.export(party, str(tmp_path / f"party{party}.bin")) for party in range(2)
+    ]
+    assert all(export.num_parties == 1 for export in exports)
+    assert exports[1].shares(0, 0, 100) == store.shares(1, 0, 100)
+    check_triplets([export.take(0, 30) for export in exports])
+
+
+def test_shamir_store(tmp_path):
+    scheme = ShamirSharing(1)
+    store = TripletStore.create(str(tmp_path / "triplets.bin"), 3, 10, scheme)
+    shares = {party: store.shares(party, 0, 10) for party in (0, 2)}
+    values = scheme.reconstruct(shares)
+    for a, b, c in zip(values[::3], values[1::3], values[2::3]):
+        assert a * b % Share.FIELD_Q == c
+
+
+def test_ttp_store(tmp_path):
+    store = TripletStore.create(str(tmp_path / "triplets.bin"), 3, 10)
+    ttp = TrustedParamGenerator(store=store)
+    for participant in ("0", "1", "2"):
+        ttp.add_participant(participant)
+
+    shares = [
+        [ttp.retrieve_share(participant, op) for op in ("mul0", "mul1")]
+        for participant in ("0", "1", "2")
+    ]
+    check_triplets(
+        [[[share.bn for share in triplet] for triplet in party] for party in shares]
+    )
+    assert isinstance(ttp.operation_triplets["mul0"], StoredTriplet)
+    assert store.remaining() == 8
+    # the other kinds of material are still generated
+    assert len(ttp.retrieve_preprocessing("0", "square0", "square")) == 2
+
+
+def test_store_scheme(tmp_path):
+    store = TripletStore.create(str(tmp_path / "triplets.bin"), 3, 10, ShamirSharing(1))
+    assert (store.scheme, store.threshold) == (1, 1)
+    store.check(ShamirSharing(1), 3)
+    for scheme, num_parties in [
+        (AdditiveSharing(), 3),
+        (ShamirSharing(2), 3),
+        (NTTShamirSharing(1, 3), 3),
+        (ShamirSharing(1), 4),
+    ]:
+        with pytest.raises(ValueError):
+            store.check(scheme, num_parties)
+    # the exports of the parties keep the scheme of their triplets
+    export = store.export(2, str(tmp_path / "party2.bin"))
+    assert (export.scheme, export.threshold) == (1, 1)
+
+    # a trusted third party only serves triplets of its scheme, to as many parties
+    with pytest.raises(ValueError):
+        TrustedParamGenerator(AdditiveSharing(), store)
+    ttp = TrustedParamGenerator(ShamirSharing(1), store)
+    for participant in ("0", "1"):
+        ttp.add_participant(participant)
+    with pytest.raises(ValueError):
+        ttp.retrieve_share("0", "mul0")
+
+
+def test_server_store(tmp_path):
+    path = str(tmp_path / "triplets.bin")
+    TripletStore.create(path, 3, 10).close()
+    # additive shares would give wrong products to a Shamir session, as would the triplets of
+    # other parties
+    with pytest.raises(ValueError):
+        run("localhost", 5000, ["Alice", "Bob", "Charlie"], 1, path)
+    with pytest.raises(ValueError):
+        run("localhost", 5000, ["Alice", "Bob"], None, path)
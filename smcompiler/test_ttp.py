@@ -5,8 +5,14 @@ Testing ttp is not obligatory.
 MODIFY THIS FILE.
 """
 
-from ttp import TrustedParamGenerator, BeaverTriplet
-from secret_sharing import Share
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ttp import TrustedParamGenerator, BeaverTriplet, InnerProductTriplet, MatrixTriplet, RandomBits, SolvedBits, SquarePair
+from secret_sharing import Share, ShamirSharing
+from triplet_store import TripletStore
 
 
 def test_nump():
@@ -37,7 +43,7 @@ def test_participants():
 def test_beaver():
     triplet = BeaverTriplet(3)
 
-    assert triplet.a * triplet.b == triplet.c 
+    assert triplet.a * triplet.b % Share.FIELD_Q == triplet.c
     assert Share(triplet.a) * Share(triplet.b) == Share(triplet.c)
 
     a_1, b_1, c_1 = triplet.get_shares(0)
@@ -73,5 +79,205 @@ def test_retrieveshare():
     assert s0_0 != s1_0 
 
 
+def test_inner_product_triplet():
+    triplet = InnerProductTriplet(3, 4)
+    assert Share(triplet.c[0]) == sum(
+        (Share(a) * Share(b) for a, b in zip(triplet.a, triplet.b)), Share(0)
+    )
+
+    shares = [triplet.get_shares(i) for i in range(3)]
+    assert all(len(party) == 9 for party in shares)
+    values = [sum(column, Share(0)).bn for column in zip(*shares)]
+    assert values == triplet.a + triplet.b + triplet.c
+
+
+def test_retrieve_preprocessing():
+    ttp = TrustedParamGenerator()
+    ttp.add_participant('0')
+    ttp.add_participant('1')
+
+    s0 = ttp.retrieve_preprocessing('0', 'inner0', 'inner', [2])
+    s1 = ttp.retrieve_preprocessing('1', 'inner0', 'inner', [2])
+    assert len(s0) == len(s1) == 5
+    assert s0 == ttp.retrieve_preprocessing('0', 'inner0', 'inner', [2])
+    assert len(ttp.retrieve_preprocessing('0', 'mul0', 'triplet')) == 3
+    assert len(ttp.retrieve_preprocessing('0', 'mat0', 'matrix', [2, 3, 4])) == 6 + 12 + 8
+
+
+def test_matrix_triplet():
+    triplet = MatrixTriplet(2, 2, 3, 2)
+    a, b, c = triplet.a, triplet.b, triplet.c
+    for i in range(2):
+        for j in range(2):
+            expected = sum(a[3 * i + k] * b[2 * k + j] for k in range(3))
+            assert c[2 * i + j] == expected % Share.FIELD_Q
+
+    shares = [triplet.get_shares(i) for i in range(2)]
+    values = [sum(column, Share(0)).bn for column in zip(*shares)]
+    assert values == a + b + c
+
+
+def test_square_pair():
+    pair = SquarePair(3)
+    assert Share(pair.a) * Share(pair.a) == Share(pair.a_square)
+
+    shares = [pair.get_shares(i) for i in range(3)]
+    assert all(len(party) == 2 for party in shares)
+    a, a_square = (sum(column, Share(0)) for column in zip(*shares))
+    assert a * a == a_square
+
+
+def test_random_bits():
+    bits = RandomBits(3, 40)
+    assert set(bits.bits) <= {0, 1}
+    shares = [bits.get_shares(i) for i in range(3)]
+    assert [sum(column, Share(0)).bn for column in zip(*shares)] == bits.bits
+
+
+def test_solved_bits():
+    nb_bits = Share.FIELD_Q.bit_length()
+    solved = SolvedBits(2, nb_bits, 5)
+    assert sum(bit << i for i, bit in enumerate(solved.bits)) == solved.r
+    assert all(a * b % Share.FIELD_Q == c for a, b, c in solved.triplets)
+
+    shares = [solved.get_shares(i) for i in range(2)]
+    assert all(len(party) == 1 + nb_bits + 3 * 5 for party in shares)
+    values = [sum(column, Share(0)).bn for column in zip(*shares)]
+    assert values[0] == solved.r
+    assert values[1 : 1 + nb_bits] == solved.bits
+
+
+def test_shamir_preprocessing():
+    scheme = ShamirSharing(1)
+    ttp = TrustedParamGenerator(scheme)
+    for participant in ('0', '1', '2'):
+        ttp.add_participant(participant)
+
+    shares = {i: ttp.retrieve_preprocessing(str(i), 'mul0', 'triplet') for i in range(3)}
+    # any two parties reconstruct the triplet
+    for parties in ((0, 1), (1, 2), (2, 0)):
+        a, b, c = scheme.reconstruct({i: [share.bn for share in shares[i]] for i in parties})
+        assert a * b % Share.FIELD_Q == c
+
+    triplet = MatrixTriplet(3, 2, 2, 2, scheme)
+    values = scheme.reconstruct({i: [share.bn for share in triplet.get_shares(i)] for i in (0, 2)})
+    assert values == triplet.a + triplet.b + triplet.c
+
+
+class CountingParamGenerator(TrustedParamGenerator):
+    """Counts the material it generates, slowly, so that concurrent requests overlap."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.generated = []
+        self.generated_lock = threading.Lock()
+
+    def generate(self, kind, shape):
+        time.sleep(0.001)
+        material = super().generate(kind, shape)
+        with self.generated_lock:
+            self.generated.append(material)
+        return material
+
+
+def request_concurrently(ttp, participants, op_ids, kind='triplet', nb_threads=16):
+    """Every participant requests the material of every operation, all at once in random orders."""
+    requests = [(participant, op_id) for participant in participants for op_id in op_ids]
+    random.shuffle(requests)
+    barrier = threading.Barrier(nb_threads)
+
+    def worker(index):
+        barrier.wait()
+        return [
+            (participant, op_id, ttp.retrieve_preprocessing(participant, op_id, kind))
+            for participant, op_id in requests[index::nb_threads]
+        ]
+
+    with ThreadPoolExecutor(max_workers=nb_threads) as executor:
+        results = [result for chunk in executor.map(worker, range(nb_threads)) for result in chunk]
+    shares = {op_id: {} for op_id in op_ids}
+    for participant, op_id, material in results:
+        shares[op_id][int(participant)] = [share.bn for share in material]
+    return shares
+
+
+def test_concurrent_requests():
+    participants = ('0', '1', '2')
+    ttp = CountingParamGenerator()
+    for participant in participants:
+        ttp.add_participant(participant)
+
+    op_ids = [f'mul{i}' for i in range(200)]
+    shares = request_concurrently(ttp, participants, op_ids)
+
+    # exactly one triplet per operation, whose shares all the parties got
+    assert len(ttp.generated) == len(op_ids)
+    assert not ttp.pending
+    for op_id in op_ids:
+        a, b, c = [sum(column) % Share.FIELD_Q for column in zip(*shares[op_id].values())]
+        assert a * b % Share.FIELD_Q == c
+
+
+def test_concurrent_store_requests(tmp_path):
+    participants = ('0', '1', '2')
+    store = TripletStore.create(str(tmp_path / 'triplets.bin'), 3, 300)
+    ttp = CountingParamGenerator(store=store)
+    for participant in participants:
+        ttp.add_participant(participant)
+
+    op_ids = [f'mul{i}' for i in range(200)]
+    shares = request_concurrently(ttp, participants, op_ids)
+
+    # every operation was allocated its own triplet of the store
+    assert store.cursor() == len(op_ids)
+    assert len({ttp.operation_triplets[op_id].index for op_id in op_ids}) == len(op_ids)
+    for op_id in op_ids:
+        a, b, c = [sum(column) % Share.FIELD_Q for column in zip(*shares[op_id].values())]
+        assert a * b % Share.FIELD_Q == c
+
+
+def test_failed_generation():
+    ttp = TrustedParamGenerator()
+    ttp.add_participant('0')
+    for kind, shape in [('unknown', ()), ('triplet', (1,)), ('inner', (-1,)), ('matrix', (1 << 10, 1 << 10, 1))]:
+        try:
+            ttp.retrieve_preprocessing('0', 'op0', kind, shape)
+        except ValueError:
+            pass
+        else:
+            assert False, f'{kind} material of shape {shape} should not be generated'
+    # nothing is left pending, and the operation can still get its material
+    assert not ttp.pending
+    assert len(ttp.retrieve_preprocessing('0', 'op0', 'triplet')) == 3
+
+
+def test_party_order():
+    ttp = TrustedParamGenerator(ShamirSharing(1))
+    for participant in ('Alice', 'Bob', 'Charlie'):
+        ttp.add_participant(participant)
+    ttp.check_party('Bob', 1)
+    # a party of a protocol listing the participants in another order, or unknown
+    for client_id, party in (('Bob', 0), ('Charlie', 1), ('Eve', 0)):
+        try:
+            ttp.check_party(client_id, party)
+        except ValueError:
+            pass
+        else:
+            assert False, f'{client_id} is not participant {party}'
 
 
+def test_threshold():
+    TrustedParamGenerator(ShamirSharing(1)).check_threshold(1)
+    TrustedParamGenerator().check_threshold(None)
+    # Shamir shares of a protocol sharing additively, or with another threshold, and conversely
+    for ttp, threshold in (
+        (TrustedParamGenerator(ShamirSharing(1)), None),
+        (TrustedParamGenerator(ShamirSharing(1)), 2),
+        (TrustedParamGenerator(), 1),
+    ):
+        try:
+            ttp.check_threshold(threshold)
+        except ValueError:
+            pass
+        else:
+            assert False, f'the threshold {threshold} is not the one of the session'
@@ -0,0 +1,324 @@
+"""
+Disk-backed store of Beaver triplets, generated ahead of time and read through mmap.
+
+The file starts with a header: a magic number, the width in bytes of the field elements, the
+number of parties and of triplets, the sharing scheme and its threshold, then the cursors of the
+store, and each party's shares follow
+in a contiguous region, one triplet (a, b, c) after the other, as little-endian fixed-width
+integers. Reading the shares of a triplet only maps the pages holding them, so stores much larger
+than the memory can be served, and as the cursors live in the file, a restarted server or party
+goes on where it stopped instead of reusing triplets.
+
+A store is consumed either by a trusted third party, which allocates each triplet to an
+operation and serves its shares to every party, or by the parties themselves: each one is given
+the export of its own region, a store of a single party, and reads it sequentially.
+"""
+
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from randomness import RandomSource, SeededRandomSource, get_source
+from secret_sharing import (
+    AdditiveSharing,
+    NTTShamirSharing,
+    ShamirSharing,
+    Share,
+    SharingScheme,
+    random_field_elements,
+)
+
+MAGIC = b"SMCTRIP2"
+# magic, element width, number of parties, number of triplets, sharing scheme, threshold,
+# allocation cursor
+HEADER = struct.Struct("<8sQQQQQQ")
+CURSOR = struct.Struct("<Q")
+# Number of triplets generated and written at once when creating a store.
+CHUNK = 4096
+# 64 bits elements can then be read in place as machine integers.
+LITTLE_ENDIAN = sys.byteorder == "little"
+# The code of each sharing scheme a store may hold triplets of, in its header.
+SCHEMES: Dict[type, int] = {AdditiveSharing: 0, ShamirSharing: 1, NTTShamirSharing: 2}
+
+
+def element_width() -> int:
+    """The number of bytes of an element of the field."""
+    return (Share.FIELD_Q.bit_length() + 7) // 8
+
+
+def scheme_header(scheme: SharingScheme) -> Tuple[int, int]:
+    """The code and the threshold of a sharing scheme, as written in the header of a store."""
+    if type(scheme) not in SCHEMES:
+        raise ValueError(
+            f"A triplet store cannot hold triplets of {type(scheme).__name__}"
+        )
+    return SCHEMES[type(scheme)], getattr(scheme, "threshold", 0)
+
+
+class TripletStore:
+    """
+    A file of Beaver triplets shared among a number of parties.
+
+    Attributes:
+        path: path of the file
+        num_parties: number of parties the triplets are shared among
+        count: number of triplets of the store
+        width: number of bytes of a field element
+        scheme: code of the sharing scheme of the triplets, in SCHEMES
+        threshold: threshold of the sharing scheme, 0 for additive sharing
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        (
+            magic,
+            self.width,
+            self.num_parties,
+            self.count,
+            self.scheme,
+            self.threshold,
+            _,
+        ) = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a triplet store")
+        if self.width != element_width():
+            raise ValueError(
+                f"{path} holds {self.width} bytes elements, the field needs {element_width()}"
+            )
+        self.triplet_size = 3 * self.width
+        self.data_offset = HEADER.size + self.num_parties * CURSOR.size
+        # guards the cursors, which concurrent requests of a server move
+        self.lock = threading.Lock()
+
+    @classmethod
+    def create(
+        cls,
+        path: str,
+        num_parties: int,
+        count: int,
+        scheme: SharingScheme = AdditiveSharing(),
+        workers: int = 1,
+    ) -> "TripletStore":
+        """Generates count triplets shared among num_parties with the scheme into a new file."""
+        generate(path, num_parties, count, scheme, workers)
+        return cls(path)
+
+    def check(self, scheme: SharingScheme, num_parties: Optional[int] = None) -> None:
+        """
+        Raises a ValueError unless the triplets are shared with the scheme, and among num_parties
+        if given: the shares of other triplets would silently give wrong products.
+        """
+        if scheme_header(scheme) != (self.scheme, self.threshold):
+            raise ValueError(
+                f"{self.path} holds triplets of another sharing scheme or threshold"
+            )
+        if num_parties is not None and num_parties != self.num_parties:
+            raise ValueError(
+                f"{self.path} holds triplets for {self.num_parties} parties, not {num_parties}"
+            )
+
+    def close(self) -> None:
+        """Flushes the cursors and releases the mapping."""
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+    def cursor_offset(self, party: Optional[int]) -> int:
+        """The offset of the allocation cursor, or of the consumption cursor of a party."""
+        if party is None:
+            return HEADER.size - CURSOR.size
+        return HEADER.size + party * CURSOR.size
+
+    def cursor(self, party: Optional[int] = None) -> int:
+        """The number of triplets allocated, or consumed by the given party."""
+        return CURSOR.unpack_from(self.map, self.cursor_offset(party))[0]
+
+    def advance(self, count: int, party: Optional[int] = None) -> int:
+        """Moves a cursor count triplets forward and returns where it was."""
+        with self.lock:
+            position = self.cursor(party)
+            if position + count > self.count:
+                raise ValueError(
+                    f"Only {self.count - position} triplets are left in {self.path}"
+                )
+            CURSOR.pack_into(self.map, self.cursor_offset(party), position + count)
+            return position
+
+    def remaining(self, party: Optional[int] = None) -> int:
+        """The number of triplets left to allocate, or for the given party to consume."""
+        return self.count - self.cursor(party)
+
+    def report(self) -> Dict[str, int]:
+        """How much material the store holds and has left, for the allocation and each party."""
+        report = {"triplets": self.count, "allocated": self.cursor()}
+        for party in range(self.num_parties):
+            report[f"party{party}"] = self.remaining(party)
+        return report
+
+    def allocate(self) -> int:
+        """Claims the next triplet, for a trusted third party serving its shares to every party."""
+        return self.advance(1)
+
+    def shares(self, party: int, index: int, count: int = 1) -> List[int]:
+        """The shares of a party of count triplets from the index, a, b and c of each in turn."""
+        start = self.data_offset + (party * self.count + index) * self.triplet_size
+        width = self.width
+        with memoryview(self.map) as view:
+            region = view[start : start + count * self.triplet_size]
+            if width == 8 and LITTLE_ENDIAN:
+                values = region.cast("Q").tolist()
+            else:
+                values = [
+                    int.from_bytes(region[offset : offset + width], "little")
+                    for offset in range(0, len(region), width)
+                ]
+            region.release()
+        return values
+
+    def export(self, party: int, path: str) -> "TripletStore":
+        """Copies the region of a party into a new store holding only its shares."""
+        size = self.count * self.triplet_size
+        start = self.data_offset + party * size
+        with open(path, "wb") as file:
+            file.write(
+                HEADER.pack(
+                    MAGIC, self.width, 1, self.count, self.scheme, self.threshold, 0
+                )
+            )
+            file.write(bytes(CURSOR.size))
+            for offset in range(start, start + size, CHUNK * self.triplet_size):
+                file.write(
+                    self.map[
+                        offset : min(offset + CHUNK * self.triplet_size, start + size)
+                    ]
+                )
+        return TripletStore(path)
+
+    def take(self, party: int, count: int) -> List[Tuple[int, int, int]]:
+        """Consumes the next count triplets of a party, reading its own region sequentially."""
+        values = self.shares(party, self.advance(count, party), count)
+        return list(zip(values[::3], values[1::3], values[2::3]))
+
+
+def generate(
+    path: str,
+    num_parties: int,
+    count: int,
+    scheme: SharingScheme = AdditiveSharing(),
+    workers: Optional[int] = None,
+) -> Dict[str, float]:
+    """
+    Generates count triplets shared among num_parties with the scheme into a new store file,
+    spreading the chunks over a pool of workers processes (all the cores by default), which
+    write their shares in place. Each process draws its own randomness from the system, or if
+    the source of randomness is seeded, each chunk is generated from its own stream spawned
+    from it, so the workers never share a random stream, and the store only depends on the seed.
+    Returns the throughput of the generation.
+    """
+    workers = workers or os.cpu_count() or 1
+    width = element_width()
+    code, threshold = scheme_header(scheme)
+    start_time = time.perf_counter()
+    with open(path, "wb") as file:
+        file.write(HEADER.pack(MAGIC, width, num_parties, count, code, threshold, 0))
+        file.write(bytes(num_parties * CURSOR.size))
+        file.truncate(
+            HEADER.size + num_parties * CURSOR.size + num_parties * count * 3 * width
+        )
+    starts = range(0, count, CHUNK)
+    source = get_source()
+    seeded = isinstance(source, SeededRandomSource)
+    arguments = [
+        (
+            path,
+            num_parties,
+            count,
+            start,
+            min(CHUNK, count - start),
+            scheme,
+            source.spawn(start).seed if seeded else None,
+        )
+        for start in starts
+    ]
+    if workers == 1:
+        for args in arguments:
+            write_chunk(*args)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # consumes the results to raise the errors of the workers
+            list(executor.map(write_chunk, *zip(*arguments)))
+    seconds = time.perf_counter() - start_time
+    # workers beyond the number of cores share them
+    cores = min(workers, len(arguments), os.cpu_count() or 1) or 1
+    return {
+        "triplets": count,
+        "workers": workers,
+        "cores": cores,
+        "seconds": seconds,
+        "triplets_per_second": count / seconds,
+        "triplets_per_second_per_core": count / seconds / cores,
+    }
+
+
+def write_chunk(
+    path: str,
+    num_parties: int,
+    count: int,
+    start: int,
+    size: int,
+    scheme: SharingScheme,
+    seed: Optional[bytes] = None,
+) -> None:
+    """
+    Generates the triplets of a chunk and writes their shares in the regions of the parties,
+    drawing the randomness from a generator of the given seed if there is one.
+    """
+    width = element_width()
+    data_offset = HEADER.size + num_parties * CURSOR.size
+    source = None if seed is None else SeededRandomSource(seed)
+    rows = generate_chunk(num_parties, size, scheme, source)
+    with open(path, "r+b") as file:
+        for party, row in enumerate(rows):
+            file.seek(data_offset + (party * count + start) * 3 * width)
+            file.write(row)
+
+
+def generate_chunk(
+    num_parties: int,
+    count: int,
+    scheme: SharingScheme,
+    source: Optional[RandomSource] = None,
+) -> List[bytes]:
+    """
+    Generates count triplets and returns the encoded shares of each party, drawing the randomness
+    from the given source, or the one of the process.
+    """
+    FIELD_Q = Share.FIELD_Q
+    width = element_width()
+    randomness = random_field_elements(2 * count, source)
+    values = []
+    for a, b in zip(randomness[::2], randomness[1::2]):
+        values += [a, b, a * b % FIELD_Q]
+    return [
+        b"".join(value.to_bytes(width, "little") for value in row)
+        for row in scheme.share(values, num_parties, source)
+    ]
+
+
+if __name__ == "__main__":
+    """give the path of the store, the number of parties and of triplets, and optionally of workers"""
+    report = generate(
+        sys.argv[1],
+        int(sys.argv[2]),
+        int(sys.argv[3]),
+        workers=int(sys.argv[4]) if len(sys.argv) > 4 else None,
+    )
+    for key, value in report.items():
+        print(f"{key}: {value:.1f}" if isinstance(value, float) else f"{key}: {value}")
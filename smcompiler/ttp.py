@@ -4,34 +4,43 @@ Trusted parameters generator.
 MODIFY THIS FILE.
 """
 
-import random as rd
-import math
-
+import threading
+from concurrent.futures import Future
 from typing import (
+    Callable,
     Dict,
+    List,
+    Optional,
+    Sequence,
     Set,
     Tuple,
 )
 
 from communication import Communication
+from fixed_point import STATISTICAL_SECURITY, magnitude_bits
+from preprocessing import material_size
+from randomness import get_source
 from secret_sharing import (
-    share_secret,
+    AdditiveSharing,
+    matrix_product,
+    random_field_elements,
     Share,
+    SharingScheme,
 )
+from triplet_store import TripletStore
 
 
 class BeaverTriplet:
     """Class holding the 3 values and their associated shares for a BeaverTriplet in FIELD_Q"""
 
-    def __init__(self, num_participants):
-        self.a, self.b = rd.sample(
-            range(0, int(math.floor(math.sqrt(Share.FIELD_Q)))), 2
-        )
-        self.c = self.a * self.b
+    def __init__(self, num_participants, scheme: SharingScheme = AdditiveSharing()):
+        self.a, self.b = random_field_elements(2)
+        self.c = self.a * self.b % Share.FIELD_Q
 
-        self.a_shares = share_secret(self.a, num_participants)
-        self.b_shares = share_secret(self.b, num_participants)
-        self.c_shares = share_secret(self.c, num_participants)
+        shares = scheme.share([self.a, self.b, self.c], num_participants)
+        self.a_shares = [Share(row[0]) for row in shares]
+        self.b_shares = [Share(row[1]) for row in shares]
+        self.c_shares = [Share(row[2]) for row in shares]
 
     def get_shares(self, client_id: int) -> Tuple[Share, Share, Share]:
         return (
@@ -41,16 +50,220 @@ class BeaverTriplet:
         )
 
 
+class StoredTriplet:
+    """A Beaver triplet of a TripletStore, of which we only keep the index"""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: TripletStore):
+        self.store = store
+        self.index = store.allocate()
+
+    def get_shares(self, client_id: int) -> Tuple[Share, Share, Share]:
+        a, b, c = self.store.shares(client_id, self.index)
+        return Share(a), Share(b), Share(c)
+
+
+class SquarePair:
+    """Class holding a random value a and its square, with their shares"""
+
+    def __init__(
+        self, num_participants: int, scheme: SharingScheme = AdditiveSharing()
+    ):
+        self.a = random_field_elements(1)[0]
+        self.a_square = self.a * self.a % Share.FIELD_Q
+
+        self.shares = scheme.share([self.a, self.a_square], num_participants)
+
+    def get_shares(self, client_id: int) -> List[Share]:
+        return [Share(value) for value in self.shares[client_id]]
+
+
+class RandomBits:
+    """Class holding random bits, with their shares"""
+
+    def __init__(
+        self,
+        num_participants: int,
+        count: int,
+        scheme: SharingScheme = AdditiveSharing(),
+    ):
+        self.bits = get_source().bits(count)
+
+        self.shares = scheme.share(self.bits, num_participants)
+
+    def get_shares(self, client_id: int) -> List[Share]:
+        return [Share(value) for value in self.shares[client_id]]
+
+
+class SolvedBits:
+    """
+    Class holding a random field element r, its nb_bits bits (least significant first) and
+    nb_triplets Beaver triplets, with their shares: the material of a comparison.
+    """
+
+    def __init__(
+        self,
+        num_participants: int,
+        nb_bits: int,
+        nb_triplets: int,
+        scheme: SharingScheme = AdditiveSharing(),
+    ):
+        self.r = random_field_elements(1)[0]
+        self.bits = [(self.r >> i) & 1 for i in range(nb_bits)]
+        randomness = random_field_elements(2 * nb_triplets)
+        self.triplets = [
+            (a, b, a * b % Share.FIELD_Q)
+            for a, b in zip(randomness[::2], randomness[1::2])
+        ]
+
+        # row i holds the shares of party i of r, its bits, then a, b and c of every triplet
+        flat_triplets = [value for triplet in self.triplets for value in triplet]
+        self.shares = scheme.share(
+            [self.r] + self.bits + flat_triplets, num_participants
+        )
+
+    def get_shares(self, client_id: int) -> List[Share]:
+        return [Share(value) for value in self.shares[client_id]]
+
+
+class TruncationPair:
+    """
+    Class holding a random value r masking the values truncated by `bits` bits with statistical
+    security, and r >> bits, with their shares
+    """
+
+    def __init__(
+        self,
+        num_participants: int,
+        bits: int,
+        scheme: SharingScheme = AdditiveSharing(),
+    ):
+        mask_bits = magnitude_bits() + STATISTICAL_SECURITY
+        (self.r,) = get_source().integers(1, mask_bits)
+        self.r_high = self.r >> bits
+
+        self.shares = scheme.share([self.r, self.r_high], num_participants)
+
+    def get_shares(self, client_id: int) -> List[Share]:
+        return [Share(value) for value in self.shares[client_id]]
+
+
+class MatrixTriplet:
+    """
+    Class holding two random matrices A (rows x inner) and B (inner x cols) and C = A.B, with
+    their shares. Matrices are flattened row by row.
+    """
+
+    def __init__(
+        self,
+        num_participants: int,
+        rows: int,
+        inner: int,
+        cols: int,
+        scheme: SharingScheme = AdditiveSharing(),
+    ):
+        self.a = random_field_elements(rows * inner)
+        self.b = random_field_elements(inner * cols)
+        self.c = [
+            value % Share.FIELD_Q
+            for value in matrix_product(self.a, self.b, rows, inner, cols)
+        ]
+
+        # row i holds the shares of party i of the coefficients of A, then B, then C
+        self.shares = scheme.share(self.a + self.b + self.c, num_participants)
+
+    def get_shares(self, client_id: int) -> List[Share]:
+        return [Share(value) for value in self.shares[client_id]]
+
+
+class InnerProductTriplet(MatrixTriplet):
+    """Class holding two random vectors a and b of a given length and c = <a, b>, with their shares"""
+
+    def __init__(
+        self,
+        num_participants: int,
+        length: int,
+        scheme: SharingScheme = AdditiveSharing(),
+    ):
+        super().__init__(num_participants, 1, length, 1, scheme)
+
+
+# Builds the material of each kind of preprocessing, from the number of participants, a shape
+# and the sharing scheme.
+PREPROCESSING_KINDS: Dict[str, Callable[..., object]] = {
+    "triplet": BeaverTriplet,
+    "square": SquarePair,
+    "inner": InnerProductTriplet,
+    "matrix": MatrixTriplet,
+    "random_bits": RandomBits,
+    "solved_bits": SolvedBits,
+    "truncation": TruncationPair,
+}
+# The number of dimensions of the shape of each kind of material.
+SHAPE_DIMENSIONS: Dict[str, int] = {
+    "triplet": 0,
+    "square": 0,
+    "inner": 1,
+    "matrix": 3,
+    "random_bits": 1,
+    "solved_bits": 2,
+    "truncation": 1,
+}
+# Largest number of field elements of a party's shares of the material of one operation, so that
+# requests cannot make the trusted third party generate arbitrarily large material.
+MAX_MATERIAL = 1 << 20
+
+
+def check_request(kind: str, shape: Sequence[int]) -> None:
+    """Raises a ValueError unless material of the kind and shape can be generated."""
+    if kind not in PREPROCESSING_KINDS:
+        raise ValueError(f"Unknown preprocessing material {kind}")
+    if (
+        not isinstance(shape, (list, tuple))
+        or len(shape) != SHAPE_DIMENSIONS[kind]
+        or not all(type(size) is int and size >= 0 for size in shape)
+    ):
+        raise ValueError(f"Invalid shape {shape} of {kind} material")
+    if material_size(kind, tuple(shape)) > MAX_MATERIAL:
+        raise ValueError(
+            f"{kind} material of shape {shape} is larger than {MAX_MATERIAL} elements"
+        )
+
+
+# Number of locks guarding the creation of material, operations being spread over them by hash.
+STRIPES = 64
+
+
 class TrustedParamGenerator:
     """
-    A trusted third party that generates random values for the Beaver triplet multiplication scheme.
+    A trusted third party that generates random values for the Beaver triplet multiplication scheme,
+    shared with the sharing scheme of its session. Beaver triplets come from a TripletStore if it
+    is given one, which must hold triplets of the same scheme for the same participants.
+
+    The material of an operation is created exactly once however many parties request it at the
+    same time: the first request registers a future for it, under the lock of the stripe of the
+    operation, and generates it outside of any lock, while the concurrent requests wait for the
+    future. Requests for material already created take no lock at all, and the ones of
+    operations of other stripes never wait for each other.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        scheme: SharingScheme = AdditiveSharing(),
+        store: Optional[TripletStore] = None,
+    ):
+        if store is not None:
+            store.check(scheme)
+        self.scheme = scheme
+        self.store = store
         self.participant_ids: Set[str] = set()
         self.num_participants = len(self.participant_ids)
         # stores the triplets associated to each operation
         self.operation_triplets = {}
+        # the material being generated, by operation
+        self.pending: Dict[str, Future] = {}
+        self.stripes = [threading.Lock() for _ in range(STRIPES)]
         # map a string client to an int client id
         self.client_id_dict = {}
 
@@ -62,15 +275,91 @@ class TrustedParamGenerator:
         self.num_participants += 1
         self.client_id_dict[participant_id] = self.num_participants - 1
 
+    def check_party(self, client_id: str, party: int) -> None:
+        """
+        Raises a ValueError unless the participant has the given index, its position in the
+        participants of the protocol, which is also its evaluation point with Shamir sharing.
+        With another order, the shares it is dealt would be the ones of another party.
+        """
+        if self.client_id_dict.get(client_id) != party:
+            raise ValueError(
+                f"{client_id} is participant {self.client_id_dict.get(client_id)} of the "
+                f"session, not {party}: the participants must be in the order of the protocol"
+            )
+
+    def check_threshold(self, threshold: Optional[int]) -> None:
+        """
+        Raises a ValueError unless the session deals Shamir shares of the given threshold, or
+        additive shares if it is None. Shares of another scheme would open to wrong values.
+        """
+        own = getattr(self.scheme, "threshold", None)
+        if own != threshold:
+            raise ValueError(
+                f"The session shares with threshold {own}, not {threshold}: the threshold must "
+                f"be the one of the protocol"
+            )
+
     def retrieve_share(self, client_id: str, op_id: str) -> Tuple[Share, Share, Share]:
         """
         Retrieve a triplet of shares for a given client_id.
         """
+        return self.retrieve_preprocessing(client_id, op_id, "triplet")
+
+    def retrieve_preprocessing(
+        self, client_id: str, op_id: str, kind: str, shape: Sequence[int] = ()
+    ) -> List[Share]:
+        """
+        Retrieve the shares of a given client_id of the material of an operation, generating it
+        on the first request. Kinds are the keys of PREPROCESSING_KINDS, and the shape gives
+        the dimensions of the material: none for a triplet or a square pair, (length,) for an
+        inner product, (rows, inner, cols) for a matrix product, (count,) for random bits and
+        (nb_bits, nb_triplets) for solved bits and (bits,) for a truncation pair. Raises a
+        ValueError for other kinds and shapes, or for material larger than MAX_MATERIAL.
+        """
         int_id = self.client_id_dict[client_id]
+        material = self.operation_triplets.get(op_id)
+        if material is None:
+            # we may need new material for this operation
+            material = self.create_material(op_id, kind, shape)
+        return material.get_shares(int_id)
 
-        if op_id not in self.operation_triplets:
-            # we need a new beaver triplet for this operation
-            self.operation_triplets[op_id] = BeaverTriplet(self.num_participants)
+    def create_material(self, op_id: str, kind: str, shape: Sequence[int]):
+        """
+        Returns the material of an operation, generating it unless another request already did
+        or is doing it, in which case we wait for it.
+        """
+        stripe = self.stripes[hash(op_id) % len(self.stripes)]
+        with stripe:
+            material = self.operation_triplets.get(op_id)
+            if material is not None:
+                return material
+            future = self.pending.get(op_id)
+            creator = future is None
+            if creator:
+                future = self.pending[op_id] = Future()
+        if not creator:
+            return future.result()
 
-        beaver_triplet = self.operation_triplets[op_id]
-        return beaver_triplet.get_shares(int_id)
+        try:
+            material = self.generate(kind, shape)
+        except BaseException as error:
+            # the waiting requests fail too, and a later one may try again
+            with stripe:
+                del self.pending[op_id]
+            future.set_exception(error)
+            raise
+        with stripe:
+            self.operation_triplets[op_id] = material
+            del self.pending[op_id]
+        future.set_result(material)
+        return material
+
+    def generate(self, kind: str, shape: Sequence[int]):
+        """Generates new material of a kind and shape, or draws a Beaver triplet from the store."""
+        check_request(kind, shape)
+        if kind == "triplet" and self.store is not None:
+            self.store.check(self.scheme, self.num_participants)
+            return StoredTriplet(self.store)
+        return PREPROCESSING_KINDS[kind](
+            self.num_participants, *shape, scheme=self.scheme
+        )